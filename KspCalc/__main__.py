@@ -8,13 +8,14 @@ sys.path.append(os.path.realpath(
     os.path.join(os.path.dirname(__file__), "..")))
 
 from KspCalc import (
-    stars, flight, tracking
+    stars, flight, tracking, parts, profiling
 )
 
 def yaml_file(fname):
     return yaml.load(open(fname))
 
-def space_pos(txt):
+def parse_pos(txt):
+    """Returns (planet name, altitude above the ground)."""
     vals = {}
     for el in txt.split(':'):
         try:
@@ -22,66 +23,169 @@ def space_pos(txt):
         except:
              raise argparse.ArgumentTypeError("Unable to parse {!r} part of {!r}".format(el, txt))
         vals[name] = value
+    try:
+        return (vals["planet"], float(vals["alt"]))
+    except (KeyError, ValueError):
+        raise argparse.ArgumentTypeError("Position {!r} has to look like planet=<name>:alt=<metres>".format(txt))
+
+def pitch_point(txt):
+    """Returns (altitude above the ground, degrees off the vertical)."""
+    try:
+        (alt, angle) = txt.split(':')
+        return (float(alt), float(angle))
+    except ValueError:
+        raise argparse.ArgumentTypeError("Pitch point {!r} has to look like <metres>:<degrees>".format(txt))
 
-    planet = stars.Kerbol.findOne(vals["planet"])
-    alt = float(vals["alt"]) + planet.radius
-    return flight.Point(planet, alt)
+def throttle_controller(txt):
+    try:
+        return flight.control.parse(txt)
+    except ValueError as err:
+        raise argparse.ArgumentTypeError(str(err))
+
+def space_pos(txt):
+    (name, alt) = parse_pos(txt)
+    planet = stars.Kerbol.findOne(name)
+    return flight.Point(planet, alt + planet.radius)
 
 def get_parser():
     parser = argparse.ArgumentParser(description="Ksp calculator.")
-    parser.add_argument("--rocket", type=yaml_file, required=True, help="Rocket design to be used.")
+    parser.add_argument("--parts", action="append", default=[],
+            help="Load extra parts from this `.cfg' catalog (see `parts.catalog', may be repeated).")
+    parser.add_argument("--rocket", type=yaml_file, required=False, help="Rocket design to be used (required by all modes but `sweep').")
     parser.add_argument("--start", type=space_pos, required=False, default="planet=Kerbin:alt=68.41",
             help="Start position. You have to define planets' name and altitude (in metres).")
+    parser.add_argument("--trajectory", required=False, default=None,
+            help="Write full resolution trajectory to this binary file (see `tracking.TrajectoryFile').")
+    parser.add_argument("--profile", nargs="?", const="-", default=None,
+            help="Profile the simulation phases, print the summary and write collapsed stacks (flamegraph input) to the given file.")
+    parser.add_argument("--coast", choices=flight.coast.UNTIL, default=None,
+            help="Keep flying after the burnout, to the apogee or to the surface impact.")
+    parser.add_argument("--throttle", type=throttle_controller, default=None, metavar="NAME[:VALUE][@PERIOD]",
+            help="Throttle controller: constant:<0..1>, twr:<ratio>, g:<g's> or terminal, updated every PERIOD s (1 by default).")
+    parser.add_argument("--cache", required=False, default=None,
+            help="Directory of the result cache, runs done before are not flown again (see `tracking.ResultCache').")
     subp = parser.add_subparsers(help="Run mode")
     drag = subp.add_parser("guess_drag", help="Guess drag coefficient for the rocket")
     drag.add_argument("--terminal_altitude", type=float, required=True, help="Terminal altitude rocket had")
     drag.add_argument("--terminal_time", type=float, required=True, help="Time (seconds) at which given measurements were made")
+    drag.add_argument("--terminal_speed", type=float, required=False, default=None, help="Speed (m/s) the rocket had")
     drag.set_defaults(mode="guessDrag")
+    analyze = subp.add_parser("analyze", help="Closed form per-stage delta-v, burn time and TWR (no simulation)")
+    analyze.add_argument("--planet", default=None, help="Planet for the surface figures (the start one by default)")
+    analyze.set_defaults(mode="analyze")
+    ascent = subp.add_parser("ascent", help="Fly a planar ascent along a pitch program, report the orbit reached")
+    program = ascent.add_mutually_exclusive_group(required=True)
+    program.add_argument("--turn", type=float, nargs=2, metavar=("ALT", "DEG"),
+            help="Gravity turn: pitch over by DEG degrees at ALT metres, prograde afterwards")
+    program.add_argument("--pitch", type=pitch_point, nargs="+", metavar="ALT:DEG",
+            help="Pitch (degrees off the vertical) against the altitude, interpolated")
+    ascent.add_argument("--dt", type=float, default=0.01, help="Simulation step, s")
+    ascent.set_defaults(mode="ascent")
+    sweep = subp.add_parser("sweep", help="Fly every combination of designs, start positions and drags on a process pool")
+    sweep.add_argument("--designs", nargs="+", required=True, help="Rocket design files")
+    sweep.add_argument("--starts", type=parse_pos, nargs="+", default=[("Kerbin", 68.41)],
+            help="Start positions (planet=<name>:alt=<metres>)")
+    sweep.add_argument("--drags", type=float, nargs="+", default=[None], help="Drag coefficients (the designs' ones by default)")
+    sweep.add_argument("--dt", type=float, default=0.01, help="Simulation step, s")
+    sweep.add_argument("--integrator", choices=("euler", "rk4", "rk45"), default=None, help="Integrator to use")
+    sweep.add_argument("--workers", type=int, default=None, help="Worker processes (all cores by default, 0 - no pool)")
+    sweep.add_argument("--output", default=None, help="File to write JSON line results to (stdout by default)")
+    sweep.set_defaults(mode="sweep")
     return parser
 
-def guess_drag(rocket, time, alt):
-    maxFound = False
-    minDrag = 0
-    maxDrag = 100.0
-    dragEpsilon = 0.005
+def run_sweep(args):
+    designs = dict((fname, yaml_file(fname)) for fname in args.designs)
+    jobs = tracking.sweep.grid(designs, args.starts, args.drags, dt=args.dt, integrator=args.integrator, coast=args.coast,
+        controller=args.throttle)
+    stream = open(args.output, "w") if args.output else sys.stdout
+    try:
+        cache = tracking.ResultCache(args.cache) if args.cache else None
+        results = tracking.sweep.sweep(jobs, workers=args.workers, cache=cache)
+        count = tracking.sweep.writeResults(results, stream)
+    finally:
+        if args.output:
+            stream.close()
+    sys.stderr.write("{} of {} jobs done.\n".format(count, len(jobs)))
 
-    getMiddle = lambda: ((maxDrag - minDrag) / 2.0) + minDrag
+def guess_drag(rocket, time, alt, speed=None):
+    fit = flight.DragFit(rocket, [(time, alt, speed)])
+    drag = fit.fit()
+    for (idx, candidates) in enumerate(fit.history):
+        (best, residual) = min(candidates, key=lambda el: el[1])
+        print("Round {}: [{}, {}] best {} (residual {:.3g})".format(idx, candidates[0][0], candidates[-1][0], best, residual))
 
-    while (maxDrag - minDrag) > dragEpsilon:
-        toTest = getMiddle()
-        iterRocket = rocket.copy()
-        iterRocket.drag = toTest
-        tracker = tracking.Tracker(
-            iterRocket, reportFreq=0.2, reportWindows=[(time, time + 1)])
-        tracker.launch()
-        alts = [msg["maxAlt"] for msg in tracker.track()]
-        iterAlt = sum(alts) / (1.0 * len(alts))
-        
-        if iterAlt > alt:
-            minDrag = toTest
-            if not maxFound:
-                maxDrag *= 2
-        elif iterAlt < alt:
-            maxDrag = toTest
-            maxFound = True
-        print(minDrag, maxDrag)
-
-    print("Estimated drag: {}".format(getMiddle()))
-    return getMiddle()
+    print("Estimated drag: {}".format(drag))
+    return drag
 
 
-if __name__ == "__main__":
+def fly_ascent(rocket, args):
+    if args.turn:
+        program = flight.GravityTurn(*args.turn)
+    else:
+        program = flight.PitchTable(args.pitch)
+    ascent = flight.Ascent(rocket, program, dt=args.dt, controller=args.throttle)
+    for msg in ascent.fly():
+        if msg.msgType == "StageSeparation":
+            print({"time": msg.absTime, "stageName": msg.stage.name, "telemetryType": "StageSeparation"})
+    (pe, ap) = ascent.apsides()
+    print({
+        "time": rocket.absTime,
+        "altitude": ascent.surfaceAltitude,
+        "radialSpeed": ascent.radialSpeed,
+        "horizontalSpeed": ascent.horizontalSpeed,
+        "downrange": ascent.downrange,
+        "periapsis": pe,
+        "apoapsis": ap,
+        "orbit": ascent.inOrbit(),
+        "telemetryType": "Ascent",
+    })
 
-    args = get_parser().parse_args()
+
+def run(parser, args):
+    mode = getattr(args, "mode", None)
+    if mode == "sweep":
+        run_sweep(args)
+        return
+    if not args.rocket:
+        parser.error("--rocket is required")
     rocket = flight.Rocket.fromDict(args.rocket)
     rocket.setPos(args.start)
 
-    mode = getattr(args, "mode", None)
     if mode == "guessDrag":
-        guess_drag(rocket, args.terminal_time, args.terminal_altitude)
+        guess_drag(rocket, args.terminal_time, args.terminal_altitude, args.terminal_speed)
+    elif mode == "ascent":
+        fly_ascent(rocket, args)
+    elif mode == "analyze":
+        planet = stars.Kerbol.findOne(args.planet) if args.planet else None
+        print(rocket.analyze(planet).table())
+    elif args.cache and not args.trajectory:
+        for log in tracking.trackCached(tracking.ResultCache(args.cache), rocket, dt=0.01, reportFreq=10, coast=args.coast,
+                controller=args.throttle):
+            print(log)
     else:
-        tracker = tracking.Tracker(rocket, reportFreq=10, dt=0.01)
+        writer = tracking.TrajectoryWriter(rocket, args.trajectory) if args.trajectory else None
+        tracker = tracking.Tracker(rocket, reportFreq=10, dt=0.01, recorder=writer, coast=args.coast, controller=args.throttle)
         tracker.launch()
 
         for log in tracker.track():
             print(log)
+
+        if writer:
+            writer.close()
+
+
+if __name__ == "__main__":
+
+    parser = get_parser()
+    args = parser.parse_args()
+    for fname in args.parts:
+        parts.catalog.loadInto(fname)
+    if args.profile:
+        # Sweep workers are not profiled, use `--workers 0' to profile a sweep
+        with profiling.Profiler() as profiler:
+            run(parser, args)
+        sys.stderr.write(profiler.summary() + "\n")
+        if args.profile != "-":
+            profiler.writeCollapsed(args.profile)
+    else:
+        run(parser, args)
@@ -0,0 +1,5 @@
+"""Performance benchmarks.
+
+Each benchmark module exposes `run()' returning a dict of measurements.
+`python -m KspCalc.bench' runs the regression suite (see `suite').
+"""
@@ -0,0 +1,97 @@
+"""Analytic altitude models vs `stars.tables.AltitudeTable' lookups.
+
+    python -m KspCalc.bench.atmosphere [--design samples/designs/threeStageRocket.yml]
+
+Ratios above 1 are table speedups. The stock models win (see `stars.tables' for the figures);
+array lookups go to the models themselves and only show the cost of the dispatch.
+"""
+
+import os
+import sys
+import time
+import yaml
+import argparse
+
+from KspCalc import (stars, flight)
+
+DEFAULT_DESIGN = os.path.join(os.path.dirname(__file__), "..", "..", "samples", "designs", "threeStageRocket.yml")
+
+def timeit(func, repeat=3):
+    """Best wall clock time of `repeat' calls."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        took = time.perf_counter() - start
+        best = took if best is None else min(best, took)
+    return best
+
+def lookups(planet, count=100000):
+    alts = [planet.radius + 70000.0 * idx / count for idx in range(count)]
+    def _run():
+        (g, pressureAt, densityAt) = (planet.g, planet.pressureAt, planet.densityAt)
+        for alt in alts:
+            g(alt)
+            pressureAt(alt)
+            densityAt(alt)
+    return timeit(_run)
+
+def arrayLookups(planet, count=100000):
+    import numpy as np
+    alts = planet.radius + np.linspace(0, 70000.0, count)
+    return timeit(lambda: (planet.g(alts), planet.pressureAt(alts), planet.densityAt(alts)))
+
+def flights(design, planet, dt=0.01):
+    def _run():
+        rocket = flight.Rocket.fromDict(design)
+        rocket.drag = 2
+        rocket.setPos(flight.Point(planet, planet.radius + 68.41))
+        for msg in rocket.fly(dt=dt, compiled=True):
+            if msg.msgType == "FlightLog":
+                lastAlt = rocket.position.altitude
+        return lastAlt
+    return (timeit(_run), _run())
+
+def run(design, step=10.0, order=1):
+    planet = stars.Kerbol.findOne("Kerbin")
+    planet.dropTables()
+    rv = {"analytic": {}, "table": {}}
+    rv["analytic"]["lookups"] = lookups(planet)
+    (rv["analytic"]["flight"], exactAlt) = flights(design, planet)
+    tables = planet.buildTables(step=step, order=order)
+    try:
+        rv["table"]["lookups"] = lookups(planet)
+        (rv["table"]["flight"], tableAlt) = flights(design, planet)
+    finally:
+        planet.dropTables()
+    try:
+        import numpy
+    except ImportError:
+        pass
+    else:
+        rv["analytic"]["arrayLookups"] = arrayLookups(planet)
+        planet.buildTables(step=step, order=order)
+        try:
+            rv["table"]["arrayLookups"] = arrayLookups(planet)
+        finally:
+            planet.dropTables()
+    rv["maxError"] = dict((name, table.maxError) for (name, table) in tables.items())
+    rv["burnoutAltitudeError"] = abs(tableAlt - exactAlt) / exactAlt
+    return rv
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--design", default=DEFAULT_DESIGN, help="Rocket design to fly.")
+    parser.add_argument("--step", type=float, default=10.0, help="Table step, m.")
+    parser.add_argument("--order", type=int, default=1, choices=stars.tables.ORDERS, help="Interpolation order.")
+    args = parser.parse_args(argv)
+    result = run(yaml.safe_load(open(args.design)), step=args.step, order=args.order)
+    for name in sorted(result["analytic"].keys()):
+        (analytic, table) = (result["analytic"][name], result["table"][name])
+        print("{:>14}: analytic {:.3f}s, table {:.3f}s ({:.2f}x)".format(name, analytic, table, analytic / table))
+    for (name, err) in sorted(result["maxError"].items()):
+        print("{:>14}: max relative error {:.3g}".format(name, err))
+    print("{:>14}: relative error {:.3g}".format("burnout alt", result["burnoutAltitudeError"]))
+
+if __name__ == "__main__":
+    main()
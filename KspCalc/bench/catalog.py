@@ -0,0 +1,79 @@
+"""Startup time and memory of a data driven part catalog.
+
+    python -m KspCalc.bench.catalog [--parts 5000]
+
+Generates a `.cfg' catalog of the given size and measures parsing it (cold start),
+loading it through the compiled cache (warm start), registering it in a search catalog,
+retained memory of the loaded records and instantiating parts from them.
+"""
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+from KspCalc.parts import (catalog, search)
+from .atmosphere import timeit
+
+def generate(count):
+    """`.cfg' text of `count' parts (a mix of all the part types)."""
+    blocks = []
+    for idx in range(count):
+        kind = ("weight", "fuelTank", "lfe")[idx % 3]
+        lines = ["PART", "{", "    name = Bench Part {} {}".format(kind, idx), "    type = " + kind,
+            "    aliases = BP{}".format(idx)]
+        if kind == "weight":
+            lines.append("    mass = {}".format(10 + idx % 500))
+        elif kind == "fuelTank":
+            fuelL = 100 * (1 + idx % 32)
+            lines += ["    massEmpty = {}".format(fuelL * 0.625), "    massFull = {}".format(fuelL * 5.625),
+                "    fuelL = {}".format(fuelL)]
+        else:
+            lines += ["    mass = {}".format(500 + idx % 3000), "    thrust = {}".format(50000 + 100 * idx),
+                "    consumptionAtm = 13.7", "    consumptionVac = 11.8"]
+        lines.append("}")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks) + "\n"
+
+def run(count=5000, repeat=3):
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "bench.cfg")
+        with open(path, "w") as fobj:
+            fobj.write(generate(count))
+
+        rv = {"parts": count, "sourceKB": os.path.getsize(path) / 1024.0}
+        rv["parseMs"] = 1e3 * timeit(lambda: catalog.load(path, useCache=False), repeat)
+        started = time.perf_counter()
+        catalog.load(path)
+        rv["parseAndCacheMs"] = 1e3 * (time.perf_counter() - started)
+        rv["cacheKB"] = os.path.getsize(path + catalog.CACHE_SUFFIX) / 1024.0
+        rv["cachedLoadMs"] = 1e3 * timeit(lambda: catalog.load(path), repeat)
+
+        tracemalloc.start()
+        specs = catalog.load(path)
+        rv["recordsKB"] = tracemalloc.get_traced_memory()[0] / 1024.0
+        cat = search.Catalog(specs)
+        rv["recordsAndIndexKB"] = tracemalloc.get_traced_memory()[0] / 1024.0
+        tracemalloc.stop()
+        rv["indexMs"] = 1e3 * timeit(lambda: search.Catalog(specs), repeat)
+
+        names = ["BP{}".format(idx) for idx in range(0, count, 7)]
+        rv["findUs"] = 1e6 * timeit(lambda: [cat.find(name) for name in names], repeat) / len(names)
+        rv["instantiateUs"] = 1e6 * timeit(lambda: [spec(None) for spec in specs], repeat) / len(specs)
+        return rv
+    finally:
+        shutil.rmtree(tmp)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--parts", type=int, default=5000, help="Catalog size.")
+    args = parser.parse_args(argv)
+    result = run(args.parts)
+    for name in sorted(result.keys()):
+        print("{:>20}: {:.4g}".format(name, result[name]))
+
+if __name__ == "__main__":
+    main()
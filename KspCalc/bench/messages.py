@@ -0,0 +1,58 @@
+"""Memory footprint of the flight log records.
+
+    python -m KspCalc.bench.messages [--design samples/designs/threeStageRocket.yml]
+
+Flies the design keeping every `FlightLog' record, then reads every field of every record
+(as the telemetry would) and reports retained memory and allocated blocks per million ticks.
+"""
+
+import sys
+import gc
+import yaml
+import argparse
+import tracemalloc
+
+from KspCalc import (stars, flight)
+from .atmosphere import DEFAULT_DESIGN
+
+def _fields(msg):
+    for name in msg.fields:
+        getattr(msg, name)
+
+def run(design, dt=0.01, compiled=True):
+    planet = stars.Kerbol.findOne("Kerbin")
+    rocket = flight.Rocket.fromDict(design)
+    rocket.drag = 2
+    rocket.setPos(flight.Point(planet, planet.radius + 68.41))
+
+    gc.collect()
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    logs = [msg for msg in rocket.fly(dt=dt, compiled=compiled) if msg.msgType == "FlightLog"]
+    (flown, flownBlocks) = (tracemalloc.get_traced_memory()[0], sys.getallocatedblocks() - blocks)
+    for msg in logs:
+        _fields(msg)
+    (read, readBlocks) = (tracemalloc.get_traced_memory()[0], sys.getallocatedblocks() - blocks)
+    tracemalloc.stop()
+
+    scale = 1e6 / len(logs)
+    return {
+        "ticks": len(logs),
+        "recordBytes": sys.getsizeof(logs[0]),
+        "flownMBPerMTicks": flown * scale / 2**20,
+        "flownBlocksPerTick": flownBlocks / float(len(logs)),
+        "readMBPerMTicks": read * scale / 2**20,
+        "readBlocksPerTick": readBlocks / float(len(logs)),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--design", default=DEFAULT_DESIGN, help="Rocket design to fly.")
+    parser.add_argument("--object", action="store_true", help="Use the object engine instead of the compiled one.")
+    args = parser.parse_args(argv)
+    result = run(yaml.safe_load(open(args.design)), compiled=not args.object)
+    for name in sorted(result.keys()):
+        print("{:>20}: {:.4g}".format(name, result[name]))
+
+if __name__ == "__main__":
+    main()
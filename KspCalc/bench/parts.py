@@ -0,0 +1,42 @@
+"""Memory and copy cost of the rocket part objects.
+
+    python -m KspCalc.bench.parts [--design samples/designs/threeStageRocket.yml] [--rockets 1000]
+
+Builds `--rockets' rockets from the design (as a batch sweep holds them) and reports the
+retained memory per rocket, the number of part objects and the time `Rocket.copy' takes.
+"""
+
+import gc
+import yaml
+import argparse
+import tracemalloc
+
+from KspCalc import flight
+from .atmosphere import (DEFAULT_DESIGN, timeit)
+
+def run(design, rockets=1000):
+    template = flight.Rocket.fromDict(design)
+    gc.collect()
+    tracemalloc.start()
+    fleet = [template.copy() for _ in range(rockets)]
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {
+        "rockets": rockets,
+        "partObjects": sum(len(stage.parts) for stage in template.stages),
+        "parts": sum(len(stage.partTypes) for stage in template.stages),
+        "bytesPerRocket": retained / float(len(fleet)),
+        "copyUs": 1e6 * timeit(lambda: [template.copy() for _ in range(rockets)]) / rockets,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--design", default=DEFAULT_DESIGN, help="Rocket design to build.")
+    parser.add_argument("--rockets", type=int, default=1000, help="Number of rockets to build.")
+    args = parser.parse_args(argv)
+    result = run(yaml.safe_load(open(args.design)), args.rockets)
+    for name in sorted(result.keys()):
+        print("{:>20}: {:.4g}".format(name, result[name]))
+
+if __name__ == "__main__":
+    main()
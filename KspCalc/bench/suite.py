@@ -0,0 +1,192 @@
+"""Benchmark suite of the flight engine, telemetry and design loading.
+
+    python -m KspCalc.bench [--quick] [--output results.json] [--baseline baseline.json]
+
+Benchmarks (each result is a number with its unit, "higher" or "lower" is better):
+    fly/<design>/<engine>     ticks per second of `Rocket.fly' (1, 3 and 10 stage reference designs,
+                              object and compiled engines);
+    track/freq=<s>            `RocketTracker.track' overhead per tick over the bare compiled flight;
+    guessDrag                 end to end drag fit of a flight of the 3 stage design;
+    fromDict                  `Rocket.fromDict' (part name resolution included) per design;
+    findByName/<kind>         `parts.findByName' per name (exact names, prefixes, fuzzy names
+                              with and without the fuzzy match cache);
+    copy/<design>             `Rocket.copy'.
+
+Results are written as JSON. With `--baseline' (a file written by `--output' before) every
+result is compared with the baseline one and the ones worse by more than `--tolerance'
+are reported as regressions (the exit status is 1 then). `--quick' results (single repetitions)
+are too noisy for that: when either side is a quick run the results are only compared.
+"""
+
+import os
+import sys
+import json
+import time
+import yaml
+import argparse
+import platform
+
+from KspCalc import (stars, flight, parts, tracking)
+from .atmosphere import timeit
+
+DESIGNS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "samples", "designs")
+DESIGNS = (
+    ("1stage", "oneStage.yml"),
+    ("3stage", "threeStageRocket.yml"),
+    ("10stage", "tenStage.yml"),
+)
+REPORT_FREQS = (0.01, 1, 10)
+TRACK_ROUNDS = 7 # the tracker overhead is a small difference of two run times, needs more rounds
+NAMES = {
+    "exact": ("LV-T30 Liquid Fuel Engine", "FL-T400 Fuel Tank", "Command Pod Mk1", "Mk16 Parachute"),
+    "prefix": ("LV-T30", "FL-T400", "Command Pod", "TR-18A"),
+    "fuzzy": ("Tr-18A stack decoupler", "Advanced SAS Module", "Mk1 Command Pod"),
+}
+FORMAT_VERSION = 1
+
+def loadDesign(fname):
+    with open(os.path.join(DESIGNS_DIR, fname)) as fobj:
+        return yaml.safe_load(fobj)
+
+def _rocket(design, drag=2):
+    planet = stars.Kerbol.findOne("Kerbin")
+    rv = flight.Rocket.fromDict(design)
+    rv.drag = drag
+    rv.setPos(flight.Point(planet, planet.radius + 68.41))
+    return rv
+
+def _ticks(rocket, **kwargs):
+    return sum(1 for msg in rocket.fly(**kwargs) if msg.msgType == "FlightLog")
+
+def benchFly(design, compiled, dt=0.01, repeat=3):
+    ticks = _ticks(_rocket(design), dt=dt, compiled=compiled)
+    took = timeit(lambda: _ticks(_rocket(design), dt=dt, compiled=compiled), repeat)
+    return ticks / took
+
+def benchTrack(design, reportFreq, dt=0.01, rounds=TRACK_ROUNDS):
+    """Tracker time per tick minus the bare flight time per tick, microseconds.
+
+    The bare flight and the tracked one are timed in alternating order, the result is
+    the median of the per round differences (both runs see the same machine state).
+    """
+    ticks = _ticks(_rocket(design), dt=dt, compiled=True)
+    def _track():
+        tracker = tracking.Tracker(_rocket(design), dt=dt, reportFreq=reportFreq, compiled=True)
+        tracker.launch()
+        for _ in tracker.track():
+            pass
+    diffs = []
+    for _ in range(rounds):
+        bare = timeit(lambda: _ticks(_rocket(design), dt=dt, compiled=True), 1)
+        diffs.append(timeit(_track, 1) - bare)
+    diffs.sort()
+    return 1e6 * max(diffs[len(diffs) // 2], 0.0) / ticks
+
+def benchGuessDrag(design, drag=2, atTime=60.0, dt=0.01):
+    """Fit the drag to one observation of a flight with known drag, returns (seconds, fitted drag)."""
+    rocket = _rocket(design, drag)
+    for msg in rocket.fly(dt=dt, compiled=True):
+        if msg.msgType == "FlightLog" and msg.absTime + msg.dt >= atTime:
+            break
+    observation = (rocket.absTime, rocket.position.surfaceAltitude, rocket.speed)
+    started = time.perf_counter()
+    fitted = flight.DragFit(_rocket(design, 0), [observation], dt=dt).fit()
+    return (time.perf_counter() - started, fitted)
+
+def benchFromDict(design, count=200):
+    return 1e6 * timeit(lambda: [flight.Rocket.fromDict(design) for _ in range(count)]) / count
+
+def benchFindByName(names, count=2000, cold=False):
+    clear = parts.search.CATALOG._fuzzy.cache_clear if cold else (lambda: None)
+    def _run():
+        for _ in range(count):
+            for name in names:
+                clear()
+                parts.findByName(name)
+    return 1e6 * timeit(_run) / (count * len(names))
+
+def benchCopy(design, count=1000):
+    rocket = flight.Rocket.fromDict(design)
+    return 1e6 * timeit(lambda: [rocket.copy() for _ in range(count)]) / count
+
+def run(quick=False, log=None):
+    """Run the suite, returns {name: {"value": .., "unit": .., "better": "higher"|"lower"}}."""
+    repeat = 1 if quick else 3
+    rv = {}
+    def _add(name, value, unit, better):
+        rv[name] = {"value": value, "unit": unit, "better": better}
+        if log:
+            log("{:>32}: {:.4g} {}\n".format(name, value, unit))
+
+    designs = [(key, loadDesign(fname)) for (key, fname) in DESIGNS]
+    for (key, design) in designs:
+        for compiled in (False, True):
+            engine = "compiled" if compiled else "object"
+            _add("fly/{}/{}".format(key, engine), benchFly(design, compiled, repeat=repeat), "ticks/s", "higher")
+    reference = dict(designs)["3stage"]
+    for freq in REPORT_FREQS:
+        _add("track/freq={}".format(freq), benchTrack(reference, freq, rounds=TRACK_ROUNDS if quick else 3 * TRACK_ROUNDS), "us/tick", "lower")
+    (took, fitted) = benchGuessDrag(reference)
+    _add("guessDrag", took, "s", "lower")
+    _add("guessDrag/error", abs(fitted - 2.0), "drag", "lower")
+    for (key, design) in designs:
+        _add("fromDict/{}".format(key), benchFromDict(design, 50 if quick else 200), "us", "lower")
+        _add("copy/{}".format(key), benchCopy(design, 200 if quick else 1000), "us", "lower")
+    for (kind, names) in sorted(NAMES.items()):
+        _add("findByName/{}".format(kind), benchFindByName(names, 200 if quick else 2000), "us", "lower")
+    _add("findByName/fuzzy-cold", benchFindByName(NAMES["fuzzy"], 20 if quick else 200, cold=True), "us", "lower")
+    return rv
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def compare(results, baseline, tolerance=0.1):
+    """Compare `results' with `baseline' ones, returns list of (name, old, new, relative change, regressed)."""
+    rv = []
+    for (name, new) in sorted(results.items()):
+        old = baseline.get(name)
+        if old is None or not old["value"]:
+            continue
+        change = (new["value"] - old["value"]) / abs(old["value"])
+        worse = -change if new["better"] == "higher" else change
+        rv.append((name, old["value"], new["value"], change, worse > tolerance))
+    return rv
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Single repetition, fewer iterations.")
+    parser.add_argument("--output", default=None, help="Write the results (JSON) to this file.")
+    parser.add_argument("--baseline", default=None, help="Compare with the results saved to this file.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative slowdown considered a regression.")
+    args = parser.parse_args(argv)
+
+    results = run(quick=args.quick, log=sys.stderr.write)
+    document = {"format": FORMAT_VERSION, "environment": environment(), "quick": args.quick, "results": results}
+    if args.output:
+        with open(args.output, "w") as fobj:
+            json.dump(document, fobj, indent=2, sort_keys=True)
+    else:
+        json.dump(document, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+
+    if args.baseline:
+        with open(args.baseline) as fobj:
+            baseline = json.load(fobj)
+        check = not (args.quick or baseline.get("quick", False))
+        if not check:
+            sys.stderr.write("Quick results are not checked for regressions.\n")
+        regressions = 0
+        for (name, old, new, change, regressed) in compare(results, baseline["results"], args.tolerance):
+            regressed = regressed and check
+            regressions += regressed
+            sys.stderr.write("{:>32}: {:.4g} -> {:.4g} ({:+.1%}){}\n".format(
+                name, old, new, change, "  REGRESSION" if regressed else ""))
+        if regressions:
+            sys.stderr.write("{} regression(s) over {:.0%}\n".format(regressions, args.tolerance))
+            return 1
+    return 0
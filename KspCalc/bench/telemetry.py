@@ -0,0 +1,54 @@
+"""Telemetry overhead per tick.
+
+    python -m KspCalc.bench.telemetry [--design samples/designs/threeStageRocket.yml]
+
+Flies the design once keeping the flight log records, then feeds them to the flight
+telemetry collector (reporting every 10 s as the CLI does) and compares the time per
+tick with the time the compiled engine takes per tick.
+"""
+
+import time
+import yaml
+import argparse
+
+from KspCalc import (stars, flight)
+from KspCalc.tracking import telemetry
+from .atmosphere import (DEFAULT_DESIGN, timeit)
+
+def run(design, dt=0.01, reportFreq=10):
+    planet = stars.Kerbol.findOne("Kerbin")
+    rocket = flight.Rocket.fromDict(design)
+    rocket.drag = 2
+    rocket.setPos(flight.Point(planet, planet.radius + 68.41))
+    started = time.perf_counter()
+    logs = [msg for msg in rocket.fly(dt=dt, compiled=True) if msg.msgType == "FlightLog"]
+    physics = time.perf_counter() - started
+
+    def _collect():
+        collector = telemetry.Flight(rocket)
+        nextReportAt = reportFreq
+        for msg in logs:
+            collector.accumulate(msg)
+            if nextReportAt <= msg.absTime:
+                collector.getData()
+                collector.reset()
+                nextReportAt = msg.absTime + reportFreq
+        collector.getData()
+
+    collect = timeit(_collect)
+    return {
+        "ticks": len(logs),
+        "physicsUsPerTick": 1e6 * physics / len(logs),
+        "telemetryUsPerTick": 1e6 * collect / len(logs),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--design", default=DEFAULT_DESIGN, help="Rocket design to fly.")
+    args = parser.parse_args(argv)
+    result = run(yaml.safe_load(open(args.design)))
+    for name in sorted(result.keys()):
+        print("{:>20}: {:.4g}".format(name, result[name]))
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,3 @@
 G = 6.67384e-11 # N * m^2 / (kg^2)
-FUEL_RHO = 200.0 / 1000.0 # litres / kg
\ No newline at end of file
+FUEL_RHO = 200.0 / 1000.0 # litres / kg
+G0 = 9.81 # m/s^2, standard gravity (unit of the g-force)
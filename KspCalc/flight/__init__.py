@@ -1,2 +1,11 @@
 from .astrodynamics import Point
-from .rocket import Rocket
\ No newline at end of file
+from .rocket import Rocket
+from .fitting import (DragFit, fitDrag)
+from .checkpoint import Checkpoint
+from .coast import Coast
+from .ascent import (Ascent, GravityTurn, PitchTable)
+
+def simulate_batch(*args, **kwargs):
+    """See `batch.simulate_batch' (imported lazily as it requires NumPy)."""
+    from .batch import simulate_batch
+    return simulate_batch(*args, **kwargs)
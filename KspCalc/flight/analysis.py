@@ -0,0 +1,168 @@
+"""Closed form per-stage figures: delta-v, burn time, thrust to weight ratio.
+
+Pressure is constant within an analysis (vacuum, or the surface pressure for the "Atm" figures),
+so every burn phase - an interval with a constant set of burning stages and drained tanks - has
+constant thrust and mass flow and the rocket equation applies exactly. Staging follows the
+rules of `Rocket.fly' (ignition closure via `ignites', crossfeed via `takesFuel', empty stages
+separating together with everything below them) and the Isp is averaged the same way the
+simulation does it, so vacuum figures match the `FlightLog.tsailkovskydV' sums of a simulation.
+"""
+
+import math
+
+from KspCalc import consts
+from .compiled import (CompiledRocket, EMPTY_L)
+
+class Burn(object):
+    """Figures of one stage: from ignition till the separation of `separated' stages."""
+
+    def __init__(self):
+        super(Burn, self).__init__()
+        self.separated = [] # names of the stages dropped at the end of the burn
+        self.burning = [] # names of the stages that burned
+        self.burnTime = 0.0 # s
+        self.deltaV = 0.0 # m/s
+        self.startMass = self.endMass = None # kg
+        self.startThrust = self.endThrust = None # N
+
+    def twr(self, g):
+        """(start, end) thrust to weight ratio for gravity `g'."""
+        return (self.startThrust / (self.startMass * g), self.endThrust / (self.endMass * g))
+
+    def _phase(self, burning, duration, deltaV, startMass, endMass, thrust):
+        if self.startMass is None:
+            (self.startMass, self.startThrust) = (startMass, thrust)
+        (self.endMass, self.endThrust) = (endMass, thrust)
+        for name in burning:
+            if name not in self.burning:
+                self.burning.append(name)
+        self.burnTime += duration
+        self.deltaV += deltaV
+
+    def __repr__(self):
+        return "<{} {} dV={:.1f} t={:.1f}>".format(self.__class__.__name__, self.separated, self.deltaV, self.burnTime)
+
+def burns(compiled, pressure):
+    """Burns of a `compiled.CompiledRocket' (its current state) at constant `pressure'."""
+    RHO = consts.FUEL_RHO
+    stages = compiled.stages
+    fuelL = list(compiled.fuelL)
+    ignited = [stage.ignited for stage in stages]
+    nAttached = len(stages)
+    empty = lambda tanks: all(fuelL[tank] < EMPTY_L for tank in tanks)
+    rv = []
+    current = Burn()
+
+    while nAttached:
+        feeds = [compiled.feedTanks(idx, nAttached) for idx in range(nAttached)]
+        active = [idx for idx in range(nAttached) if ignited[idx]]
+        # Staging (see `CompiledRocket.staging')
+        dropAt = None
+        for idx in active:
+            if empty(feeds[idx]):
+                dropAt = idx
+                break
+        if dropAt is None and not ignited[nAttached - 1]:
+            todo = [nAttached - 1]
+            while todo:
+                idx = todo.pop()
+                if not ignited[idx]:
+                    ignited[idx] = True
+                    todo.extend(compiled.ignites[idx])
+            continue
+        if dropAt is None and empty(feeds[nAttached - 1]):
+            dropAt = nAttached - 1
+        if dropAt is not None:
+            current.separated.extend(stages[idx].name for idx in reversed(range(dropAt, nAttached)))
+            nAttached = dropAt
+            continue
+
+        # Burn phase till the next tank runs dry
+        flow = {} # L/s per drained tank
+        burning = []
+        for idx in active:
+            if not compiled.engThrust[idx]:
+                continue
+            for tank in feeds[idx]:
+                if fuelL[tank] >= EMPTY_L:
+                    flow[tank] = flow.get(tank, 0.0) + compiled.stageConsumption(idx, pressure) * RHO
+                    burning.append(idx)
+                    break
+        if not flow:
+            break
+        if current.separated:
+            rv.append(current)
+            current = Burn()
+        duration = min(fuelL[tank] / litres for (tank, litres) in flow.items())
+        startMass = sum(compiled.dryMass[:nAttached]) + \
+            sum(level for (tank, level) in enumerate(fuelL) if compiled.tankStage[tank] < nAttached) / RHO
+        endMass = startMass - duration * sum(flow.values()) / RHO
+        # Same Isp convention as the simulation (g cancels out)
+        exhaust = compiled._Isp(active, pressure, 1.0)
+        thrust = sum(sum(compiled.engThrust[idx]) * compiled.throttle[idx] for idx in active)
+        current._phase([stages[idx].name for idx in burning], duration,
+            exhaust * math.log(startMass / endMass), startMass, endMass, thrust)
+        for (tank, litres) in flow.items():
+            fuelL[tank] = max(fuelL[tank] - litres * duration, 0.0)
+            if fuelL[tank] < litres * duration * 1e-12:
+                fuelL[tank] = 0.0
+    if current.startMass is not None or current.separated:
+        rv.append(current)
+    return rv
+
+class Analysis(object):
+    """Per-stage vacuum and surface (sea level) figures of a rocket, see `Rocket.analyze'."""
+
+    def __init__(self, rocket, planet=None):
+        super(Analysis, self).__init__()
+        if planet is None:
+            planet = rocket.position.planet
+        self.planet = planet
+        self.g = planet.surfaceGravity
+        self.pressure = planet.pressureAt(planet.radius) if planet.hasAtmosphere else 0.0
+        compiled = CompiledRocket(rocket)
+        self.burns = burns(compiled, 0.0)
+        atm = burns(compiled, self.pressure)
+        # Staging at the surface pressure may only differ in the burn times
+        if [el.separated for el in atm] != [el.separated for el in self.burns]:
+            atm = [None] * len(self.burns)
+        self.atmBurns = atm
+
+    deltaV = property(lambda s: sum(el.deltaV for el in s.burns))
+    deltaVAtm = property(lambda s: sum(el.deltaV for el in s.atmBurns if el))
+
+    def rows(self):
+        """Per burn dicts (bottom stage first)."""
+        rv = []
+        for (vac, atm) in zip(self.burns, self.atmBurns):
+            (startTwr, endTwr) = vac.twr(self.g) if vac.startMass else (0.0, 0.0)
+            rv.append({
+                "separated": vac.separated,
+                "burning": vac.burning,
+                "deltaV": vac.deltaV,
+                "deltaVAtm": atm.deltaV if atm else None,
+                "burnTime": vac.burnTime,
+                "burnTimeAtm": atm.burnTime if atm else None,
+                "startMass": vac.startMass,
+                "endMass": vac.endMass,
+                "startTwr": startTwr,
+                "endTwr": endTwr,
+            })
+        return rv
+
+    def table(self):
+        """Human readable report."""
+        fmt = "{:<30} {:>9} {:>9} {:>8} {:>8} {:>10} {:>10} {:>6} {:>6}"
+        lines = [fmt.format("Stage", "dV vac", "dV atm", "t vac", "t atm", "m start", "m end", "TWR0", "TWR1")]
+        num = lambda val, spec: "-" if val is None else format(val, spec)
+        for row in self.rows():
+            lines.append(fmt.format(
+                ", ".join(row["burning"] or row["separated"])[:30],
+                num(row["deltaV"], ".1f"), num(row["deltaVAtm"], ".1f"),
+                num(row["burnTime"], ".1f"), num(row["burnTimeAtm"], ".1f"),
+                num(row["startMass"], ".0f"), num(row["endMass"], ".0f"),
+                num(row["startTwr"], ".2f"), num(row["endTwr"], ".2f"),
+            ))
+        lines.append("Total: dV vac {:.1f} m/s, dV atm {:.1f} m/s ({} g={:.3f} m/s^2, p={:.3f} atm)".format(
+            self.deltaV, self.deltaVAtm, self.planet.name, self.g, self.pressure))
+        return "\n".join(lines)
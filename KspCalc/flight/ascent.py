@@ -0,0 +1,250 @@
+"""Planar ascent: gravity turns and orbital insertion.
+
+`Rocket.fly' flies straight up. `Ascent' flies the compiled rocket in the plane of its trajectory,
+the state being planet centred Cartesian position and velocity (x, y, vx, vy) and the thrust
+pointed by a pitch program:
+
+    GravityTurn(startAltitude, startAngle) - straight up till `startAltitude', then tilted
+                                             `startAngle' degrees off the vertical and prograde
+                                             once the flight path bends over that far;
+    PitchTable(((altitude, angle), ...))   - pitch (degrees off the vertical) against the surface
+                                             altitude, linearly interpolated.
+
+A tick is the explicit Euler tick of `Rocket.fly' with the velocity change split into thrust along
+the pitch, gravity towards the centre and drag against the velocity, so a vertical program flies the
+same trajectory as the radial engines. The planet does not rotate.
+`apsides' gives the periapsis and apoapsis of the osculating orbit (`Celestial.mass' and `consts.G').
+
+The state is plain numbers and the tick only does arithmetic on them, `batch.simulate_batch'
+runs the same tick on NumPy arrays of variants (its `pitch' argument).
+"""
+
+import bisect
+import math
+
+from KspCalc import consts
+from . import messages
+from .compiled import CompiledRocket
+
+class PitchProgram(object):
+    """Thrust direction as angle off the local vertical (radians).
+
+    `angle' takes the surface altitude and the flight path angle (velocity off the vertical, radians),
+    `angles' is the same for NumPy arrays of them.
+    """
+
+    # Attributes that may be arrays of per variant values in a batch
+    parameters = ()
+
+    def angle(self, altitude, path):
+        raise NotImplementedError
+
+    def angles(self, altitude, path):
+        raise NotImplementedError
+
+class GravityTurn(PitchProgram):
+    """Vertical climb, a pitch kick at `startAltitude', prograde afterwards (never below `endAngle')."""
+
+    parameters = ("startAltitude", "startAngle", "endAngle")
+
+    def __init__(self, startAltitude, startAngle, endAngle=90.0):
+        super(GravityTurn, self).__init__()
+        self.startAltitude = startAltitude
+        self.startAngle = startAngle
+        self.endAngle = endAngle
+
+    def angle(self, altitude, path):
+        if altitude < self.startAltitude:
+            return 0.0
+        (kick, cap) = (math.radians(self.startAngle), math.radians(self.endAngle))
+        rv = kick if path < kick else path
+        return cap if rv > cap else rv
+
+    def angles(self, altitude, path):
+        import numpy as np
+        kick = np.radians(self.startAngle)
+        rv = np.minimum(np.maximum(kick, path), np.radians(self.endAngle))
+        return np.where(altitude < self.startAltitude, 0.0, rv)
+
+    def __repr__(self):
+        return "<{} at {} m by {} deg>".format(self.__class__.__name__, self.startAltitude, self.startAngle)
+
+class PitchTable(PitchProgram):
+    """Pitch interpolated in the ((surface altitude, degrees off the vertical), ...) table."""
+
+    def __init__(self, points):
+        super(PitchTable, self).__init__()
+        points = sorted((float(alt), float(angle)) for (alt, angle) in points)
+        if not points:
+            raise ValueError("Pitch table needs at least one point.")
+        self.altitudes = tuple(alt for (alt, _) in points)
+        self.radians = tuple(math.radians(angle) for (_, angle) in points)
+
+    def angle(self, altitude, path):
+        (alts, angles) = (self.altitudes, self.radians)
+        idx = bisect.bisect_right(alts, altitude)
+        if idx == 0:
+            return angles[0]
+        if idx == len(alts):
+            return angles[-1]
+        frac = (altitude - alts[idx - 1]) / (alts[idx] - alts[idx - 1])
+        return angles[idx - 1] + frac * (angles[idx] - angles[idx - 1])
+
+    def angles(self, altitude, path):
+        import numpy as np
+        return np.interp(altitude, self.altitudes, self.radians)
+
+    def __repr__(self):
+        return "<{} {} points>".format(self.__class__.__name__, len(self.altitudes))
+
+def apsides(mu, radius, radialSpeed, horizontalSpeed):
+    """(periapsis, apoapsis) distances to the centre of the orbit through the given state.
+
+    Apoapsis is infinite on an escape trajectory. It comes from the energy (the major axis),
+    not from the eccentricity, so radial (zero momentum) orbits keep a finite one.
+    """
+    momentum = radius * horizontalSpeed
+    energy = 0.5 * (radialSpeed ** 2 + horizontalSpeed ** 2) - mu / radius
+    ecc = math.sqrt(max(1.0 + 2.0 * energy * momentum ** 2 / mu ** 2, 0.0))
+    pe = momentum ** 2 / (mu * (1.0 + ecc))
+    ap = -mu / energy - pe if energy < 0 else float("inf")
+    return (pe, ap)
+
+class Ascent(object):
+    """Flies a rocket along a pitch program (see the module docstring).
+
+    The rocket starts where its position is, moving straight up at its speed; `x' points downrange.
+    Flight log messages report the speed as the length of the velocity and the altitude
+    as the distance to the centre, the rocket position and speed are kept the same way.
+    """
+
+    def __init__(self, rocket, program, dt=0.01, controller=None):
+        """A `controller' (`control.Controller') sets the throttle of the stages."""
+        super(Ascent, self).__init__()
+        self.rocket = rocket
+        self.program = program
+        self.dt = dt
+        self.controller = controller
+        self.compiled = CompiledRocket(rocket)
+        position = rocket.position
+        self.planet = position.planet
+        self.mu = consts.G * self.planet.mass
+        self.x = 0.0
+        self.y = position.altitude
+        self.vx = 0.0
+        self.vy = rocket.speed or 0.0
+
+    radius = property(lambda s: math.hypot(s.x, s.y))
+    surfaceAltitude = property(lambda s: s.radius - s.planet.radius)
+    radialSpeed = property(lambda s: (s.x * s.vx + s.y * s.vy) / s.radius)
+    horizontalSpeed = property(lambda s: (s.y * s.vx - s.x * s.vy) / s.radius)
+    downrange = property(lambda s: s.planet.radius * math.atan2(s.x, s.y))
+
+    def apsides(self):
+        """(periapsis, apoapsis) surface altitudes of the current orbit."""
+        surface = self.planet.radius
+        (pe, ap) = apsides(self.mu, self.radius, self.radialSpeed, self.horizontalSpeed)
+        return (pe - surface, ap - surface)
+
+    def inOrbit(self):
+        """Closed orbit with the periapsis above the atmosphere (the surface of an airless body)."""
+        planet = self.planet
+        floor = planet.atmosphereHeight() if planet.hasAtmosphere else 0.0
+        (pe, ap) = self.apsides()
+        return pe > floor and ap < float("inf")
+
+    def fly(self):
+        """Yield the messages of `Rocket.fly' till the rocket is out of fuel."""
+        compiled = self.compiled
+        rocket = self.rocket
+        rocket._flying = compiled
+        try:
+            yield from self._fly()
+        finally:
+            rocket._flying = None
+            compiled.syncTanks()
+
+    def _fly(self):
+        compiled = self.compiled
+        rocket = self.rocket
+        program = self.program
+        dt = self.dt
+        position = rocket.position
+        planet = self.planet
+        gAt = planet.g
+        pressureAt = planet.pressureAt if planet.hasAtmosphere else None
+        densityAt = planet.densityAt if planet.knowDensity else None
+        surface = planet.radius
+        drag = rocket.drag
+        (x, y, vx, vy) = (self.x, self.y, self.vx, self.vy)
+
+        rocket.dt = dt
+        absTime = rocket.absTime
+        assert compiled.stages
+        compiled.reset()
+        version = None
+        safeTicks = 0
+        maxPressure = compiled.maxPressure()
+        controller = self.controller
+        controlAt = absTime if controller is not None else float("inf")
+
+        while compiled.nAttached:
+            r = math.hypot(x, y)
+            pressure = pressureAt(r) if pressureAt else 0.0
+            if safeTicks and absTime < controlAt:
+                safeTicks -= 1
+                consumed = compiled.drain(drains, dt, pressure)
+            else:
+                rocket.absTime = absTime
+                for msg in compiled.staging(absTime):
+                    yield msg
+                if not compiled.nAttached:
+                    break
+                if version != compiled.version:
+                    (active, thrust, mass, version) = (compiled.active, compiled.thrust, compiled.massKg, compiled.version)
+                if absTime >= controlAt:
+                    controlAt = absTime + controller.period
+                    if compiled.control(controller, absTime, r, math.hypot(vx, vy), mass):
+                        thrust = compiled.thrust
+                (drains, safeTicks) = compiled.drainPlan(dt, maxPressure)
+                safeTicks = max(safeTicks - 1, 0)
+                consumed = compiled.burn(dt, pressure)
+
+            if consumed:
+                g = gAt(r)
+                mass -= consumed
+                Isp = compiled._Isp(active, pressure, g)
+                density = densityAt(r) if densityAt else 0.0
+                speed = math.hypot(vx, vy)
+                (ux, uy) = (x / r, y / r) # up
+                (tx, ty) = (uy, -ux) # downrange
+                path = math.atan2(vx * tx + vy * ty, vx * ux + vy * uy)
+                pitch = program.angle(r - surface, path)
+                (sin, cos) = (math.sin(pitch), math.cos(pitch))
+
+                thrustdV = g * Isp * math.log((mass + consumed) / mass)
+                dragdV = 0.5 * density * speed * drag / mass * dt # per m/s of the velocity
+                vx += thrustdV * (cos * ux + sin * tx) - g * ux * dt - dragdV * vx
+                vy += thrustdV * (cos * uy + sin * ty) - g * uy * dt - dragdV * vy
+                if r - surface < 1e-2 and vx * ux + vy * uy < 0:
+                    # Standing on the ground
+                    (vx, vy) = (0.0, 0.0)
+                x += vx * dt
+                y += vy * dt
+
+                msg = messages.IntegratedFlightLog(
+                    consumed, mass, speed, pressure, thrust, Isp, g, density, drag, surface,
+                    dt, rocket, absTime,
+                )
+                endR = math.hypot(x, y)
+                endSpeed = math.hypot(vx, vy)
+                msg.effectivedV = endSpeed - speed
+                msg.moved(endR, endSpeed, gAt(endR))
+
+                (self.x, self.y, self.vx, self.vy) = (x, y, vx, vy)
+                position.altitude = endR
+                rocket.speed = endSpeed
+                rocket.absTime = absTime + dt
+                yield msg
+
+            absTime += dt
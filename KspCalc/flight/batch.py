@@ -0,0 +1,379 @@
+"""Vectorized batch simulator.
+
+Flies N rocket variants in lock-step. Every variant is lowered by `compiled.CompiledRocket',
+padded to common stage/tank/engine counts and the whole batch is advanced as NumPy arrays.
+Each variant follows exactly the same rules as the scalar engine (staging, ignition,
+fuel feed order), so staging events that happen at different times in different variants
+are handled per variant with masks.
+
+Requires NumPy.
+"""
+
+import numpy as np
+
+from KspCalc import consts
+from .compiled import (CompiledRocket, EMPTY_L)
+
+class BatchResult(object):
+    """Per-variant results of a batch simulation (all arrays have N rows)."""
+
+    def __init__(self, size, nStages, sampleTimes):
+        super(BatchResult, self).__init__()
+        self.size = size
+        self.sampleTimes = np.asarray(sampleTimes, dtype=float)
+        self.altitude = None # final surface altitude, m
+        self.speed = None # final speed, m/s
+        self.mass = None # final mass, kg
+        self.maxAlt = np.zeros(size) # max surface altitude, m
+        self.burnoutTime = np.zeros(size) # time of the last tick that consumed fuel, s
+        self.endTime = np.zeros(size) # time the last stage got separated, s
+        self.separationTime = np.full((size, nStages), np.nan) # per stage, NaN if not separated
+        self.sampleAlt = np.full((size, len(sampleTimes)), np.nan)
+        self.sampleSpeed = np.full((size, len(sampleTimes)), np.nan)
+        # Planar flights (`pitch' given) only
+        self.horizontalSpeed = None # final, m/s
+        self.downrange = None # final, m along the surface
+        self.periapsis = self.apoapsis = None # final orbit, surface altitudes, m (apoapsis inf if escaping)
+
+    def __repr__(self):
+        return "<{} variants={} maxAlt=[{}, {}]>".format(
+            self.__class__.__name__, self.size, self.maxAlt.min(), self.maxAlt.max())
+
+
+class BatchRocket(object):
+    """N rocket variants lowered to padded NumPy arrays."""
+
+    def __init__(self, rockets, drag=None, payload=None):
+        super(BatchRocket, self).__init__()
+        compiled = []
+        cache = {}
+        for rocket in rockets:
+            # Identical rocket objects (parameter grid) are lowered only once
+            key = id(rocket)
+            if key not in cache:
+                cache[key] = CompiledRocket(rocket)
+            compiled.append(cache[key])
+        planets = set(id(el.rocket.position.planet) for el in compiled)
+        if len(planets) != 1:
+            raise ValueError("All variants have to start from the same celestial body.")
+        clocks = set(el.rocket.absTime for el in compiled)
+        if len(clocks) != 1:
+            raise ValueError("All variants have to start at the same flight time (they fly in lock-step).")
+
+        self.rockets = tuple(el.rocket for el in compiled)
+        self.planet = compiled[0].rocket.position.planet
+        self.absTime = clocks.pop()
+        self.size = N = len(compiled)
+        self.nStages = S = max(len(el.stages) for el in compiled)
+        T = max(len(el.fuelL) for el in compiled)
+        Q = max(max(sum(len(eng) for eng in el.engThrust) for el in compiled), 1)
+        K = max(max(len(el.feedTanks(idx, len(el.stages))) for idx in range(len(el.stages)))
+            for el in compiled)
+        K = max(K, 1)
+        dummy = T # padding tank: always empty
+
+        self.fuel = np.zeros((N, T + 1))
+        self.tankStage = np.zeros((N, T + 1), dtype=int)
+        self.dryMass = np.zeros((N, S))
+        self.feed = np.full((N, S, K), dummy, dtype=int)
+        # Engines are flattened per variant, `engineStage' maps them back to the stages
+        self.thrust = np.zeros((N, Q))
+        self.vac = np.ones((N, Q)) # padding engines get dummy non-zero consumption
+        self.delta = np.zeros((N, Q))
+        self.engineStage = np.zeros((N, Q), dtype=int)
+        self.isEngine = np.zeros((N, Q), dtype=bool)
+        self.stageVac = np.zeros((N, S))
+        self.stageDelta = np.zeros((N, S))
+        self.engineCount = np.zeros((N, S), dtype=int)
+        self.igniteClosure = np.zeros((N, S, S), dtype=bool)
+        self.ignited = np.zeros((N, S), dtype=bool)
+        self.nAttached = np.zeros(N, dtype=int)
+        self.altitude = np.zeros(N)
+        self.speed = np.zeros(N)
+        self.drag = np.zeros(N)
+
+        for (n, el) in enumerate(compiled):
+            nS = len(el.stages)
+            self.nAttached[n] = nS
+            self.fuel[n, :len(el.fuelL)] = el.fuelL
+            self.tankStage[n, :len(el.tankStage)] = el.tankStage
+            self.dryMass[n, :nS] = el.dryMass
+            self.ignited[n, :nS] = [stage.ignited for stage in el.stages]
+            self.altitude[n] = el.rocket.position.altitude
+            self.speed[n] = el.rocket.speed or 0.0
+            self.drag[n] = el.rocket.drag
+            eng = 0
+            for idx in range(nS):
+                tanks = el.feedTanks(idx, nS)
+                self.feed[n, idx, :len(tanks)] = tanks
+                throttle = el.throttle[idx] # stays as set for the whole flight
+                for (thrust, vac, delta) in zip(el.engThrust[idx], el.engVac[idx], el.engDelta[idx]):
+                    self.thrust[n, eng] = thrust * throttle
+                    self.vac[n, eng] = vac * throttle
+                    self.delta[n, eng] = delta * throttle
+                    self.engineStage[n, eng] = idx
+                    self.isEngine[n, eng] = True
+                    eng += 1
+                self.stageVac[n, idx] = sum(el.engVac[idx]) * throttle
+                self.stageDelta[n, idx] = sum(el.engDelta[idx]) * throttle
+                self.engineCount[n, idx] = len(el.engThrust[idx])
+                self.igniteClosure[n, idx] = self._closure(el, idx, S)
+
+        if drag is not None:
+            self.drag[:] = drag
+        if payload is not None:
+            # Extra dead weight carried by the topmost stage
+            self.dryMass[:, 0] += payload
+        self.engineStages = tuple(np.flatnonzero(self.engineCount.any(axis=0)))
+
+        # Flat views used by the gathers of the stepping kernel
+        self.fuelFlat = self.fuel.reshape(-1)
+        self.feedLin = self.feed + (np.arange(N) * (T + 1))[:, None, None]
+        self.feedStage = np.take_along_axis(self.tankStage, self.feed.reshape(N, -1), axis=1).reshape(self.feed.shape)
+        self.topology()
+
+    @staticmethod
+    def _closure(compiled, idx, size):
+        rv = np.zeros(size, dtype=bool)
+        todo = [idx]
+        while todo:
+            cur = todo.pop()
+            if rv[cur]:
+                continue
+            rv[cur] = True
+            todo.extend(compiled.ignites[cur])
+        return rv
+
+    def topology(self):
+        """Recompute the cached masks after stage separation or ignition."""
+        rows = np.arange(self.size)[:, None]
+        nAttached = self.nAttached
+        self.stageAttached = np.arange(self.nStages)[None, :] < nAttached[:, None]
+        self.tankAttached = self.tankStage < nAttached[:, None]
+        self.feedAttached = self.feedStage < nAttached[:, None, None]
+        self.burning = self.ignited & self.stageAttached
+        self.nBurning = self.burning.sum(axis=1)
+        # `Rocket.Isp' weights: average over ignited stages of the average engine Isp
+        count = np.maximum(self.engineCount, 1)[rows, self.engineStage]
+        self.ispWeight = self.isEngine * self.burning[rows, self.engineStage] / count
+        self.massKg = (self.dryMass * self.stageAttached).sum(axis=1) + \
+            (self.fuel * self.tankAttached).sum(axis=1) / consts.FUEL_RHO
+        self._emptyKey = None
+
+    def stageEmpty(self):
+        """(N, S) mask of stages whose attached feed tanks are all empty."""
+        # Emptiness only changes when some tank crosses the empty threshold
+        key = np.count_nonzero(self.fuel >= EMPTY_L)
+        if key != self._emptyKey:
+            level = self.fuelFlat[self.feedLin]
+            self._empty = ~np.any((level >= EMPTY_L) & self.feedAttached, axis=2)
+            self._emptyKey = key
+        return self._empty
+
+
+def simulate_batch(rockets, dt=0.01, drag=None, payload=None, sampleAt=(), maxTime=None, pitch=None):
+    """Fly a batch of rocket variants in lock-step.
+
+    `rockets' is either a sequence of rockets (with their positions set) or a single
+    rocket; `drag' and `payload' (extra kg on the topmost stage) are broadcast over the
+    variants, so a single rocket plus a `drag' array flies one variant per drag value.
+    Variants start from the state of their rockets (position, speed, fuel, ignited stages,
+    throttles) at the flight time they share. `maxTime' (flight clock) cuts the flights short.
+
+    `sampleAt' is a sequence of flight clock times at which altitude and speed of every variant
+    are recorded, each variant by its own flight (the same rule as `fitting.DragFit' applies to
+    the scalar engine): the state at the end of the first tick of the variant that moves it and
+    ends at or after the given time. Once a variant's flight is over (its last stage separated)
+    the samples it has not reached yet take its final state. Samples past `maxTime' are NaN.
+    With an `ascent.PitchProgram' as `pitch' the variants fly planar ascents (`ascent.Ascent'),
+    its `parameters' may be arrays of per variant values and are broadcast as well.
+
+    Returns `BatchResult'.
+    """
+    if not isinstance(rockets, (list, tuple)):
+        sizes = [np.size(drag) if drag is not None else 1, np.size(payload) if payload is not None else 1]
+        if pitch is not None:
+            sizes.extend(np.size(getattr(pitch, name)) for name in pitch.parameters)
+        rockets = (rockets, ) * max(sizes)
+    batch = BatchRocket(rockets, drag=drag, payload=payload)
+    return _fly(batch, dt, sampleAt, maxTime, pitch)
+
+def _fly(batch, dt, sampleAt, maxTime, pitch=None):
+    N = batch.size
+    RHO = consts.FUEL_RHO
+    planet = batch.planet
+    surface = planet.radius
+    fuelFlat = batch.fuelFlat
+    nAttached = batch.nAttached
+    ignited = batch.ignited
+    allRows = np.arange(N)
+
+    sampleAt = sorted(sampleAt)
+    result = BatchResult(N, batch.nStages, sampleAt)
+    alt = batch.altitude
+    speed = batch.speed.copy()
+    result.maxAlt[:] = alt - surface
+    (due, first) = (0, 0) # samples due by the end of the tick, the first one some row still misses
+    flown = np.zeros(N, dtype=bool)
+    if pitch is not None:
+        # Planar state, see `ascent.Ascent' (starts moving straight up)
+        (x, y) = (np.zeros(N), alt.copy())
+        (vx, vy) = (np.zeros(N), speed.copy())
+
+    absTime = batch.absTime
+    while nAttached.any():
+        if maxTime is not None and absTime > maxTime:
+            break
+
+        # Separate empty ignited stages (the topmost one takes all below with it)
+        candidate = batch.burning & batch.stageEmpty()
+        hit = candidate.any(axis=1)
+        if hit.any():
+            rows = np.flatnonzero(hit)
+            _separate(batch, result, rows, np.argmax(candidate[rows], axis=1), absTime)
+
+        # Ignite bottom stage
+        live = nAttached > 0
+        bottom = np.maximum(nAttached - 1, 0)
+        toIgnite = live & ~ignited[allRows, bottom]
+        if toIgnite.any():
+            ignited[toIgnite] |= batch.igniteClosure[toIgnite, bottom[toIgnite]]
+            batch.topology()
+
+        # Separate useless bottom stages
+        while True:
+            live = nAttached > 0
+            bottom = np.maximum(nAttached - 1, 0)
+            bottomEmpty = live & batch.stageEmpty()[allRows, bottom]
+            if not bottomEmpty.any():
+                break
+            rows = np.flatnonzero(bottomEmpty)
+            _separate(batch, result, rows, bottom[rows], absTime)
+
+        ended = (nAttached == 0) & ~flown
+        if ended.any():
+            flown |= ended
+            _holdSamples(result, ended, alt - surface, speed)
+        if not nAttached.any():
+            break
+
+        # Consume fuel stage by stage (shared tanks are drained in the scalar engine order),
+        # each stage drains its feed tanks in order: a cumulative sum over the feed list.
+        pressure = planet.pressureAt(alt) if planet.hasAtmosphere else np.zeros(N)
+        burning = batch.burning
+        consumed = np.zeros(N)
+        for idx in batch.engineStages:
+            stageBurning = burning[:, idx]
+            if not stageBurning.any():
+                continue
+            lin = batch.feedLin[:, idx]
+            level = fuelFlat[lin] * batch.feedAttached[:, idx]
+            stageBurning = stageBurning & (level >= EMPTY_L).any(axis=1)
+            stageKg = (batch.stageVac[:, idx] + batch.stageDelta[:, idx] * pressure) / RHO
+            demand = np.where(stageBurning, stageKg * dt * RHO, 0.0)
+            before = np.cumsum(level, axis=1) - level
+            taken = np.clip(demand[:, None] - before, 0.0, level)
+            fuelFlat[lin] -= taken
+            consumed += taken.sum(axis=1) / RHO
+
+        moving = consumed != 0
+        if moving.any():
+            g = planet.g(alt)
+            startMass = batch.massKg
+            endMass = batch.massKg = startMass - consumed
+
+            engineKg = (batch.vac + batch.delta * pressure[:, None]) / RHO
+            Isp = (batch.thrust / (engineKg * g[:, None]) * batch.ispWeight).sum(axis=1) / \
+                np.maximum(batch.nBurning, 1)
+
+            density = planet.densityAt(alt) if planet.knowDensity else np.zeros(N)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                # Rows that are not moving (or already flown) produce junk here, masked out below
+                dragDeAccel = 0.5 * density * (speed ** 2) * batch.drag / endMass
+                tsailkovskydV = g * Isp * np.log(startMass / endMass)
+            if pitch is None:
+                dV = np.where(moving, (tsailkovskydV / dt - g - dragDeAccel) * dt, 0.0)
+
+                onSurface = moving & (np.abs(alt - surface) < 1e-2)
+                dV = np.where(onSurface, np.maximum(dV, 0), dV)
+                speed = np.where(onSurface, np.maximum(speed, 0), speed) + dV
+                alt += np.where(moving, speed * dt, 0.0)
+            else:
+                (speed, alt) = _planarTick(pitch, moving, x, y, vx, vy, alt, surface,
+                    tsailkovskydV, g, dragDeAccel, dt)
+            np.maximum(result.maxAlt, alt - surface, out=result.maxAlt)
+            result.burnoutTime[moving] = absTime
+
+            # The flight clock drifts by rounding, a tick ending within a millionth of dt is on time
+            end = absTime + dt * (1 + 1e-6)
+            while due < len(sampleAt) and sampleAt[due] <= end:
+                due += 1
+            for col in range(first, due):
+                rows = moving & np.isnan(result.sampleAlt[:, col])
+                result.sampleAlt[rows, col] = alt[rows] - surface
+                result.sampleSpeed[rows, col] = speed[rows]
+            while first < due and not np.isnan(result.sampleAlt[:, first]).any():
+                first += 1
+
+        absTime += dt
+
+    result.altitude = alt - surface
+    result.speed = speed
+    result.mass = batch.massKg
+    if pitch is not None:
+        (radial, horizontal) = ((x * vx + y * vy) / alt, (y * vx - x * vy) / alt)
+        (pe, ap) = _apsides(consts.G * planet.mass, alt, radial, horizontal)
+        result.horizontalSpeed = horizontal
+        result.downrange = surface * np.arctan2(x, y)
+        result.periapsis = pe - surface
+        result.apoapsis = ap - surface
+    return result
+
+def _planarTick(pitch, moving, x, y, vx, vy, alt, surface, tsailkovskydV, g, dragDeAccel, dt):
+    """`ascent.Ascent' tick of the moving rows (updates the state arrays in place).
+
+    Returns (speed, distance to the centre).
+    """
+    speed = np.hypot(vx, vy)
+    (ux, uy) = (x / alt, y / alt) # up
+    (tx, ty) = (uy, -ux) # downrange
+    path = np.arctan2(vx * tx + vy * ty, vx * ux + vy * uy)
+    angle = pitch.angles(alt - surface, path)
+    (sin, cos) = (np.sin(angle), np.cos(angle))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Rows that are not moving produce junk here (see `_fly'), masked out below
+        dragdV = np.where(speed > 0, dragDeAccel * dt / speed, 0.0) # per m/s of the velocity
+        newVx = vx + tsailkovskydV * (cos * ux + sin * tx) - g * ux * dt - dragdV * vx
+        newVy = vy + tsailkovskydV * (cos * uy + sin * ty) - g * uy * dt - dragdV * vy
+    grounded = (alt - surface < 1e-2) & (newVx * ux + newVy * uy < 0)
+    vx[:] = np.where(moving, np.where(grounded, 0.0, newVx), vx)
+    vy[:] = np.where(moving, np.where(grounded, 0.0, newVy), vy)
+    x += np.where(moving, vx * dt, 0.0)
+    y += np.where(moving, vy * dt, 0.0)
+    alt[:] = np.hypot(x, y)
+    return (np.hypot(vx, vy), alt)
+
+def _apsides(mu, radius, radialSpeed, horizontalSpeed):
+    """`ascent.apsides' of arrays."""
+    momentum = radius * horizontalSpeed
+    energy = 0.5 * (radialSpeed ** 2 + horizontalSpeed ** 2) - mu / radius
+    ecc = np.sqrt(np.maximum(1.0 + 2.0 * energy * momentum ** 2 / mu ** 2, 0.0))
+    pe = momentum ** 2 / (mu * (1.0 + ecc))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ap = np.where(energy < 0, -mu / energy - pe, np.inf)
+    return (pe, ap)
+
+def _holdSamples(result, rows, alt, speed):
+    """Samples the `rows' (mask) have not recorded yet take their current (final) state."""
+    missing = np.isnan(result.sampleAlt) & rows[:, None]
+    result.sampleAlt[missing] = np.broadcast_to(alt[:, None], missing.shape)[missing]
+    result.sampleSpeed[missing] = np.broadcast_to(speed[:, None], missing.shape)[missing]
+
+def _separate(batch, result, rows, stages, absTime):
+    nAttached = batch.nAttached
+    for (row, stage) in zip(rows, stages):
+        result.separationTime[row, stage:nAttached[row]] = absTime
+        nAttached[row] = stage
+        if stage == 0:
+            result.endTime[row] = absTime
+    batch.topology()
@@ -0,0 +1,86 @@
+"""Flight checkpoints.
+
+A checkpoint captures the state of a rocket in flight (attached stages, tank levels,
+ignition flags, throttles, fuel feed lists, position, speed and the flight clock) and
+forks any number of independent rockets continuing from there:
+
+    checkpoint = Checkpoint.after(rocket, 30, dt=0.01)
+    for drag in (1, 2, 3):
+        for msg in checkpoint.fork(drag=drag).fly(dt=0.01):
+            ...
+
+Forks reuse the part classes of the original rocket, no part lookup is done.
+"""
+
+class _StageState(object):
+    """Stage design plus its flight state."""
+
+    def __init__(self, stage):
+        super(_StageState, self).__init__()
+        self.stageCls = type(stage)
+        self.name = stage.name
+        self.partClasses = tuple(stage.partTypes)
+        self.ignites = stage._ignites
+        self.takesFuel = tuple(stage._takesFuel) if stage._takesFuel else None
+        self.ignited = stage.ignited
+        self.throttle = stage.throttle
+        self.fuelL = tuple(part.fuelL for part in stage.parts if part.isFuelTank)
+
+    def restore(self):
+        stage = self.stageCls(
+            parts=self.partClasses,
+            name=self.name,
+            ignites=self.ignites,
+            takesFuel=self.takesFuel and list(self.takesFuel),
+        )
+        for (part, level) in zip((part for part in stage.parts if part.isFuelTank), self.fuelL):
+            part.fuelL = level
+        stage.setThrottle(self.throttle)
+        return stage
+
+class Checkpoint(object):
+    """Snapshot of a rocket (see module docs)."""
+
+    def __init__(self, rocket):
+        super(Checkpoint, self).__init__()
+        if rocket._flying is not None:
+            # Compiled engines keep fuel levels to themselves
+            rocket._flying.syncTanks()
+        self.rocketCls = type(rocket)
+        self.name = rocket.name
+        self.drag = rocket.drag
+        self.position = rocket.position.copy()
+        self.speed = rocket.speed or 0.0
+        self.absTime = rocket.absTime
+        self.stages = tuple(_StageState(stage) for stage in rocket.stages)
+
+    @classmethod
+    def after(cls, rocket, time, **flyKwargs):
+        """Fly `rocket' till its clock reaches `time' (or the flight is over) and checkpoint it."""
+        flight = rocket.fly(**flyKwargs)
+        try:
+            for msg in flight:
+                if rocket.absTime >= time:
+                    break
+            return cls(rocket)
+        finally:
+            flight.close()
+
+    def fork(self, drag=None):
+        """New rocket continuing from the checkpoint (optionally with a different `drag')."""
+        rocket = self.rocketCls(
+            name=self.name,
+            stages=(el.restore() for el in self.stages),
+            drag=self.drag if drag is None else drag,
+        )
+        rocket.setPos(self.position.copy())
+        for (stage, state) in zip(rocket.stages, self.stages):
+            stage._ignited = state.ignited
+        rocket.speed = self.speed
+        rocket.absTime = self.absTime
+        rocket.invalidate()
+        return rocket
+
+    def __repr__(self):
+        return "<{} {!r} t={} alt={} speed={} stages={}>".format(
+            self.__class__.__name__, self.name, self.absTime, self.position.surfaceAltitude, self.speed, len(self.stages))
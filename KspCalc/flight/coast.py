@@ -0,0 +1,268 @@
+"""Unpowered flight after the burnout.
+
+`Rocket.fly' ends as soon as the last stage is out of fuel. `Coast' carries the burnt out
+rocket on to the apogee or to the surface impact:
+
+    in the atmosphere - adaptive RK45 steps (`integrators.adaptiveStep') of
+                            dv/dt = -g - 0.5 * rho * v * |v| * drag / m
+                        the apogee, the top of the atmosphere and the surface are located
+                        by root-finding inside the step they happen in;
+    in vacuum         - closed form radial Kepler orbit, a segment up to the apogee and one
+                        down to the top of the atmosphere (or to the surface).
+
+Vacuum segments are cut into `maxStep' long flight log messages so the reports keep their pace,
+each of them costs one solution of the Kepler equation whatever its length.
+A rocket without a drag coefficient coasts in vacuum all the way.
+"""
+
+import math
+
+from KspCalc import consts
+from . import messages
+from .integrators import (adaptiveStep, rk45Step, findRoot, RTOL, ATOL)
+
+UNTIL = ("apogee", "impact")
+MAX_STEP = 10.0 # s, upper bound for the coasting steps
+
+def radialAnomaly(mean, lo, hi, tol=1e-14):
+    """Solve `eta - sin(eta) = mean' for `eta' in [lo, hi] (Newton, bisection safeguarded)."""
+    eta = 0.5 * (lo + hi)
+    for _ in range(100):
+        err = eta - math.sin(eta) - mean
+        if abs(err) <= tol:
+            break
+        if err > 0:
+            hi = eta
+        else:
+            lo = eta
+        slope = 1.0 - math.cos(eta)
+        eta = eta - err / slope if slope else lo
+        if not lo < eta < hi:
+            eta = 0.5 * (lo + hi)
+        if hi - lo < tol:
+            break
+    return eta
+
+class _Orbit(object):
+    """Radial Kepler orbit through the given altitude (to the centre) and speed.
+
+    Parametrised with `eta' (0 - the centre, pi - the apogee, 2 pi - the centre again):
+
+        r = top * sin^2(eta / 2), t = k * (eta - sin(eta)), v = sqrt(2 mu / top) / tan(eta / 2)
+    """
+
+    def __init__(self, mu, altitude, speed):
+        super(_Orbit, self).__init__()
+        self.mu = mu
+        energy = 0.5 * speed * speed - mu / altitude
+        self.bound = energy < 0
+        if not self.bound:
+            return
+        self.top = -mu / energy
+        self.k = math.sqrt(self.top ** 3 / (8.0 * mu))
+        self.vTop = math.sqrt(2.0 * mu / self.top)
+        if speed == 0:
+            self.eta0 = math.pi
+        else:
+            self.eta0 = 2.0 * math.asin(math.sqrt(min(altitude / self.top, 1.0)))
+            if speed < 0:
+                self.eta0 = 2.0 * math.pi - self.eta0
+
+    def etaDown(self, altitude):
+        """`eta' of the descent through `altitude'."""
+        return 2.0 * math.pi - 2.0 * math.asin(math.sqrt(min(altitude / self.top, 1.0)))
+
+    def time(self, eta):
+        """Seconds from `eta0' to `eta'."""
+        return self.k * ((eta - math.sin(eta)) - (self.eta0 - math.sin(self.eta0)))
+
+    def at(self, time, etaEnd):
+        """(altitude, speed) `time' seconds past `eta0' (`etaEnd' bounds the search)."""
+        mean = time / self.k + self.eta0 - math.sin(self.eta0)
+        return self.state(radialAnomaly(mean, self.eta0, etaEnd))
+
+    def state(self, eta):
+        half = 0.5 * eta
+        return (self.top * math.sin(half) ** 2, self.vTop / math.tan(half))
+
+class Coast(object):
+    """Coasts a burnt out rocket to the apogee or to the surface impact (see the module docstring).
+
+    Once reached, `apogee' holds (time, altitude) and `impact' holds (time, speed).
+    `escaped' is set when the rocket leaves on an escape trajectory (there is nothing to coast to).
+    """
+
+    apogee = impact = None
+    escaped = False
+    mass = None # kg, the burnt out rocket (see `follow')
+
+    def __init__(self, rocket, until="apogee", dt=0.1, maxStep=MAX_STEP, rtol=RTOL, atol=ATOL):
+        super(Coast, self).__init__()
+        if until not in UNTIL:
+            raise ValueError("Unknown coast end {!r}. Known ones are: {}".format(until, UNTIL))
+        self.rocket = rocket
+        self.until = until
+        self.dt = dt
+        self.maxStep = maxStep
+        self.rtol = rtol
+        self.atol = atol
+
+    def follow(self, flight):
+        """Pass the messages (and the requests sent) of a `Rocket.fly' generator through, coast once it is over.
+
+        The burnt out rocket is what is still attached or else the stages separated by the last staging.
+        """
+        burst = (None, 0.0) # (time, kg) of the last separations
+        request = None
+        try:
+            while True:
+                try:
+                    msg = flight.send(request)
+                except StopIteration:
+                    break
+                if msg.msgType == "StageSeparation":
+                    (time, kg) = burst
+                    burst = (msg.absTime, (kg if time == msg.absTime else 0.0) + msg.stage.mass)
+                request = yield msg
+        finally:
+            flight.close()
+        rocket = self.rocket
+        self.mass = rocket.mass if rocket.stages else burst[1]
+        yield from self.fly()
+
+    def fly(self):
+        """Coast `mass' kilograms from the current rocket position and speed."""
+        rocket = self.rocket
+        position = rocket.position
+        planet = position.planet
+        surface = planet.radius
+        if self.mass is None:
+            self.mass = rocket.mass
+        if not self.mass:
+            return
+
+        self.gAt = planet.g
+        self.pressureAt = planet.pressureAt if planet.hasAtmosphere else None
+        self.densityAt = planet.densityAt if planet.knowDensity else None
+        if self.densityAt and rocket.drag:
+            top = surface + planet.atmosphereHeight()
+        else:
+            top = surface
+        mu = consts.G * planet.mass
+        rocket.dt = self.dt
+        absTime = rocket.absTime
+        alt = position.altitude
+        speed = rocket.speed or 0.0
+        h = self.dt
+
+        while True:
+            if alt - surface < 1e-2 and speed <= 0:
+                self.impact = (absTime, speed)
+                return
+            if alt > top or (alt >= top and speed >= 0):
+                orbit = _Orbit(mu, alt, speed)
+                if not orbit.bound:
+                    self.escaped = True
+                    return
+                steps = self._vacuum(orbit, top, absTime)
+            else:
+                steps = self._atmosphere(alt, speed, h, top, surface)
+            for (tau, y1, event) in steps:
+                msg = self._log(speed, y1, tau, absTime)
+                absTime += tau
+                (alt, speed) = y1
+                if event == "apogee":
+                    self.apogee = (absTime, alt)
+                elif event == "impact":
+                    self.impact = (absTime, speed)
+                    (alt, speed) = (surface, 0.0)
+                position.altitude = alt
+                rocket.speed = speed
+                rocket.absTime = absTime
+                yield msg
+                if event == "impact" or (event == "apogee" and self.until == "apogee"):
+                    return
+                if event:
+                    break
+            h = self._nextStep
+
+    _nextStep = None
+
+    def _vacuum(self, orbit, top, absTime):
+        """Steps (seconds, (altitude, speed), event) of the closed form segment."""
+        if orbit.eta0 < math.pi:
+            (etaEnd, event) = (math.pi, "apogee")
+        else:
+            (etaEnd, event) = (orbit.etaDown(top), "atmosphere" if top > self.rocket.position.planet.radius else "impact")
+        duration = orbit.time(etaEnd)
+        time = 0.0
+        while time + self.maxStep < duration:
+            yield (self.maxStep, orbit.at(time + self.maxStep, etaEnd), None)
+            time += self.maxStep
+        (alt, speed) = orbit.state(etaEnd)
+        if event == "apogee":
+            speed = 0.0
+        elif event == "atmosphere":
+            alt = top
+        self._nextStep = self.dt
+        yield (duration - time, (alt, speed), event)
+
+    def _atmosphere(self, alt, speed, h, top, surface):
+        """Adaptive steps of the segment in the atmosphere."""
+        deriv = lambda y: [y[1], self.accel(y)]
+        step = lambda y, tau: rk45Step(deriv, y, tau)[0]
+        events = [("impact", lambda y: y[0] - surface)]
+        if speed > 0:
+            events.append(("apogee", lambda y: y[1]))
+            events.append(("atmosphere", lambda y: top - y[0]))
+        y0 = [alt, speed]
+        while True:
+            (y1, h, self._nextStep) = adaptiveStep(deriv, y0, h, self.maxStep, self.rtol, self.atol)
+            hit = None
+            for (name, event) in events:
+                (before, after) = (event(y0), event(y1))
+                if before > 0 and after <= 0:
+                    tau = findRoot(lambda tau: event(step(y0, tau)), 0.0, h, before, after)
+                    if hit is None or tau < hit[0]:
+                        hit = (tau, name)
+            if hit:
+                (h, name) = hit
+                y1 = step(y0, h)
+                if name == "apogee":
+                    y1[1] = 0.0
+                elif name == "atmosphere":
+                    y1[0] = top
+                yield (h, tuple(y1), name)
+                return
+            yield (h, tuple(y1), None)
+            (y0, h) = (y1, self._nextStep)
+
+    def accel(self, y):
+        (alt, speed) = y
+        density = self.densityAt(alt) if self.densityAt else 0.0
+        return -self.gAt(alt) - 0.5 * density * speed * abs(speed) * self.rocket.drag / self.mass
+
+    def _log(self, speed, y1, h, absTime):
+        """Flight log message of the step ending at `y1'."""
+        rocket = self.rocket
+        planet = rocket.position.planet
+        alt = y1[0]
+        g = self.gAt(alt)
+        msg = messages.IntegratedFlightLog(
+            consumedKg=0.0,
+            endMass=self.mass,
+            speed=speed,
+            pressure=self.pressureAt(alt) if self.pressureAt else 0.0,
+            thrust=0.0,
+            Isp=0.0,
+            g=g,
+            airDensity=self.densityAt(alt) if self.densityAt else 0.0,
+            dragCoef=rocket.drag,
+            surface=planet.radius,
+            dt=h,
+            rocket=rocket,
+            absTime=absTime,
+        )
+        msg.effectivedV = y1[1] - speed
+        msg.moved(alt, y1[1], g)
+        return msg
@@ -0,0 +1,446 @@
+"""Compiled flight engine.
+
+The Rocket/Stage/Part object graph is lowered once into flat lists
+(masses, tank fuel levels, engine consumption, stage topology and fuel feed maps)
+and a tight kernel advances them.
+
+The kernel reproduces the object-graph engine (`Rocket.fly') tick by tick:
+stage separation events happen on the same ticks and the trajectory matches
+up to the floating point accumulation error (well within `RTOL').
+"""
+
+from KspCalc import consts
+from . import (messages, control)
+
+RTOL = 1e-6 # Relative tolerance between compiled and object-graph trajectories
+EMPTY_L = 1e-6 # Tank is considered empty below this fuel level (see `FuelTank.empty')
+
+class CompiledRocket(object):
+    """Rocket lowered to the flat arrays."""
+
+    nAttached = 0 # stages [0, nAttached) are still attached
+    version = 0 # bumped on every topology change
+
+    def __init__(self, rocket):
+        super(CompiledRocket, self).__init__()
+        self.rocket = rocket
+        self.stages = stages = tuple(rocket.stages)
+        stageIdx = dict((id(stage), idx) for (idx, stage) in enumerate(stages))
+
+        self.tankParts = []
+        self.tankStage = []
+        self.fuelL = []
+        self.dryMass = [] # per stage, kg (parts and empty tanks)
+        self.stageTanks = []
+        self.engThrust = []
+        self.engVac = []
+        self.engDelta = []
+
+        for (idx, stage) in enumerate(stages):
+            dry = 0.0
+            tanks = []
+            thrust = []
+            vac = []
+            delta = []
+            for part in stage.parts:
+                if part.isFuelTank:
+                    tanks.append(len(self.tankParts))
+                    self.tankParts.append(part)
+                    self.tankStage.append(idx)
+                    # A group of identical tanks drains evenly, as one big tank
+                    self.fuelL.append(part.fuelL * part.count)
+                    dry += part.massEmpty * part.count
+                else:
+                    dry += part.mass * part.count
+                if part.isEngine:
+                    cons = part.consumptionL
+                    thrust.extend((part.maxThrust, ) * part.count)
+                    vac.extend((cons.vac, ) * part.count)
+                    delta.extend((cons.atm - cons.vac, ) * part.count)
+            self.dryMass.append(dry)
+            self.stageTanks.append(tuple(tanks))
+            self.engThrust.append(tuple(thrust))
+            self.engVac.append(tuple(vac))
+            self.engDelta.append(tuple(delta))
+
+        self.throttle = [stage.throttle for stage in stages]
+
+        # Ignition map: stage -> stages it ignites
+        self.ignites = []
+        for stage in stages:
+            targets = (rocket.getStage(name, None) for name in (stage._ignites or ()))
+            self.ignites.append(tuple(stageIdx[id(el)] for el in targets if el is not None))
+
+        # Fuel feed map: stage -> source stages in consumption order
+        self.sources = []
+        for stage in stages:
+            if stage._takesFuel:
+                sources = []
+                for name in stage._takesFuel:
+                    src = stage if name == "self" else rocket.getStage(name, None)
+                    if src is not None:
+                        sources.append(stageIdx[id(src)])
+            else:
+                sources = [stageIdx[id(stage)]]
+            self.sources.append(tuple(sources))
+
+    def feedTanks(self, stage, nAttached):
+        """Tanks `stage' takes fuel from while `nAttached' top stages are still attached."""
+        rv = []
+        for src in self.sources[stage]:
+            if src < nAttached:
+                rv.extend(self.stageTanks[src])
+        return rv
+
+    def mass(self, nAttached):
+        rv = sum(self.dryMass[:nAttached])
+        for (tank, level) in enumerate(self.fuelL):
+            if self.tankStage[tank] < nAttached:
+                rv += level / consts.FUEL_RHO
+        return rv
+
+    def syncTanks(self):
+        """Write fuel levels (and throttles) back to the part objects."""
+        for (part, level) in zip(self.tankParts, self.fuelL):
+            part.fuelL = level / part.count
+        for (stage, throttle) in zip(self.stages, self.throttle):
+            stage.setThrottle(throttle)
+            stage.invalidate()
+        self.rocket.invalidate()
+
+    def fly(self, dt=0.1, integrator=None, controller=None):
+        """Fly rocket till it is out of fuel.
+
+        Yields the same messages as `Rocket.fly'. Flight log messages carry
+        a snapshot of the rocket state, the rocket object itself only has its
+        position and speed kept up to date every tick (fuel levels and the
+        stage list are synchronised on stage separation and when the flight ends).
+
+        `integrator' selects the fixed-tick Euler kernel (None or "euler") or one of
+        the event-driven `integrators.EventFlight' methods ("rk4", "rk45"), `dt' being
+        the step (initial step for "rk45") then.
+
+        The Euler kernel accepts `messages.FastForward' requests sent to the generator.
+        A `controller' (`control.Controller') sets the throttle of the stages.
+        """
+        if integrator in (None, "euler"):
+            flight = self._fly(dt, controller)
+        else:
+            from .integrators import EventFlight
+            flight = EventFlight(self, integrator, dt=dt, controller=controller).fly()
+        self.rocket._flying = self
+        try:
+            yield from flight
+        finally:
+            self.rocket._flying = None
+            self.syncTanks()
+
+    def reset(self):
+        """Reset the stepping state to the one of the rocket object."""
+        self.nAttached = len(self.stages)
+        self.ignited = [stage.ignited for stage in self.stages]
+        self.throttle = [stage.throttle for stage in self.stages]
+        self.topology()
+
+    def topology(self):
+        """Rebuild cached per-topology state after a separation or an ignition."""
+        nAttached = self.nAttached
+        self.feeds = [self.feedTanks(idx, nAttached) for idx in range(nAttached)]
+        self.active = tuple(idx for idx in range(nAttached) if self.ignited[idx])
+        self.thrust = sum(sum(self.engThrust[idx]) * self.throttle[idx] for idx in self.active)
+        self.massKg = self.mass(nAttached)
+        self.version += 1
+
+    def staging(self, absTime):
+        """Separate empty stages and ignite the bottom one (same rules as `Rocket.fly').
+
+        Yields stage separation messages.
+        """
+        # Separate empty ignited stages
+        for idx in self.active:
+            if self._empty(self.feeds[idx]):
+                for msg in self._separate(idx, absTime):
+                    yield msg
+                self.nAttached = idx
+                self.topology()
+                break
+
+        bottom = self.nAttached - 1
+        if self.nAttached and not self.ignited[bottom]:
+            self.stages[bottom].ignite()
+            self.ignited = [stage.ignited for stage in self.stages]
+            self.topology()
+
+        # Separate useless bottom stages
+        while self.nAttached and self._empty(self.feeds[self.nAttached - 1]):
+            for msg in self._separate(self.nAttached - 1, absTime):
+                yield msg
+            self.nAttached -= 1
+            self.topology()
+
+    def control(self, controller, absTime, altitude, speed, mass):
+        """Ask `controller' (`control.Controller') for the throttle of the burning stages and set it.
+
+        Returns whether some throttle changed.
+        """
+        planet = self.rocket.position.planet
+        burning = [idx for idx in self.active if self.engThrust[idx] and not self._empty(self.feeds[idx])]
+        state = control.ControlState(
+            time=absTime,
+            altitude=altitude - planet.radius,
+            speed=speed,
+            mass=mass,
+            g=planet.g(altitude),
+            airDensity=planet.densityAt(altitude) if planet.knowDensity else 0.0,
+            dragCoef=self.rocket.drag,
+            maxThrust=sum(sum(self.engThrust[idx]) for idx in burning),
+        )
+        changed = False
+        for (idx, value) in controller.throttles(state, [(idx, self.stages[idx].name) for idx in burning]).items():
+            if self.throttle[idx] != value:
+                self.throttle[idx] = value
+                changed = True
+        if changed:
+            self.thrust = sum(sum(self.engThrust[idx]) * self.throttle[idx] for idx in self.active)
+        return changed
+
+    def _fly(self, dt, controller=None):
+        rocket = self.rocket
+        fuelL = self.fuelL
+        engVac = self.engVac
+        engDelta = self.engDelta
+        RHO = consts.FUEL_RHO
+
+        rocket.speed = speed = rocket.speed or 0.0
+        rocket.dt = dt
+        drag = rocket.drag
+        position = rocket.position
+        planet = position.planet
+        gAt = planet.g
+        pressureAt = planet.pressureAt if planet.hasAtmosphere else None
+        densityAt = planet.densityAt if planet.knowDensity else None
+        surface = planet.radius
+
+        absTime = rocket.absTime
+        assert self.stages
+        self.reset()
+        version = None
+
+        safeTicks = 0
+        maxPressure = self.maxPressure()
+        quiet = None # `messages.FastForward' being served
+        # Throttle stays constant till the next controller update
+        controlAt = absTime if controller is not None else float("inf")
+        throttle = self.throttle
+
+        while self.nAttached:
+            alt = position.altitude
+            pressure = pressureAt(alt) if pressureAt else 0.0
+            consumed = 0
+
+            if safeTicks and absTime < controlAt:
+                # No tank can run dry during this tick: staging is a no-op
+                # and every stage drains just its current tank (`drain' inlined).
+                safeTicks -= 1
+                for (idx, tank) in drains:
+                    consumption = 0
+                    for (vac, delta) in zip(engVac[idx], engDelta[idx]):
+                        consumption += (vac + delta * pressure) / RHO
+                    consumeMax = consumption * throttle[idx] * dt
+                    fuelL[tank] -= consumeMax * RHO
+                    consumed += consumeMax
+            else:
+                rocket.absTime = absTime
+                for msg in self.staging(absTime):
+                    request = yield msg
+                    if request is not None:
+                        quiet = request
+                        quiet.active = True
+
+                if not self.nAttached:
+                    break
+
+                if version != self.version:
+                    active = self.active
+                    thrust = self.thrust
+                    mass = self.massKg
+                    version = self.version
+
+                if absTime >= controlAt:
+                    controlAt = absTime + controller.period
+                    if self.control(controller, absTime, alt, speed, mass):
+                        thrust = self.thrust
+
+                (drains, safeTicks) = self.drainPlan(dt, maxPressure)
+                # This tick is a slow one as well
+                safeTicks = max(safeTicks - 1, 0)
+                consumed = self.burn(dt, pressure)
+
+            if consumed:
+                g = gAt(alt)
+                mass -= consumed
+                Isp = self._Isp(active, pressure, g)
+                density = densityAt(alt) if densityAt else 0.0
+
+                if quiet is None:
+                    msg = messages.FlightLog(
+                        consumed, mass, speed, pressure, thrust, Isp, g, density, drag, surface,
+                        dt, rocket, absTime,
+                    )
+                    dV = msg.effectivedV
+                else:
+                    msg = None
+                    dV = messages.eulerdV(consumed, mass, speed, Isp, g, density, drag, dt)
+
+                if abs(alt - surface) < 1e-2:
+                    dV = max(dV, 0)
+                    speed = max(speed, 0)
+
+                speed += dV
+                alt += speed * dt
+                rocket.speed = speed
+                position.altitude = alt
+                rocket.absTime = absTime + dt
+
+                if msg is None:
+                    if not quiet.tick(absTime):
+                        quiet = None
+                else:
+                    msg.moved(alt, speed, gAt(alt))
+                    request = yield msg
+                    if request is not None:
+                        quiet = request
+                        quiet.active = True
+
+            absTime += dt
+
+    def burn(self, dt, pressure):
+        """Drain the feed tanks of the burning stages for a tick, in the feed order.
+
+        Returns kilograms consumed.
+        """
+        fuelL = self.fuelL
+        RHO = consts.FUEL_RHO
+        consumed = 0
+        for idx in self.active:
+            tanks = self.feeds[idx]
+            if self._empty(tanks):
+                continue
+            consumption = 0
+            for (vac, delta) in zip(self.engVac[idx], self.engDelta[idx]):
+                consumption += (vac + delta * pressure) / RHO
+            consumeMax = consumption * self.throttle[idx] * dt
+            amount = consumeMax
+            for tank in tanks:
+                litres = amount * RHO
+                level = fuelL[tank]
+                taken = level if level < litres else litres
+                fuelL[tank] = level - taken
+                amount = (litres - taken) / RHO
+                if amount == 0:
+                    break
+            consumed += consumeMax - amount
+        return consumed
+
+    def drain(self, drains, dt, pressure):
+        """`burn' for a tick during which no tank runs dry (`drains' of `drainPlan').
+
+        Returns kilograms consumed.
+        """
+        fuelL = self.fuelL
+        RHO = consts.FUEL_RHO
+        consumed = 0
+        for (idx, tank) in drains:
+            consumption = 0
+            for (vac, delta) in zip(self.engVac[idx], self.engDelta[idx]):
+                consumption += (vac + delta * pressure) / RHO
+            consumeMax = consumption * self.throttle[idx] * dt
+            fuelL[tank] -= consumeMax * RHO
+            consumed += consumeMax
+        return consumed
+
+    def maxPressure(self):
+        """Upper bound of the pressure the rocket can meet (the surface one)."""
+        planet = self.rocket.position.planet
+        if planet.hasAtmosphere:
+            return max(planet.pressureAt(planet.radius), planet.pressureAt(self.rocket.position.altitude))
+        return 0.0
+
+    def drains(self):
+        """Tanks currently drained by the burning stages: ((stage, tank), ...).
+
+        Returns None if some stage is about to switch tanks (its first non-dry
+        tank holds less than the "empty" threshold).
+        """
+        fuelL = self.fuelL
+        rv = []
+        for idx in self.active:
+            if not self.engThrust[idx]:
+                continue
+            for tank in self.feeds[idx]:
+                if fuelL[tank] > 0:
+                    if fuelL[tank] < EMPTY_L:
+                        return None
+                    rv.append((idx, tank))
+                    break
+        return rv
+
+    def stageConsumption(self, idx, pressure):
+        """Stage fuel consumption in kg/s (at its throttle)."""
+        RHO = consts.FUEL_RHO
+        return sum((vac + delta * pressure) / RHO for (vac, delta) in zip(self.engVac[idx], self.engDelta[idx])) * self.throttle[idx]
+
+    def drainPlan(self, dt, maxPressure):
+        """Closed-form bound on the upcoming Euler ticks during which no tank can run dry.
+
+        Returns (drains, ticks): the (stage, tank) pairs being drained and the number of
+        ticks (starting with the current one) guaranteed to keep the topology, ignition
+        and stage emptiness as they are.
+        """
+        if not self.nAttached or not self.ignited[self.nAttached - 1]:
+            # New bottom stage is to be ignited on the next tick
+            return ((), 0)
+        drains = self.drains()
+        if drains is None:
+            return ((), 0)
+        perTick = {}
+        for (idx, tank) in drains:
+            maxKg = max(self.stageConsumption(idx, 0.0), self.stageConsumption(idx, maxPressure))
+            perTick[tank] = perTick.get(tank, 0.0) + maxKg * dt * consts.FUEL_RHO
+        ticks = None
+        for (tank, litres) in perTick.items():
+            left = int((self.fuelL[tank] - EMPTY_L) / litres) - 1 if litres else None
+            if left is not None and (ticks is None or left < ticks):
+                ticks = left
+        if ticks is None or ticks < 0:
+            ticks = 0
+        return (tuple(drains), ticks)
+
+    def _empty(self, tanks):
+        fuelL = self.fuelL
+        for tank in tanks:
+            if fuelL[tank] >= EMPTY_L:
+                return False
+        return True
+
+    def _Isp(self, active, pressure, g):
+        # Mirrors `Rocket.Isp': average of the stage averages of the engine Isp
+        RHO = consts.FUEL_RHO
+        total = 0.0
+        for idx in active:
+            stageTotal = 0.0
+            count = 0
+            for (thrust, vac, delta) in zip(self.engThrust[idx], self.engVac[idx], self.engDelta[idx]):
+                stageTotal += thrust / (((vac + delta * pressure) / RHO) * g)
+                count += 1
+            if count:
+                total += stageTotal / count
+        if active:
+            return total / len(active)
+        return 0
+
+    def _separate(self, idx, absTime):
+        self.syncTanks()
+        for msg in self.rocket.separateStage(self.stages[idx]):
+            msg.setAbsTime(absTime)
+            yield msg
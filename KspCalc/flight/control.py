@@ -0,0 +1,147 @@
+"""Throttle control.
+
+Engines burn at full throttle unless a `Controller' flies the rocket. The engines ask it for
+the throttle of the burning stages every `period' seconds of the flight clock (rather than every
+tick) and keep the throttle as it is in between, so an interval of constant throttle is one segment
+for the fast paths (safe ticks of the compiled kernel, long steps of the event-driven integrators).
+
+The throttle of a stage scales the thrust and the fuel flow of its engines (`LFE.thrust',
+`LFE.consumptionKg'), Isp stays the same. A throttled down engine still burns: the throttle is kept
+within [`MIN_THROTTLE', 1] as a flight ends once nothing burns.
+
+    for msg in rocket.fly(dt=0.01, controller=control.TwrLimit(2.0)):
+        ...
+"""
+
+import math
+
+from KspCalc import consts
+
+MIN_THROTTLE = 0.01
+
+class ControlState(object):
+    """Flight state a controller decides on (at the start of the tick it is called on)."""
+
+    __slots__ = ("time", "altitude", "speed", "mass", "g", "airDensity", "dragCoef", "maxThrust")
+
+    weight = property(lambda s: s.mass * s.g)
+    dragForce = property(lambda s: 0.5 * s.airDensity * (s.speed ** 2) * s.dragCoef)
+    maxTwr = property(lambda s: s.maxThrust / s.weight)
+
+    def __init__(self, time, altitude, speed, mass, g, airDensity, dragCoef, maxThrust):
+        super(ControlState, self).__init__()
+        self.time = time
+        self.altitude = altitude # above the ground, m
+        self.speed = speed
+        self.mass = mass
+        self.g = g
+        self.airDensity = airDensity
+        self.dragCoef = dragCoef
+        self.maxThrust = maxThrust # N, the burning stages at full throttle
+
+class Controller(object):
+    """Base throttle controller.
+
+    `update' gets a `ControlState' and returns the throttle for all the burning stages,
+    a {stage name: throttle} dict or None to keep the throttle as it is.
+    """
+
+    period = 1.0 # s of the flight clock between the updates
+    minThrottle = MIN_THROTTLE
+
+    def __init__(self, period=None):
+        super(Controller, self).__init__()
+        if period is not None:
+            self.period = float(period)
+
+    def update(self, state):
+        raise NotImplementedError
+
+    def throttles(self, state, stages):
+        """{key: throttle} of `stages' ((key, stage name), ... of the burning stages) to set."""
+        rv = self.update(state)
+        if rv is None:
+            return {}
+        if isinstance(rv, dict):
+            found = dict((key, rv[name]) for (key, name) in stages if name in rv)
+        else:
+            found = dict((key, rv) for (key, _) in stages)
+        return dict((key, self.clamp(value)) for (key, value) in found.items())
+
+    def clamp(self, value):
+        return min(max(float(value), self.minThrottle, MIN_THROTTLE), 1.0)
+
+    def __repr__(self):
+        return "<{} period={}>".format(self.__class__.__name__, self.period)
+
+class Constant(Controller):
+    """Fixed throttle (a number or a {stage name: throttle} dict)."""
+
+    def __init__(self, throttle, period=None):
+        super(Constant, self).__init__(period)
+        self.throttle = throttle
+
+    def update(self, state):
+        return self.throttle
+
+    def __repr__(self):
+        return "<{} {!r} period={}>".format(self.__class__.__name__, self.throttle, self.period)
+
+class TwrLimit(Controller):
+    """Thrust to weight ratio kept at or below `maxTwr'."""
+
+    def __init__(self, maxTwr, period=None):
+        super(TwrLimit, self).__init__(period)
+        self.maxTwr = float(maxTwr)
+
+    def update(self, state):
+        if not state.maxThrust:
+            return None
+        return self.maxTwr * state.weight / state.maxThrust
+
+    def __repr__(self):
+        return "<{} {} period={}>".format(self.__class__.__name__, self.maxTwr, self.period)
+
+class GLimit(Controller):
+    """Acceleration the crew feels (thrust less drag per mass) kept at or below `maxG' of `consts.G0'."""
+
+    def __init__(self, maxG, period=None):
+        super(GLimit, self).__init__(period)
+        self.maxG = float(maxG)
+
+    def update(self, state):
+        if not state.maxThrust:
+            return None
+        return (self.maxG * consts.G0 * state.mass + state.dragForce) / state.maxThrust
+
+    def __repr__(self):
+        return "<{} {} period={}>".format(self.__class__.__name__, self.maxG, self.period)
+
+class TerminalVelocity(Controller):
+    """Full throttle below the terminal velocity, just enough thrust to hold the speed at it."""
+
+    def update(self, state):
+        if not (state.maxThrust and state.airDensity and state.dragCoef):
+            return 1.0
+        terminal = math.sqrt(2.0 * state.weight / (state.airDensity * state.dragCoef))
+        if state.speed < terminal:
+            return 1.0
+        return (state.weight + state.dragForce) / state.maxThrust
+
+CONTROLLERS = {
+    "constant": Constant,
+    "twr": TwrLimit,
+    "g": GLimit,
+    "terminal": TerminalVelocity,
+}
+
+def parse(text):
+    """Controller from "<name>[:<value>][@<period>]", e.g. "twr:2", "g:4@0.5" or "terminal"."""
+    (text, _, period) = text.partition("@")
+    (name, _, value) = text.partition(":")
+    try:
+        cls = CONTROLLERS[name.strip()]
+    except KeyError:
+        raise ValueError("Unknown controller {!r}. Known controllers are: {}".format(name, tuple(sorted(CONTROLLERS))))
+    args = (float(value), ) if value else ()
+    return cls(*args, period=float(period) if period else None)
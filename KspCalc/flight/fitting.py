@@ -0,0 +1,147 @@
+"""Fitting rocket parameters to the observed flight telemetry."""
+
+from .compiled import CompiledRocket
+
+class Observation(object):
+    """Telemetry observed in flight: surface altitude (and optionally speed) at given time."""
+
+    def __init__(self, time, altitude, speed=None):
+        super(Observation, self).__init__()
+        self.time = float(time)
+        self.altitude = float(altitude)
+        self.speed = None if speed is None else float(speed)
+
+    @classmethod
+    def fromAny(cls, data):
+        """Accepts an `Observation', a (time, altitude[, speed]) tuple or a dict."""
+        if isinstance(data, cls):
+            return data
+        if isinstance(data, dict):
+            return cls(**data)
+        return cls(*data)
+
+    def __repr__(self):
+        return "<{} t={} alt={} speed={}>".format(self.__class__.__name__, self.time, self.altitude, self.speed)
+
+class DragFit(object):
+    """Finds the drag coefficient that reproduces the observations best.
+
+    Every round flies a grid of `candidates' drag values at once (`batch.simulate_batch',
+    the scalar compiled engine if NumPy is missing) and narrows the bracket around the best
+    one, the answer is the vertex of the parabola through the best candidate and its neighbours.
+    The bracket grows past `maxDrag' (at most `maxExpansions' times) while the highest drag fits best.
+    Flights are cut short right after the last observation. The simulated state an observation
+    is compared with is the one at the end of the tick reaching its time, the final state of
+    the flight (the burnt out rocket) when the flight is over by then (see `batch.simulate_batch').
+    """
+
+    def __init__(self, rocket, observations, dt=0.01, maxDrag=100.0, candidates=32, tolerance=0.005, maxExpansions=10):
+        super(DragFit, self).__init__()
+        if not observations:
+            raise ValueError("At least one observation is required.")
+        if candidates < 3:
+            raise ValueError("At least 3 candidates per round are required.")
+        self.rocket = rocket
+        self.observations = tuple(sorted((Observation.fromAny(el) for el in observations), key=lambda el: el.time))
+        self.dt = dt
+        self.maxDrag = float(maxDrag)
+        self.candidates = candidates
+        self.tolerance = tolerance
+        self.maxExpansions = maxExpansions
+        self.maxTime = self.observations[-1].time + 2 * dt
+        self.history = [] # ((drag, residual), ...) per round
+        self.simulations = 0
+
+    def samples(self, drags):
+        """((altitude, speed) per observation) per drag value."""
+        self.simulations += len(drags)
+        try:
+            import numpy as np
+        except ImportError:
+            return [self._scalarSamples(drag) for drag in drags]
+        from .batch import simulate_batch
+        times = [el.time for el in self.observations]
+        result = simulate_batch(self.rocket, dt=self.dt, drag=np.asarray(drags, dtype=float),
+            sampleAt=times, maxTime=self.maxTime)
+        return [list(zip(alts, speeds)) for (alts, speeds) in zip(result.sampleAlt.tolist(), result.sampleSpeed.tolist())]
+
+    def _scalarSamples(self, drag):
+        """`samples' of one drag value by the rule of `batch.simulate_batch' (`sampleAt')."""
+        rocket = self.rocket.copy()
+        rocket.drag = drag
+        rv = []
+        for msg in CompiledRocket(rocket).fly(dt=self.dt):
+            if msg.msgType != "FlightLog":
+                continue
+            end = msg.absTime + msg.dt * (1 + 1e-6)
+            while len(rv) < len(self.observations) and self.observations[len(rv)].time <= end:
+                rv.append((msg.surfaceAltitude, msg.endSpeed))
+            if len(rv) == len(self.observations):
+                break
+        # Flight over before the observations: the final state
+        final = (rocket.position.surfaceAltitude, rocket.speed or 0.0)
+        rv.extend([final] * (len(self.observations) - len(rv)))
+        return rv
+
+    def residual(self, samples):
+        """Sum of squared relative errors.
+
+        NaN samples (the flight was cut short before them) and diverged flights give infinity.
+        """
+        rv = 0.0
+        try:
+            for (obs, (alt, speed)) in zip(self.observations, samples):
+                rv += ((alt - obs.altitude) / max(abs(obs.altitude), 1.0)) ** 2
+                if obs.speed is not None:
+                    rv += ((speed - obs.speed) / max(abs(obs.speed), 1.0)) ** 2
+        except OverflowError:
+            return float("inf")
+        return rv if rv == rv else float("inf")
+
+    def residuals(self, drags):
+        return [self.residual(el) for el in self.samples(drags)]
+
+    def fit(self):
+        """Best drag coefficient, raises `ValueError' when no drag value matches the observations."""
+        (lo, hi) = (0.0, self.maxDrag)
+        expansions = 0
+        while True:
+            step = (hi - lo) / (self.candidates - 1)
+            drags = [lo + idx * step for idx in range(self.candidates)]
+            residuals = self.residuals(drags)
+            self.history.append(tuple(zip(drags, residuals)))
+            best = min(range(len(drags)), key=lambda idx: residuals[idx])
+            if residuals[best] == float("inf"):
+                raise ValueError("No drag in [{}, {}] matches the observations (the flight is over before them?)".format(drags[0], drags[-1]))
+            if best == len(drags) - 1:
+                # Not bracketed yet: look for higher drag
+                if expansions >= self.maxExpansions:
+                    raise ValueError("No drag up to {} matches the observations (the rocket is observed lower than it can fly?)".format(hi))
+                expansions += 1
+                (lo, hi) = (drags[-2], hi + (hi - lo) * 2)
+                continue
+            (lo, hi) = (drags[max(best - 1, 0)], drags[best + 1])
+            if hi - lo <= self.tolerance:
+                break
+        if best == 0:
+            return drags[0]
+        return self._vertex(drags[best - 1:best + 2], residuals[best - 1:best + 2])
+
+    @staticmethod
+    def _vertex(xs, ys):
+        """Minimum of the parabola through 3 equidistant points (clamped to them)."""
+        (y0, y1, y2) = ys
+        curvature = y0 - 2 * y1 + y2
+        if not curvature > 0:
+            return xs[1]
+        offset = 0.5 * (y0 - y2) / curvature
+        step = xs[1] - xs[0]
+        return xs[1] + max(-1.0, min(1.0, offset)) * step
+
+    def __repr__(self):
+        return "<{} observations={} rounds={} simulations={}>".format(
+            self.__class__.__name__, len(self.observations), len(self.history), self.simulations)
+
+def fitDrag(rocket, observations, **kwargs):
+    """Drag coefficient that reproduces the `observations' best, see `DragFit'."""
+    return DragFit(rocket, observations, **kwargs).fit()
@@ -0,0 +1,362 @@
+"""Event-driven integrators for the compiled flight engine.
+
+Instead of the fixed explicit Euler tick of `Rocket.fly', the flight is integrated
+as an ODE between events with RK4 (fixed step) or Dormand-Prince RK45 (adaptive step
+with error control). Tank depletion, stage emptiness and surface contact are located
+by root-finding inside the step they happen in, so stage separations get exact times
+and the steps between the events can be seconds long.
+
+The ODE is the continuous limit of the Euler engine:
+
+    dm/dt = -c(p)
+    dv/dt = g * Isp * c(p) / m - g - 0.5 * rho * v^2 * drag / m
+
+with `Isp' and `c' aggregated over the burning stages the same way `Rocket.Isp' does.
+"""
+
+from KspCalc import consts
+from . import messages
+from .compiled import EMPTY_L
+
+MAX_STEP = 5.0 # s, upper bound for the adaptive step
+RTOL = 1e-9
+ATOL = 1e-6
+ROOT_TOL = 1e-9 # s, precision of the located event times
+
+def rk4Step(f, y, h):
+    k1 = f(y)
+    k2 = f([a + 0.5 * h * b for (a, b) in zip(y, k1)])
+    k3 = f([a + 0.5 * h * b for (a, b) in zip(y, k2)])
+    k4 = f([a + h * b for (a, b) in zip(y, k3)])
+    return [a + h / 6.0 * (b1 + 2 * b2 + 2 * b3 + b4) for (a, b1, b2, b3, b4) in zip(y, k1, k2, k3, k4)]
+
+# Dormand-Prince 5(4) tableau
+_DP_A = (
+    (),
+    (1.0 / 5, ),
+    (3.0 / 40, 9.0 / 40),
+    (44.0 / 45, -56.0 / 15, 32.0 / 9),
+    (19372.0 / 6561, -25360.0 / 2187, 64448.0 / 6561, -212.0 / 729),
+    (9017.0 / 3168, -355.0 / 33, 46732.0 / 5247, 49.0 / 176, -5103.0 / 18656),
+    (35.0 / 384, 0, 500.0 / 1113, 125.0 / 192, -2187.0 / 6784, 11.0 / 84),
+)
+_DP_B5 = (35.0 / 384, 0, 500.0 / 1113, 125.0 / 192, -2187.0 / 6784, 11.0 / 84, 0)
+_DP_B4 = (5179.0 / 57600, 0, 7571.0 / 16695, 393.0 / 640, -92097.0 / 339200, 187.0 / 2100, 1.0 / 40)
+
+def rk45Step(f, y, h):
+    """Dormand-Prince step. Returns (5th order solution, error estimate)."""
+    ks = []
+    for row in _DP_A:
+        yi = list(y)
+        for (coef, k) in zip(row, ks):
+            if coef:
+                yi = [a + h * coef * b for (a, b) in zip(yi, k)]
+        ks.append(f(yi))
+    y5 = list(y)
+    err = [0.0] * len(y)
+    for (b5, b4, k) in zip(_DP_B5, _DP_B4, ks):
+        y5 = [a + h * b5 * b for (a, b) in zip(y5, k)]
+        err = [e + h * (b5 - b4) * b for (e, b) in zip(err, k)]
+    return (y5, err)
+
+def adaptiveStep(f, y, h, maxStep=MAX_STEP, rtol=RTOL, atol=ATOL):
+    """Accepted Dormand-Prince step of at most `h' seconds.
+
+    Returns (solution, step taken, suggested next step).
+    """
+    while True:
+        h = min(h, maxStep)
+        (y1, err) = rk45Step(f, y, h)
+        norm = 0.0
+        for (a, b, e) in zip(y, y1, err):
+            norm = max(norm, abs(e) / (atol + rtol * max(abs(a), abs(b))))
+        if norm <= 1.0:
+            factor = 5.0 if norm == 0 else min(5.0, max(0.2, 0.9 * norm ** -0.2))
+            return (y1, h, h * factor)
+        h *= max(0.2, 0.9 * norm ** -0.25)
+
+def findRoot(phi, lo, hi, flo, fhi, tol=ROOT_TOL):
+    """Illinois regula falsi on `phi' that changes sign from positive (`lo') to non-positive (`hi').
+
+    Returns point at (or just past) the sign change.
+    """
+    side = 0
+    for _ in range(200):
+        if hi - lo < tol:
+            break
+        mid = (lo * fhi - hi * flo) / (fhi - flo)
+        if not lo < mid < hi:
+            mid = 0.5 * (lo + hi)
+        fmid = phi(mid)
+        if fmid <= 0:
+            (hi, fhi) = (mid, fmid)
+            if side == -1:
+                flo *= 0.5
+            side = -1
+        else:
+            (lo, flo) = (mid, fmid)
+            if side == 1:
+                fhi *= 0.5
+            side = 1
+    return hi
+
+
+class EventFlight(object):
+    """Flies a `compiled.CompiledRocket' with an event-driven integrator."""
+
+    METHODS = ("rk4", "rk45")
+
+    def __init__(self, compiled, method="rk45", dt=1.0, maxStep=MAX_STEP, rtol=RTOL, atol=ATOL, controller=None):
+        """A `controller' (`control.Controller') is updated on its own clock, each update ends the segment."""
+        super(EventFlight, self).__init__()
+        if method not in self.METHODS:
+            raise ValueError("Unknown integrator {!r}. Known integrators are: {}".format(method, self.METHODS))
+        self.compiled = compiled
+        self.method = method
+        self.dt = dt
+        self.maxStep = maxStep
+        self.rtol = rtol
+        self.atol = atol
+        self.controller = controller
+
+    def fly(self):
+        compiled = self.compiled
+        rocket = compiled.rocket
+        position = rocket.position
+        planet = position.planet
+        surface = planet.radius
+
+        rocket.speed = rocket.speed or 0.0
+        rocket.dt = self.dt
+        absTime = rocket.absTime
+        h = self.dt
+        if self.method == "rk4":
+            step = rk4Step
+        else:
+            step = lambda f, y, tau: rk45Step(f, y, tau)[0]
+        compiled.reset()
+        controller = self.controller
+        controlAt = absTime if controller is not None else None
+
+        while compiled.nAttached:
+            # Repeat staging until it settles (a tick of the Euler engine that burns nothing
+            # only waits for the next one to ignite the new bottom stage)
+            version = None
+            rocket.absTime = absTime
+            while version != compiled.version:
+                version = compiled.version
+                for msg in compiled.staging(absTime):
+                    yield msg
+            if not compiled.nAttached:
+                break
+
+            if controlAt is not None and absTime >= controlAt - ROOT_TOL:
+                controlAt = absTime + controller.period
+                compiled.control(controller, absTime, position.altitude, rocket.speed, compiled.mass(compiled.nAttached))
+            segment = _Segment(compiled, surface)
+            if not segment.burning:
+                # Nothing burns and nothing is going to change any more.
+                break
+
+            alt = position.altitude
+            speed = rocket.speed
+            ground = abs(alt - surface) < 1e-2
+            if ground:
+                speed = max(speed, 0.0)
+                ground = segment.accel([alt, speed] + segment.zero) < 0
+            deriv = segment.groundDeriv if ground else segment.deriv
+            events = segment.events(ground)
+            y0 = [alt, speed] + segment.zero
+
+            # Integrate the segment till the next event (or the controller update)
+            while True:
+                if self.method == "rk4":
+                    h = self.dt
+                    if controlAt is not None:
+                        h = min(h, controlAt - absTime)
+                    y1 = rk4Step(deriv, y0, h)
+                else:
+                    if controlAt is not None:
+                        h = min(h, controlAt - absTime)
+                    (y1, h) = self._adaptive(deriv, y0, h)
+
+                hit = None
+                if segment.constantRates:
+                    # Tanks drain linearly: jump straight to the next depletion
+                    (tEmpty, tankIdx) = segment.nextDepletion()
+                    if tEmpty <= h:
+                        h = tEmpty
+                        y1 = step(deriv, y0, h)
+                        hit = (h, tankIdx)
+                for (idx, event) in enumerate(events):
+                    if segment.constantRates and idx < len(segment.tanks):
+                        continue
+                    (before, after) = (event(y0), event(y1))
+                    if before > 0 and after <= 0:
+                        tau = findRoot(lambda tau: event(step(deriv, y0, tau)), 0.0, h, before, after)
+                        if hit is None or tau < hit[0]:
+                            hit = (tau, idx)
+                if hit:
+                    (h, eventIdx) = hit
+                    y1 = step(deriv, y0, h)
+
+                msg = segment.apply(y0, y1, h, absTime)
+                absTime += h
+                # Tanks are up to date whenever a message is out (see `Rocket.checkpoint')
+                if hit:
+                    segment.onEvent(eventIdx, y1)
+                else:
+                    y0 = [y1[0], y1[1]] + segment.commit(y1)
+                rocket.absTime = absTime
+                yield msg
+
+                if self.method == "rk45":
+                    h = self._nextStep
+                if hit or (controlAt is not None and absTime >= controlAt - ROOT_TOL):
+                    break
+
+    _nextStep = None
+
+    def _adaptive(self, f, y, h):
+        (y1, h, self._nextStep) = adaptiveStep(f, y, h, self.maxStep, self.rtol, self.atol)
+        return (y1, h)
+
+
+class _Segment(object):
+    """Flight interval with constant topology, constant set of drained tanks and constant throttle.
+
+    State vector: [altitude, speed, kg burned by burning stage #0, #1, ...]
+    """
+
+    def __init__(self, compiled, surface):
+        super(_Segment, self).__init__()
+        RHO = consts.FUEL_RHO
+        fuelL = compiled.fuelL
+        self.compiled = compiled
+        self.surface = surface
+        rocket = compiled.rocket
+        planet = rocket.position.planet
+        self.gAt = planet.g
+        self.pressureAt = planet.pressureAt if planet.hasAtmosphere else None
+        self.densityAt = planet.densityAt if planet.knowDensity else None
+        self.drag = rocket.drag
+
+        self.burning = []
+        self.drains = {} # tank -> indices of burning stages draining it
+        for idx in compiled.active:
+            tanks = compiled.feeds[idx]
+            if compiled._empty(tanks) or not compiled.engThrust[idx]:
+                continue
+            for tank in tanks:
+                if fuelL[tank] < EMPTY_L:
+                    # Leftovers below the "empty" threshold are dropped
+                    fuelL[tank] = 0.0
+            tank = next(tank for tank in tanks if fuelL[tank] > 0)
+            self.drains.setdefault(tank, []).append(len(self.burning))
+            self.burning.append(idx)
+        self.tanks = tuple(self.drains.keys())
+        # Consumption only depends on pressure
+        self.constantRates = (self.pressureAt is None) or \
+            not any(any(compiled.engDelta[idx]) for idx in self.burning)
+        self.zero = [0.0] * len(self.burning)
+        self.mass0 = compiled.mass(compiled.nAttached)
+        self.vac = [sum(compiled.engVac[idx]) / RHO * compiled.throttle[idx] for idx in self.burning]
+        self.delta = [sum(compiled.engDelta[idx]) / RHO * compiled.throttle[idx] for idx in self.burning]
+
+    def pressure(self, alt):
+        return self.pressureAt(alt) if self.pressureAt else 0.0
+
+    def rates(self, pressure):
+        return [vac + delta * pressure for (vac, delta) in zip(self.vac, self.delta)]
+
+    def accel(self, y):
+        (alt, speed) = (y[0], y[1])
+        pressure = self.pressure(alt)
+        g = self.gAt(alt)
+        mass = self.mass0 - sum(y[2:])
+        Isp = self.compiled._Isp(self.compiled.active, pressure, g)
+        density = self.densityAt(alt) if self.densityAt else 0.0
+        consumption = sum(self.rates(pressure))
+        return g * Isp * consumption / mass - g - 0.5 * density * speed * speed * self.drag / mass
+
+    def deriv(self, y):
+        return [y[1], self.accel(y)] + self.rates(self.pressure(y[0]))
+
+    def groundDeriv(self, y):
+        return [0.0, 0.0] + self.rates(self.pressure(y[0]))
+
+    def level(self, tank, y):
+        return self.compiled.fuelL[tank] - sum(y[2 + el] for el in self.drains[tank]) * consts.FUEL_RHO
+
+    def nextDepletion(self):
+        """(seconds, tank index) of the first drained tank to run dry (constant rates only)."""
+        rates = self.rates(0.0)
+        rv = None
+        for (idx, tank) in enumerate(self.tanks):
+            flow = sum(rates[el] for el in self.drains[tank]) * consts.FUEL_RHO
+            left = self.compiled.fuelL[tank] / flow
+            if rv is None or left < rv[0]:
+                rv = (left, idx)
+        return rv
+
+    def events(self, ground):
+        rv = [(lambda y, tank=tank: self.level(tank, y)) for tank in self.tanks]
+        if ground:
+            # Lift-off
+            rv.append(lambda y: -self.accel(y))
+        else:
+            # Surface contact
+            rv.append(lambda y: y[0] - self.surface)
+        return rv
+
+    def commit(self, y):
+        """Apply fuel burned so far to the tanks, returns fresh burn counters."""
+        fuelL = self.compiled.fuelL
+        for tank in self.tanks:
+            fuelL[tank] = max(self.level(tank, y), 0.0)
+        self.mass0 -= sum(y[2:])
+        return list(self.zero)
+
+    def onEvent(self, idx, y):
+        compiled = self.compiled
+        self.commit(y)
+        if idx < len(self.tanks):
+            compiled.fuelL[self.tanks[idx]] = 0.0
+        else:
+            position = compiled.rocket.position
+            if position.altitude <= self.surface:
+                position.altitude = self.surface
+                compiled.rocket.speed = 0.0
+
+    def apply(self, y0, y1, h, absTime):
+        """Move the rocket to `y1' and build the flight log message of the step."""
+        compiled = self.compiled
+        rocket = compiled.rocket
+        position = rocket.position
+        consumed = sum(y1[2:])
+        endMass = self.mass0 - consumed
+        alt = y1[0]
+        pressure = self.pressure(alt)
+        g = self.gAt(alt)
+
+        msg = messages.IntegratedFlightLog(
+            consumedKg=consumed,
+            endMass=endMass,
+            speed=y0[1],
+            pressure=pressure,
+            thrust=compiled.thrust,
+            Isp=compiled._Isp(compiled.active, pressure, g),
+            g=g,
+            airDensity=self.densityAt(alt) if self.densityAt else 0.0,
+            dragCoef=self.drag,
+            surface=self.surface,
+            dt=h,
+            rocket=rocket,
+            absTime=absTime,
+        )
+        msg.effectivedV = y1[1] - y0[1]
+        msg.moved(alt, y1[1], g)
+
+        position.altitude = alt
+        rocket.speed = y1[1]
+        return msg
@@ -3,8 +3,9 @@ import math
 class Message(object):
     """Main message object."""
 
+    __slots__ = ("dt", "rocket", "absTime")
     msgType = property(lambda s: s.__class__.__name__)
-    fields = {}
+    fields = ()
 
     def __init__(self, dt, rocket, absTime=None):
         super(Message, self).__init__()
@@ -13,64 +14,149 @@ class Message(object):
         self.absTime = absTime
 
     def getField(self, name):
-        val = self.fields[name]
-        if callable(val):
-            val = val(self)
-        # Cache value
-        setattr(self, name, val)
-        return val
+        return getattr(self, name)
 
     def toDict(self):
-        return dict((name, self.getField(name)) for name in self.fields.keys())
+        return dict((name, getattr(self, name)) for name in self.fields)
 
     def setAbsTime(self, val):
         assert self.absTime is None
         self.absTime = val
 
-    def __getattr__(self, name):
-        return self.getField(name)
-
     def __repr__(self):
-        text = " ".join("{!r}={!r}".format(name, self.getField(name)) for name in self.fields.keys())
+        text = " ".join("{!r}={!r}".format(name, getattr(self, name)) for name in self.fields)
         return "<{} {}>".format(self.__class__.__name__, text)
 
 class RocketFlightLog(Message):
 
-    fields = {
-        "msg": lambda s: s.msg,
-    }
+    __slots__ = ("msg", )
+    fields = ("msg", )
 
     def __init__(self, msg, *args, **kwargs):
         super(RocketFlightLog, self).__init__(*args, **kwargs)
         self.msg = msg
-        self.absTime = absTime
 
 class FlightLog(Message):
-
-    fields = {
-        "Isp": lambda s: s.rocket.Isp,
-        "g": lambda s: s.rocket.position.g,
-        "endMass": lambda s: s.rocket.mass,
-        "startMass": lambda s: s.endMass + s.consumedKg,
-        "thrustToWeightRatio": lambda s: s.rocket.thrust / s.rocket.weight,
-        "tsailkovskydV": lambda s: s.g * s.Isp * math.log(s.startMass / s.endMass),
-        "tsailkovskydA": lambda s: s.tsailkovskydV / s.dt,
-        "speed": lambda s: s.rocket.speed,
-        "dragCoef": lambda s: s.rocket.drag,
-        "airDensity": lambda s: s.rocket.position.density,
-        "dragForce": lambda s: 0.5 * s.airDensity * (s.speed ** 2) * s.dragCoef,
-        "dragDeAccel": lambda s: s.dragForce / s.endMass,
-
-        "effectiveA": lambda s: s.tsailkovskydA - s.g - s.dragDeAccel,
-        "effectivedV": lambda s: s.effectiveA * s.dt,
-    }
-
-    def __init__(self, consumedKg, *args, **kwargs):
+    """Snapshot of a single flight step.
+
+    Primitive state is captured when the record is created (at the start of the step)
+    and `moved' (once the rocket was moved), everything else is derived from it.
+    The `rocket' reference is only kept for identification, the record never reads it.
+    """
+
+    __slots__ = (
+        "consumedKg", "endMass", "speed", "pressure", "thrust", "Isp", "g",
+        "airDensity", "dragCoef", "surface",
+        "altitude", "endSpeed", "endG", # state after the step
+    )
+
+    fields = (
+        "Isp", "g", "endMass", "startMass", "thrustToWeightRatio",
+        "tsailkovskydV", "tsailkovskydA", "speed", "dragCoef", "airDensity",
+        "dragForce", "dragDeAccel", "effectiveA", "effectivedV",
+        "pressure", "thrust", "altitude", "surfaceAltitude", "endSpeed",
+    )
+
+    startMass = property(lambda s: s.endMass + s.consumedKg)
+    thrustToWeightRatio = property(lambda s: s.thrust / (s.endG * s.endMass))
+    tsailkovskydV = property(lambda s: s.g * s.Isp * math.log(s.startMass / s.endMass))
+    tsailkovskydA = property(lambda s: s.tsailkovskydV / s.dt)
+    dragForce = property(lambda s: 0.5 * s.airDensity * (s.speed ** 2) * s.dragCoef)
+    dragDeAccel = property(lambda s: s.dragForce / s.endMass)
+    effectiveA = property(lambda s: s.tsailkovskydA - s.g - s.dragDeAccel)
+    effectivedV = property(lambda s: s.effectiveA * s.dt)
+    surfaceAltitude = property(lambda s: s.altitude - s.surface)
+
+    def __init__(self, consumedKg, endMass, speed, pressure, thrust, Isp, g, airDensity, dragCoef, surface, *args, **kwargs):
         super(FlightLog, self).__init__(*args, **kwargs)
         self.consumedKg = consumedKg
+        self.endMass = endMass
+        self.speed = speed
+        self.pressure = pressure
+        self.thrust = thrust
+        self.Isp = Isp
+        self.g = g
+        self.airDensity = airDensity
+        self.dragCoef = dragCoef
+        self.surface = surface
+        self.altitude = self.endSpeed = self.endG = None
+
+    @classmethod
+    def fromRocket(cls, rocket, consumedKg, dt, absTime):
+        """Snapshot the state of a live `flight.Rocket'."""
+        position = rocket.position
+        return cls(
+            consumedKg=consumedKg,
+            endMass=rocket.mass,
+            speed=rocket.speed,
+            pressure=position.pressure,
+            thrust=rocket.thrust,
+            Isp=rocket.Isp,
+            g=position.g,
+            airDensity=position.density,
+            dragCoef=rocket.drag,
+            surface=position.planet.radius,
+            dt=dt,
+            rocket=rocket,
+            absTime=absTime,
+        )
+
+    def moved(self, altitude, speed, g):
+        """Record the rocket position, speed (and gravity there) after the step."""
+        self.altitude = altitude
+        self.endSpeed = speed
+        self.endG = g
+
+class IntegratedFlightLog(FlightLog):
+    """Flight log of a variable size integration step.
+
+    The velocity change comes from the integrator rather than from the single Euler step
+    the derived fields of `FlightLog' describe.
+    """
+
+    __slots__ = ("effectivedV", )
+    msgType = property(lambda s: "FlightLog")
+    effectiveA = property(lambda s: s.effectivedV / s.dt if s.dt else 0.0)
+
+def eulerdV(consumedKg, endMass, speed, Isp, g, airDensity, dragCoef, dt):
+    """`FlightLog.effectivedV' without the record (same operations in the same order)."""
+    tsailkovskydA = g * Isp * math.log((endMass + consumedKg) / endMass) / dt
+    dragDeAccel = 0.5 * airDensity * (speed ** 2) * dragCoef / endMass
+    return (tsailkovskydA - g - dragDeAccel) * dt
+
+class FastForward(object):
+    """Request to fly on without flight log messages, sent to a `Rocket.fly' generator.
+
+    An engine that accepts it (sets `active') keeps flying, yields stage separations only
+    and follows the report clock of the requester: a skipped tick starting at or after
+    `reportAt' closes a report period, `reportAt' moves to its start time plus `reportFreq'
+    and `keepQuiet(time, reportAt)' tells whether to skip the next period as well.
+    The first flight log yielded afterwards opens a new report period.
+    Engines that do not support fast forwarding ignore the request.
+    """
+
+    __slots__ = ("reportAt", "reportFreq", "keepQuiet", "active", "skipped")
+
+    def __init__(self, reportAt, reportFreq, keepQuiet):
+        super(FastForward, self).__init__()
+        self.reportAt = reportAt
+        self.reportFreq = reportFreq
+        self.keepQuiet = keepQuiet
+        self.active = False
+        self.skipped = 0 # ticks flown without a message
+
+    def tick(self, absTime):
+        """Account for a skipped tick, returns whether the engine stays quiet."""
+        self.skipped += 1
+        if self.reportAt <= absTime:
+            self.reportAt = absTime + self.reportFreq
+            self.active = self.keepQuiet(absTime, self.reportAt)
+        return self.active
 
 class StageSeparation(Message):
 
+    __slots__ = ("stage", )
+
     def __init__(self, stage, *args, **kwargs):
         super(StageSeparation, self).__init__(*args, **kwargs)
-        self.stage = stage
\ No newline at end of file
+        self.stage = stage
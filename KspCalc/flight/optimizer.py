@@ -0,0 +1,266 @@
+"""Rocket design optimizer.
+
+Searches serial stack designs - a payload on top of up to `maxStages' stages, each stage being
+a decoupler plus N tanks of one type plus M engines of one type - for the lightest rocket
+that meets the targets (vacuum delta-v, apogee, launch thrust to weight ratio).
+
+The search is evolutionary. Every candidate is screened analytically first (mass, part count,
+launch TWR, Tsiolkovsky vacuum delta-v and the apogee that delta-v could reach at most);
+only candidates that pass the screen and are lighter than the best design found so far
+are flown, in parallel (`tracking.sweep').
+"""
+
+import math
+import random
+
+from KspCalc import (consts, parts as partLib, stars)
+from KspCalc.parts import (lfe, fuelTanks, weights)
+
+INFEASIBLE = 1e12 # score offset of designs failing the analytic screen
+SHORT = 1e9 # score offset of designs that failed in flight
+
+class DesignOptimizer(object):
+    """Evolutionary search for the lightest design meeting the targets.
+
+    Genome: tuple of stage genes from the bottom stage up, a gene being
+    (engine class, engine count, tank class, tank count).
+    """
+
+    def __init__(self, payload, deltaV=None, apogee=None, minTwr=1.2,
+        maxStages=3, maxEngines=3, maxTanks=8, maxParts=None, maxMass=None,
+        engines=None, tanks=None, decoupler=weights.Tr18A,
+        planet="Kerbin", altitude=68.41, drag=None, dt=0.05,
+        population=40, generations=30, workers=None, seed=None,
+    ):
+        super(DesignOptimizer, self).__init__()
+        self.payload = tuple(partLib.findByName(el) if isinstance(el, str) else el for el in payload)
+        self.deltaV = deltaV
+        self.apogee = apogee
+        self.minTwr = minTwr
+        self.maxStages = maxStages
+        self.maxEngines = maxEngines
+        self.maxTanks = maxTanks
+        self.maxParts = maxParts
+        self.maxMass = maxMass
+        self.engines = tuple(engines or lfe.ALL)
+        self.tanks = tuple(tanks or fuelTanks.ALL)
+        self.decoupler = decoupler
+        self.planet = stars.Kerbol.findOne(planet)
+        self.altitude = altitude
+        self.drag = drag # drag coefficient the candidates are flown with
+        self.dt = dt
+        self.population = population
+        self.generations = generations
+        self.workers = workers
+        self.random = random.Random(seed)
+
+        self.payloadMass = sum(el.mass for el in self.payload)
+        self.best = None # (score, genome)
+        self.flown = {} # genome -> flight result
+        self.screened = 0
+        self.history = [] # best score per generation
+
+    # Analytic screen
+
+    def bounds(self, genome):
+        """Closed form figures of the design: mass, part count, launch TWR, vacuum delta-v and apogee bound."""
+        upper = self.payloadMass
+        deltaV = 0.0
+        for (engine, nEngines, tank, nTanks) in reversed(genome):
+            dry = self.decoupler.mass + nEngines * engine.mass + nTanks * tank.massEmpty
+            fuel = nTanks * (tank.massFull - tank.massEmpty)
+            start = upper + dry + fuel
+            exhaust = engine.maxThrust / (engine.consumptionL.vac / consts.FUEL_RHO)
+            deltaV += exhaust * math.log(start / (start - fuel))
+            upper = start
+        (engine, nEngines) = genome[0][:2]
+        return {
+            "mass": upper,
+            "parts": len(self.payload) + sum(1 + nEngines + nTanks for (_, nEngines, _, nTanks) in genome),
+            "launchTwr": nEngines * engine.maxThrust / (upper * self.planet.g(self.planet.radius + self.altitude)),
+            "deltaV": deltaV,
+            "apogeeBound": self.apogeeBound(deltaV),
+        }
+
+    def apogeeBound(self, deltaV):
+        """Highest apogee (above the ground) `deltaV' can reach: no gravity or drag losses, all energy kinetic."""
+        mu = consts.G * self.planet.mass
+        start = self.planet.radius + self.altitude
+        energy = deltaV ** 2 / 2.0
+        if energy >= mu / start:
+            return float("inf")
+        return 1.0 / (1.0 / start - energy / mu) - self.planet.radius
+
+    def shortfall(self, bounds):
+        """Relative amount by which the analytic figures miss the targets and constraints (0 - all met)."""
+        rv = 0.0
+        if self.maxMass is not None:
+            rv += max(bounds["mass"] / self.maxMass - 1, 0)
+        if self.maxParts is not None:
+            rv += max(bounds["parts"] / float(self.maxParts) - 1, 0)
+        rv += max(1 - bounds["launchTwr"] / self.minTwr, 0)
+        if self.deltaV is not None:
+            rv += max(1 - bounds["deltaV"] / self.deltaV, 0)
+        if self.apogee is not None:
+            rv += max(1 - bounds["apogeeBound"] / self.apogee, 0)
+        return rv
+
+    # Designs
+
+    def stages(self, genome):
+        """(name, part classes) of the stages from the top down."""
+        rv = [("Payload", self.payload)]
+        for (idx, (engine, nEngines, tank, nTanks)) in reversed(tuple(enumerate(genome))):
+            rv.append(("Decoupler #{}".format(idx + 1), (self.decoupler, )))
+            rv.append(("Stage #{}".format(idx + 1), (tank, ) * nTanks + (engine, ) * nEngines))
+        return rv
+
+    def design(self, genome):
+        """`Rocket.fromDict' (and YAML) compatible design dict."""
+        stages = []
+        for (name, classes) in self.stages(genome):
+            counts = []
+            for cls in classes:
+                if counts and counts[-1][0] is cls:
+                    counts[-1][1] += 1
+                else:
+                    counts.append([cls, 1])
+            stages.append({
+                "name": name,
+                "parts": [cls.name if count == 1 else "{}x {}".format(count, cls.name) for (cls, count) in counts],
+            })
+        return {"name": "Optimized design", "stages": stages, "drag": self.drag or 0}
+
+    @staticmethod
+    def key(genome):
+        """Short readable genome id, e.g. "3xLvT30+8xFlT400/1xLv909+2xFlT200" (bottom stage first)."""
+        return "/".join("{}x{}+{}x{}".format(nEngines, engine.__name__, nTanks, tank.__name__)
+            for (engine, nEngines, tank, nTanks) in genome)
+
+    # Search
+
+    def randomGene(self):
+        rnd = self.random
+        return (
+            rnd.choice(self.engines), rnd.randint(1, self.maxEngines),
+            rnd.choice(self.tanks), rnd.randint(1, self.maxTanks),
+        )
+
+    def randomGenome(self):
+        return tuple(self.randomGene() for _ in range(self.random.randint(1, self.maxStages)))
+
+    def mutate(self, genome):
+        rnd = self.random
+        genome = list(genome)
+        choice = rnd.random()
+        if choice < 0.15 and len(genome) < self.maxStages:
+            genome.insert(rnd.randint(0, len(genome)), self.randomGene())
+        elif choice < 0.3 and len(genome) > 1:
+            del genome[rnd.randrange(len(genome))]
+        else:
+            idx = rnd.randrange(len(genome))
+            (engine, nEngines, tank, nTanks) = genome[idx]
+            field = rnd.randrange(4)
+            if field == 0:
+                engine = rnd.choice(self.engines)
+            elif field == 1:
+                nEngines = min(max(nEngines + rnd.choice((-1, 1)), 1), self.maxEngines)
+            elif field == 2:
+                tank = rnd.choice(self.tanks)
+            else:
+                nTanks = min(max(nTanks + rnd.choice((-2, -1, 1, 2)), 1), self.maxTanks)
+            genome[idx] = (engine, nEngines, tank, nTanks)
+        return tuple(genome)
+
+    def crossover(self, first, second):
+        cut1 = self.random.randint(0, len(first))
+        cut2 = self.random.randint(0, len(second))
+        child = (first[:cut1] + second[cut2:])[:self.maxStages]
+        return child or first
+
+    def score(self, genome, bounds):
+        """Score of a screened genome (lower is better), None if it has to be flown first."""
+        missed = self.shortfall(bounds)
+        if missed:
+            return INFEASIBLE * (1 + missed)
+        if self.apogee is None:
+            return bounds["mass"]
+        if genome in self.flown:
+            reached = self.reached(self.flown[genome])
+            if reached < self.apogee:
+                return SHORT * (1 + max(1 - reached / self.apogee, 0))
+            return bounds["mass"]
+        if self.best and bounds["mass"] >= self.best[0]:
+            # Cannot beat the incumbent even if it flies
+            return SHORT + bounds["mass"]
+        return None
+
+    @staticmethod
+    def reached(result):
+        """Apogee (above the ground) of a flown candidate, 0 if its flight failed, infinity if it escaped."""
+        if result.get("error"):
+            return 0.0
+        if result.get("apogee"):
+            return result["apogee"][1]
+        if result.get("impact"):
+            # Already falling at the burnout
+            return result["maxAlt"]
+        return float("inf")
+
+    def evaluate(self, genomes):
+        """Scores of `genomes', flying the promising ones in parallel."""
+        from KspCalc.tracking import sweep
+        allBounds = [self.bounds(el) for el in genomes]
+        self.screened += len(genomes)
+        scores = [self.score(genome, bounds) for (genome, bounds) in zip(genomes, allBounds)]
+        toFly = []
+        for (genome, score) in zip(genomes, scores):
+            if score is None and genome not in toFly:
+                toFly.append(genome)
+        if toFly:
+            jobs = [sweep.Job(idx, self.key(genome), self.design(genome), self.planet.name, self.altitude,
+                drag=self.drag, dt=self.dt, coast="apogee")
+                for (idx, genome) in enumerate(toFly)]
+            for result in sweep.sweep(jobs, workers=self.workers):
+                self.flown[toFly[result["id"]]] = result
+            scores = [self.score(genome, bounds) for (genome, bounds) in zip(genomes, allBounds)]
+        for (genome, score) in zip(genomes, scores):
+            if self.best is None or score < self.best[0]:
+                self.best = (score, genome)
+        return scores
+
+    def run(self):
+        """Returns the best genome found, see `report' for its figures."""
+        population = [self.randomGenome() for _ in range(self.population)]
+        scores = self.evaluate(population)
+        for _ in range(self.generations):
+            ranked = [genome for (_, genome) in sorted(zip(scores, population), key=lambda el: el[0])]
+            elite = ranked[:max(2, self.population // 5)]
+            children = list(elite)
+            while len(children) < self.population:
+                (first, second) = (self._tournament(population, scores), self._tournament(population, scores))
+                child = self.crossover(first, second)
+                if self.random.random() < 0.8:
+                    child = self.mutate(child)
+                children.append(child)
+            population = children
+            scores = self.evaluate(population)
+            self.history.append(self.best[0])
+        return self.best[1]
+
+    def _tournament(self, population, scores, size=3):
+        picks = [self.random.randrange(len(population)) for _ in range(size)]
+        return population[min(picks, key=lambda idx: scores[idx])]
+
+    def report(self, genome):
+        rv = self.bounds(genome)
+        rv["feasible"] = not self.shortfall(rv) and (self.apogee is None
+            or (genome in self.flown and self.reached(self.flown[genome]) >= self.apogee))
+        rv["design"] = self.design(genome)
+        if genome in self.flown:
+            rv["flight"] = self.flown[genome]
+        return rv
+
+    def __repr__(self):
+        return "<{} screened={} flown={} best={}>".format(
+            self.__class__.__name__, self.screened, len(self.flown), self.best and self.best[0])
@@ -2,7 +2,11 @@ import re
 import math
 
 from KspCalc import parts as partLib
-from . import messages
+from . import (messages, control)
+from .compiled import CompiledRocket
+from .coast import Coast
+from .checkpoint import Checkpoint
+from .analysis import Analysis
 
 TIMES_RE = re.compile(r"^\s*(\d+)\s*x\s+", re.I)
 __NULL__ = object()
@@ -25,16 +29,59 @@ class Rocket(object):
     _position = None
     position = property(lambda s: s._position)
     g = property(lambda s: s.position.g)
-    ignitedStages = property(lambda s: (stage for stage in s.stages if stage.ignited))
     ignited = property(lambda s: any(stage.ignited for stage in s.stages))
-    mass = property(lambda s: sum(stage.mass for stage in s.stages))
-    weight = property(lambda s: sum(stage.weight for stage in s.stages))
+    weight = property(lambda s: s.position.g * s.mass)
     speed = None
+    absTime = 0 # flight clock, s (a flight continues from here)
+    _flying = None # compiled engine flying the rocket right now
 
     drag = 0 # Drag coeficitent for the rocket = C_d <physical "drag coef"> * A <ref. area>
 
     Isp = property(lambda s: AVG(el.Isp for el in s.ignitedStages))
-    thrust = property(lambda s: sum(el.thrust for el in s.ignitedStages))
+
+    # Cached aggregates. `version' is bumped on every structural change
+    # (stage appended, separated or ignited, fuel tank running dry).
+    version = 0
+    _mass = None
+    _ignitedCache = (None, (), 0)
+
+    @property
+    def mass(self):
+        if self._mass is None:
+            self._mass = sum(stage.mass for stage in self.stages)
+        return self._mass
+
+    @property
+    def ignitedStages(self):
+        return self._ignitedAggregates()[1]
+
+    @property
+    def thrust(self):
+        return self._ignitedAggregates()[2]
+
+    def _ignitedAggregates(self):
+        if self._ignitedCache[0] != self.version:
+            stages = tuple(stage for stage in self.stages if stage.ignited)
+            self._ignitedCache = (self.version, stages, sum(el.thrust for el in stages))
+        return self._ignitedCache
+
+    def touch(self):
+        """Mark rocket structure as changed."""
+        self.version += 1
+
+    def invalidate(self):
+        """Drop all cached aggregates (e.g. after fuel levels were changed behind the rocket's back)."""
+        self.touch()
+        self._mass = None
+        for stage in self.stages:
+            stage.invalidate()
+
+    def fuelConsumed(self, kg, emptied):
+        """Called by stages when their tanks are drained."""
+        if self._mass is not None:
+            self._mass -= kg
+        if emptied:
+            self.touch()
 
     def __init__(self, name, stages=(), drag=0):
         self.name = name
@@ -49,21 +96,45 @@ class Rocket(object):
             raise Exception("Rocket had been already ignited and simulation is running.")
         self.stages.append(stage)
         stage.attachedToRocket(self)
+        self.invalidate()
         
-    def fly(self, dt=0.1):
-        """Fly rocket till it is out of fuel."""
-        self.speed = 0
+    def fly(self, dt=0.1, compiled=False, integrator=None, coast=None, controller=None):
+        """Fly rocket till it is out of fuel.
+
+        When `compiled' is set, the rocket is lowered to flat arrays and flown
+        by the `compiled.CompiledRocket' kernel instead of walking the object graph.
+        Selecting an `integrator' other than "euler" ("rk4", "rk45") implies `compiled'.
+        The Euler engines accept `messages.FastForward' requests sent to the generator.
+        With `coast' ("apogee" or "impact") the burnt out rocket flies on, see `coast.Coast'.
+        A `controller' (`control.Controller') sets the throttle of the stages.
+        """
+        if compiled or integrator not in (None, "euler"):
+            flight = CompiledRocket(self).fly(dt=dt, integrator=integrator, controller=controller)
+        else:
+            flight = self._fly(dt, controller)
+        if coast:
+            flight = Coast(self, until=coast, dt=dt).follow(flight)
+        return flight
+
+    def _fly(self, dt, controller=None):
+        self.speed = self.speed or 0
         self.dt = dt
-        absTime = 0
+        absTime = self.absTime
         assert self.stages
+        quiet = None # `messages.FastForward' being served
+        controlAt = absTime if controller is not None else None
         while self.stages:
+            self.absTime = absTime
             separated = []
             for stage in tuple(self.ignitedStages):
                 if (stage not in separated) and stage.empty:
                     for msg in self.separateStage(stage):
                         separated.append(msg.stage)
                         msg.setAbsTime(absTime)
-                        yield msg
+                        request = yield msg
+                        if request is not None:
+                            quiet = request
+                            quiet.active = True
             else:
                 # No ignited stages
                 self._igniteNextStage()
@@ -75,16 +146,18 @@ class Rocket(object):
                     separated.append(msg.stage)
                     msg.setAbsTime(absTime)
 
-                    yield msg
+                    request = yield msg
+                    if request is not None:
+                        quiet = request
+                        quiet.active = True
+
+            if controlAt is not None and absTime >= controlAt:
+                controlAt = absTime + controller.period
+                self.control(controller, absTime)
 
             consumed = sum(stage.step(dt) for stage in self.ignitedStages)
             if consumed:
-                msg = messages.FlightLog(
-                    rocket=self,
-                    consumedKg=consumed,
-                    absTime=absTime,
-                    dt=dt,
-                )
+                msg = messages.FlightLog.fromRocket(self, consumed, dt, absTime)
 
                 dV = msg.effectivedV
                 if self.position.standingOnSurface:
@@ -93,8 +166,17 @@ class Rocket(object):
 
                 self.speed += dV
                 self.position.changeAlt(self.speed * msg.dt)
+                self.absTime = absTime + dt
 
-                yield msg
+                if quiet is not None:
+                    if not quiet.tick(absTime):
+                        quiet = None
+                else:
+                    msg.moved(self.position.altitude, self.speed, self.position.g)
+                    request = yield msg
+                    if request is not None:
+                        quiet = request
+                        quiet.active = True
 
             absTime += dt
 
@@ -104,14 +186,40 @@ class Rocket(object):
             raise Exception("Cannot set position of an ignited rocket.")
         self._position = pos
 
+    _thrust = 1.0
+
     @property
     def thrustRate(self):
+        """Throttle last set for all the stages.
+
+        0 is accepted, the engines keep burning at `control.MIN_THROTTLE' then
+        (a flight ends once nothing burns).
+        """
         return self._thrust
 
     @thrustRate.setter
     def thrustRate(self, value):
         assert value >= 0 and value <= 1
         self._thrust = float(value)
+        for stage in self.stages:
+            stage.setThrottle(max(value, control.MIN_THROTTLE))
+
+    def control(self, controller, absTime):
+        """Ask `controller' (`control.Controller') for the throttle of the burning stages and set it."""
+        burning = [stage for stage in self.ignitedStages if not stage.empty]
+        position = self.position
+        state = control.ControlState(
+            time=absTime,
+            altitude=position.surfaceAltitude,
+            speed=self.speed,
+            mass=self.mass,
+            g=position.g,
+            airDensity=position.density,
+            dragCoef=self.drag,
+            maxThrust=sum(stage.maxThrust for stage in burning),
+        )
+        for (stage, value) in controller.throttles(state, [(stage, stage.name) for stage in burning]).items():
+            stage.setThrottle(value)
 
     def ignite(self):
         """Ignite rocket."""
@@ -145,6 +253,9 @@ class Rocket(object):
         for el in toSeparate:
             assert el.empty
             self.stages.remove(el)
+            if self._mass is not None:
+                self._mass -= el.mass
+            self.touch()
             yield messages.StageSeparation(
                 rocket=self,
                 stage=el,
@@ -152,12 +263,25 @@ class Rocket(object):
             )
 
     def copy(self):
-        data = self.toDict()
+        """Copy of the design (full tanks, nothing ignited) at the same position."""
         cls = type(self)
-        obj = cls.fromDict(data)
-        obj.setPos(self.position.copy())
+        obj = cls(
+            name=self.name,
+            stages=(stage.copy() for stage in self.stages),
+            drag=self.drag,
+        )
+        if self.position is not None:
+            obj.setPos(self.position.copy())
         return obj
 
+    def analyze(self, planet=None):
+        """Closed form per-stage delta-v, burn time and TWR, see `analysis.Analysis'."""
+        return Analysis(self, planet)
+
+    def checkpoint(self):
+        """Snapshot of the flight state, see `checkpoint.Checkpoint'."""
+        return Checkpoint(self)
+
     def toDict(self):
         return {
             "name": self.name,
@@ -184,6 +308,8 @@ class Stage(object):
     parts = name = _rocket = _takesFuel = None
     _ignited = False
     ignited = property(lambda s: s._ignited)
+    _throttle = 1.0
+    throttle = property(lambda s: s._throttle) # of the engines, see `setThrottle'
 
     engines = property(lambda s: (part for part in s.parts if part.isEngine))
     localFuelTanks = property(lambda s: (part for part in s.parts if part.isFuelTank))
@@ -191,19 +317,79 @@ class Stage(object):
     rocket = property(lambda s: s._rocket)
     position = property(lambda s: s.rocket.position)
 
-    mass = property(lambda s: sum(part.mass for part in s.parts))
-    weight = property(lambda s: sum(part.weight for part in s.parts))
-    consumptionKg = property(lambda s: sum(el.consumptionKg for el in s.engines))
+    weight = property(lambda s: s.position.g * s.mass)
+    twRatio = property(lambda s: s.thrust / s.rocket.weight)
 
-    empty = property(lambda s: all(tank.empty for tank in s.fuelTanks))
+    # Cached aggregates, see `Rocket.version'
+    _mass = _thrust = None
+    _emptyCache = _consumptionCache = (None, None)
 
-    thrust = property(lambda s: sum(eng.thrust for eng in s.engines))
-    twRatio = property(lambda s: s.thrust / s.rocket.weight)
+    @property
+    def mass(self):
+        if self._mass is None:
+            self._mass = sum(part.mass * part.count for part in self.parts)
+        return self._mass
+
+    @property
+    def thrust(self):
+        if self._thrust is None:
+            self._thrust = sum(eng.thrust * eng.count for eng in self.engines)
+        return self._thrust
+
+    maxThrust = property(lambda s: sum(eng.maxThrust * eng.count for eng in s.engines)) # full throttle
 
-    Isp = property(lambda s: AVG(el.Isp for el in s.engines))
+    def setThrottle(self, value):
+        """Throttle of the engines of the stage, scales their thrust and fuel consumption (0 < value <= 1)."""
+        if not 0 < value <= 1:
+            raise ValueError("Throttle {!r} of {!r} is out of (0, 1]".format(value, self.name))
+        value = float(value)
+        if value != self._throttle:
+            self._throttle = value
+            self._thrust = None
+            self._consumptionCache = (None, None)
+            if self._rocket is not None:
+                self._rocket.touch()
+
+    @property
+    def consumptionKg(self):
+        # Depends on the pressure only
+        altitude = self.position.altitude
+        if self._consumptionCache[0] != altitude:
+            self._consumptionCache = (altitude, sum(el.consumptionKg * el.count for el in self.engines))
+        return self._consumptionCache[1]
+
+    @property
+    def empty(self):
+        if self._rocket is None:
+            return all(tank.empty for tank in self.fuelTanks)
+        version = self._rocket.version
+        if self._emptyCache[0] != version:
+            self._emptyCache = (version, all(tank.empty for tank in self.fuelTanks))
+        return self._emptyCache[1]
+
+    def invalidate(self):
+        self._mass = None
+        self._emptyCache = self._consumptionCache = (None, None)
+
+    def fuelConsumed(self, tank, kg, emptied):
+        """Called by the fuel tanks of this stage when drained."""
+        if self._mass is not None:
+            self._mass -= kg
+        if self._rocket is not None:
+            self._rocket.fuelConsumed(kg, emptied)
+
+    Isp = property(lambda s: AVG(el.Isp for el in s.engines for _ in range(el.count)))
+    # Part classes of every single part (`parts' holds runs of identical parts as one object)
+    partTypes = property(lambda s: [part.partType for part in s.parts for _ in range(part.count)])
 
     def __init__(self, parts, name, ignites, takesFuel):
-        self.parts = tuple(partCls(self) for partCls in parts)
+        groups = []
+        for partCls in parts:
+            if groups and groups[-1][0] is partCls:
+                groups[-1][1] += 1
+            else:
+                groups.append([partCls, 1])
+        self.parts = tuple(partCls(self, count) for (partCls, count) in groups)
         self.name = name
         self._rocket = None
         if isinstance(ignites, str):
@@ -258,6 +444,8 @@ class Stage(object):
         if self.ignited:
             return
         self._ignited = True
+        if self._rocket is not None:
+            self._rocket.touch()
         if self._ignites:
             for name in self._ignites:
                 self.rocket.getStage(name).ignite()
@@ -304,12 +492,21 @@ class Stage(object):
             takesFuel=data.get("takesFuel")
         )
 
+    def copy(self):
+        """Fresh copy of the stage design (reuses part classes, no part lookup)."""
+        return type(self)(
+            parts=self.partTypes,
+            name=self.name,
+            ignites=self._ignites,
+            takesFuel=self._takesFuel,
+        )
+
     def toDict(self):
         return {
             "name": self.name,
             "ignites": self._ignites,
             "takesFuel": self._takesFuel,
-            "parts": [el.name for el in self.parts],
+            "parts": [el.name for el in self.parts for _ in range(el.count)],
         }
 
 
@@ -1 +1,2 @@
-from .search import findByName
+from . import catalog
+from .search import (findByName, register)
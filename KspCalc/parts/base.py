@@ -1,37 +1,88 @@
 from . import consts
 
-class Part(object):
-    """Basic part."""
+class PartType(type):
+    """Metaclass of the parts.
+
+    Part classes only declare constants shared by all their instances, so instances
+    carry no `__dict__' (every class gets empty `__slots__' unless it declares its own).
+    Class level values of the mutable per instance attributes (`state', e.g. `FuelTank.fuelL')
+    are kept in `initial' and copied to the instance slots by `Part.__init__'.
+    Constants declared under their old names (`renamed', e.g. `LFE.thrust' that became
+    `LFE.maxThrust') are moved to the new ones.
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        namespace.setdefault("__slots__", ())
+        renamed = {}
+        for base in reversed(bases):
+            renamed.update(getattr(base, "renamed", {}))
+        for (old, new) in renamed.items():
+            if old in namespace and not isinstance(namespace[old], property):
+                namespace.setdefault(new, namespace.pop(old))
+        initial = {}
+        state = namespace.get("state", ())
+        for base in reversed(bases):
+            initial.update(getattr(base, "initial", {}))
+            state += getattr(base, "state", ())
+        for key in state:
+            if key in namespace:
+                initial[key] = namespace.pop(key)
+        namespace["initial"] = initial
+        return super(PartType, mcs).__new__(mcs, name, bases, namespace)
+
+class Part(object, metaclass=PartType):
+    """Basic part.
+
+    An instance stands for `count' identical parts (`Stage' groups runs of the same part),
+    all the attributes are the ones of a single part.
+    """
+
+    __slots__ = ("rocket", "count")
+    state = () # per instance attributes, see `PartType'
+    renamed = {} # {old constant name: new one}, see `PartType'
 
     name = None
+    aliases = () # alternative names `search.findByName' knows the part by
+    spec = None # `catalog.PartSpec' the class was built from
     isEngine = property(lambda s: False)
     isFuelTank = property(lambda s: False)
 
-    def __init__(self, parent):
+    # Part class or `catalog.PartSpec' the part was created from
+    partType = property(lambda s: s.spec or type(s))
+
+    def __init__(self, parent, count=1):
         super(Part, self).__init__()
         self.rocket = parent
-        
-        typeDict = type(self).__dict__
-        for (name, value) in typeDict.items():
-            try:
-                instanciate = value.instanciate
-            except AttributeError:
-                continue
-            setattr(self, name, instanciate(self))
+        self.count = count
+        for (name, value) in self.initial.items():
+            setattr(self, name, value)
+
+    @classmethod
+    def fromSpec(cls, spec):
+        """Subclass of this (generic) part class with the constants of `catalog.PartSpec' `spec'."""
+        namespace = dict((name, getattr(spec, name)) for name in cls.specFields)
+        namespace.update(name=spec.name, aliases=spec.aliases, spec=spec)
+        return type(cls)(cls.__name__, (cls, ), namespace)
+
+    specFields = ()
 
     @property
     def weight(self):
         return self.rocket.position.g * self.mass
 
     def __repr__(self):
-        return "<{} {!r}>".format(self.__class__.__name__, self.name)
+        return "<{} {!r}{}>".format(self.__class__.__name__, self.name, self._countRepr())
+
+    def _countRepr(self):
+        return " x{}".format(self.count) if self.count != 1 else ""
 
 class Weight(Part):
 
     mass = None # kg
+    specFields = ("mass", )
 
     def __repr__(self):
-        return "<{} {!r} {}kg>".format(self.__class__.__name__, self.name, self.mass)
+        return "<{} {!r} {}kg{}>".format(self.__class__.__name__, self.name, self.mass, self._countRepr())
 
 class _FuelElement(Part):
     """Element that is related to fuel consumption or carriage."""
@@ -44,9 +95,13 @@ class _FuelElement(Part):
 
 class FuelTank(_FuelElement):
 
+    __slots__ = ("fuelL", )
+    state = ("fuelL", )
+
     massEmpty = None # kg
     massFull = None # kg
     fuelL = None # litres
+    specFields = ("massEmpty", "massFull", "fuelL")
 
     fuelKg = property(lambda s: s.litresToKg(s.fuelL))
     mass = property(lambda s: s.massEmpty + s.fuelKg)
@@ -61,64 +116,59 @@ class FuelTank(_FuelElement):
         assert self.mass == self.massFull
 
     def consumeL(self, maxAmount):
-        amount = min(self.fuelL, maxAmount)
-        self.fuelL -= amount
+        """Drain up to `maxAmount' litres from the group (evenly), returns the litres that were not available."""
+        available = self.fuelL * self.count
+        amount = min(available, maxAmount)
+        if amount:
+            wasEmpty = self.empty
+            self.fuelL = (available - amount) / self.count
+            # Let the stage update its cached aggregates
+            self.rocket.fuelConsumed(self, self.litresToKg(amount), self.empty and not wasEmpty)
         return (maxAmount - amount)
 
     def consumeKg(self, maxAmount):
         return self.litresToKg(self.consumeL(self.kgToLitres(maxAmount)))
 
     def __repr__(self):
-        return "<{} mass=({}, {})kg fuel={}L>".format(
-            self.__class__.__name__, self.massEmpty, self.massFull, self.fuelL)
+        return "<{} mass=({}, {})kg fuel={}L{}>".format(
+            self.__class__.__name__, self.massEmpty, self.massFull, self.fuelL, self._countRepr())
 
 
 class LFE(_FuelElement):
-    """Liquid Fuel Engine."""
+    """Liquid Fuel Engine.
+
+    Thrust and fuel consumption scale with the throttle of the stage (Isp does not).
+    """
 
     isEngine = property(lambda s: True)
 
-    thrust = None # N
-    consumptionL = None # L/s
-    consumptionKg = property(lambda s: s.litresToKg(s.consumptionL.val)) # Kg/s
+    mass = None # kg
+    maxThrust = None # N, full throttle
+    consumptionL = None # L/s at full throttle, `AtmDependantCls'
+    specFields = ("mass", "maxThrust", "consumptionL")
+    renamed = {"thrust": "maxThrust"} # parts declaring `thrust = N' (before the throttle) still work
+    throttle = property(lambda s: s.rocket.throttle)
+    thrust = property(lambda s: s.maxThrust * s.throttle) # N
+    consumptionKg = property(lambda s: s.litresToKg(s.consumptionL.at(s.rocket.position.pressure)) * s.throttle) # Kg/s
     Isp = property(lambda s: s.thrust / (s.consumptionKg * s.rocket.position.g)) # s
 
     @property
     def twRatio(self):
         return self.thrust / self.weight
 
-class AtmDependant(object):
-    """Parameter that is dependant from the atmospheric pressure.
-    (instance object).
-
-    """
-
-    def __init__(self, atm, vac, parent):
-        super(AtmDependant, self).__init__()
-        self.atm = atm
-        self.vac = vac
-        self.parent = parent
-
-    @property
-    def val(self):
-        pressure = self.parent.rocket.position.pressure
-        delta = self.atm - self.vac
-        return self.vac + delta * pressure
-
 class AtmDependantCls(object):
     """Parameter that is dependant from the atmospheric pressure.
 
-    This is dummy object to be used in class objects. Gets automatically replaced with an instance
-    of `instanceCls' by parent class.
+    Shared by all the instances of a part class.
     """
 
     __slots__ = ("atm", "vac")
-    instanceCls = AtmDependant
 
     def __init__(self, atm, vac):
         super(AtmDependantCls, self).__init__()
         self.atm = atm
         self.vac = vac
 
-    def instanciate(self, parent):
-        return self.instanceCls(parent=parent, atm=self.atm, vac=self.vac)
\ No newline at end of file
+    def at(self, pressure):
+        delta = self.atm - self.vac
+        return self.vac + delta * pressure
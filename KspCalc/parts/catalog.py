@@ -0,0 +1,187 @@
+"""Data driven part catalog.
+
+Parts are described in KSP style `.cfg' text (units of this package: kg, N, L/s):
+
+    // Comment
+    PART
+    {
+        name = FL-T400 Fuel Tank
+        type = fuelTank
+        aliases = FL-T400, T400
+        massEmpty = 250
+        massFull = 2250
+        fuelL = 400
+    }
+
+Types and their fields:
+    weight      mass
+    fuelTank    massEmpty, massFull, fuelL
+    lfe         mass, thrust, consumptionAtm, consumptionVac
+
+Parsed catalogs are cached next to the source (`<source>.cache', a pickle of plain tuples)
+and the cache is reused as long as the source modification time and size are the same.
+Every part becomes a `PartSpec' record usable wherever a part class is (`Stage' calls it
+to create the part instance). The part class itself is only built when the first instance is.
+"""
+
+import os
+import pickle
+
+from . import base
+
+CACHE_VERSION = 1
+CACHE_SUFFIX = ".cache"
+
+# Paths of the catalogs loaded into the default catalog (for the processes that have to repeat it)
+LOADED = []
+
+TYPES = {
+    # type: (base part class, required fields)
+    "weight": (base.Weight, ("mass", )),
+    "fuelTank": (base.FuelTank, ("massEmpty", "massFull", "fuelL")),
+    "lfe": (base.LFE, ("mass", "thrust", "consumptionAtm", "consumptionVac")),
+}
+
+class PartSpec(object):
+    """Part type described by data (the counterpart of the part classes in `weights', `fuelTanks' and `lfe')."""
+
+    __slots__ = ("kind", "name", "aliases", "mass", "massEmpty", "massFull", "fuelL", "thrust", "consumptionL", "_partClass")
+
+    isEngine = property(lambda s: s.kind == "lfe")
+    isFuelTank = property(lambda s: s.kind == "fuelTank")
+    maxThrust = property(lambda s: s.thrust) # full throttle thrust of an engine (`LFE.maxThrust')
+
+    def __init__(self, kind, name, aliases=(), mass=None, massEmpty=None, massFull=None, fuelL=None,
+        thrust=None, consumptionAtm=None, consumptionVac=None,
+    ):
+        if kind not in TYPES:
+            raise ValueError("Unknown part type {!r} of {!r}. Known types are: {}".format(kind, name, tuple(TYPES.keys())))
+        self.kind = kind
+        self.name = name
+        self.aliases = tuple(aliases)
+        self.mass = massFull if mass is None else mass
+        self.massEmpty = massEmpty
+        self.massFull = massFull
+        self.fuelL = fuelL
+        self.thrust = thrust
+        if consumptionVac is None:
+            self.consumptionL = None
+        else:
+            self.consumptionL = base.AtmDependantCls(atm=consumptionAtm, vac=consumptionVac)
+        self._partClass = None
+
+    @property
+    def partClass(self):
+        if self._partClass is None:
+            self._partClass = TYPES[self.kind][0].fromSpec(self)
+        return self._partClass
+
+    def __call__(self, parent, count=1):
+        """Create the part instance (as calling a part class does)."""
+        return self.partClass(parent, count)
+
+    def __reduce__(self):
+        return (_spec, (self.toTuple(), ))
+
+    def toTuple(self):
+        cons = self.consumptionL
+        return (self.kind, self.name, self.aliases, self.mass, self.massEmpty, self.massFull, self.fuelL,
+            self.thrust, cons and cons.atm, cons and cons.vac)
+
+    def __repr__(self):
+        return "<{} {} {!r}>".format(self.__class__.__name__, self.kind, self.name)
+
+def _spec(data):
+    return PartSpec(*data)
+
+def parseCfg(text, source="<cfg>"):
+    """Parse `.cfg' text, returns list of `PartSpec'."""
+    rv = []
+    fields = None
+    expectBrace = False
+    for (lineNo, line) in enumerate(text.splitlines(), 1):
+        line = line.split("//", 1)[0].strip()
+        if not line:
+            continue
+        where = "{}:{}".format(source, lineNo)
+        if fields is None:
+            if expectBrace:
+                if line != "{":
+                    raise ValueError("{}: '{{' expected".format(where))
+                (fields, expectBrace) = ({}, False)
+            elif line == "PART":
+                expectBrace = True
+            elif line == "PART {" or line == "PART{":
+                fields = {}
+            else:
+                raise ValueError("{}: PART block expected, got {!r}".format(where, line))
+        elif line == "}":
+            rv.append(_build(fields, where))
+            fields = None
+        else:
+            try:
+                (key, value) = (el.strip() for el in line.split("=", 1))
+            except ValueError:
+                raise ValueError("{}: 'key = value' expected, got {!r}".format(where, line))
+            fields[key] = value
+    if fields is not None or expectBrace:
+        raise ValueError("{}: unterminated PART block".format(source))
+    return rv
+
+def _build(fields, where):
+    fields = dict(fields)
+    try:
+        kind = fields.pop("type")
+        name = fields.pop("name")
+    except KeyError as err:
+        raise ValueError("{}: PART without {}".format(where, err))
+    if kind not in TYPES:
+        raise ValueError("{}: unknown part type {!r}".format(where, kind))
+    aliases = [el.strip() for el in fields.pop("aliases", "").split(",") if el.strip()]
+    missing = [el for el in TYPES[kind][1] if el not in fields]
+    if missing:
+        raise ValueError("{}: {} {!r} misses {}".format(where, kind, name, ", ".join(missing)))
+    try:
+        values = dict((key, float(value)) for (key, value) in fields.items())
+    except ValueError as err:
+        raise ValueError("{}: {}".format(where, err))
+    try:
+        return PartSpec(kind, name, aliases, **values)
+    except TypeError as err:
+        raise ValueError("{}: {}".format(where, err))
+
+def load(path, useCache=True):
+    """Load parts from `path' (through the compiled cache when it is fresh)."""
+    stat = os.stat(path)
+    key = (CACHE_VERSION, stat.st_mtime, stat.st_size)
+    cachePath = path + CACHE_SUFFIX
+    if useCache:
+        try:
+            with open(cachePath, "rb") as fobj:
+                (cachedKey, data) = pickle.load(fobj)
+            if cachedKey == key:
+                return [PartSpec(*el) for el in data]
+        except (IOError, OSError, EOFError, ValueError, pickle.UnpicklingError):
+            pass
+    with open(path) as fobj:
+        rv = parseCfg(fobj.read(), path)
+    if useCache:
+        try:
+            with open(cachePath, "wb") as fobj:
+                pickle.dump((key, [el.toTuple() for el in rv]), fobj, pickle.HIGHEST_PROTOCOL)
+        except (IOError, OSError):
+            pass # read-only location, parse every time
+    return rv
+
+def loadInto(path, catalog=None, useCache=True):
+    """Load parts from `path' and register them (in the default `search.CATALOG' unless `catalog' is given)."""
+    from . import search
+    parts = load(path, useCache=useCache)
+    for part in parts:
+        if catalog is None:
+            search.register(part)
+        else:
+            catalog.add(part)
+    if catalog is None and os.path.abspath(path) not in LOADED:
+        LOADED.append(os.path.abspath(path))
+    return parts
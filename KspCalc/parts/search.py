@@ -1,4 +1,5 @@
 import difflib
+import functools
 
 from . import (
     weights, fuelTanks, lfe
@@ -10,25 +11,90 @@ ALL.extend(weights.ALL)
 ALL.extend(fuelTanks.ALL)
 ALL.extend(lfe.ALL)
 
-def findByName(name):
-    matcher = difflib.SequenceMatcher()
-    matcher.set_seq1(name.lower())
+FUZZY_CACHE = 1024 # fuzzy lookups remembered
+
+def normalize(name):
+    """Lower case, single spaces."""
+    return " ".join(name.lower().split())
+
+class Catalog(object):
+    """Part registry.
+
+    Names are resolved, in order, by:
+        1. exact (normalized) name or alias - a dict lookup;
+        2. fuzzy match (`difflib' ratio, same acceptance rules as before), memoized in a LRU cache.
+
+    A unique prefix is not enough by itself: the fuzzy rules reject prefixes (e.g. "Mk1")
+    that are close to several names.
+    The fuzzy matchers are only built by the first lookup that needs them, so
+    loading a large catalog that is mostly looked up by exact names stays cheap.
+    """
+
+    def __init__(self, parts=()):
+        super(Catalog, self).__init__()
+        self.parts = []
+        self._matchers = [] # per part, `difflib' caches its analysis of the second sequence
+        self._index = {}
+        self._fuzzy = functools.lru_cache(maxsize=FUZZY_CACHE)(self._fuzzyFind)
+        for part in parts:
+            self.add(part)
 
-    weighted = []
-    for el in ALL:
-        matcher.set_seq2(el.name.lower())
-        weighted.append((matcher.ratio(), el))
+    def add(self, part, aliases=()):
+        """Register `part' under its name, its `aliases' attribute and extra `aliases'."""
+        self.parts.append(part)
+        for name in (part.name, ) + tuple(getattr(part, "aliases", ())) + tuple(aliases):
+            self.addAlias(name, part)
 
-    weighted.sort(key=lambda el: el[0], reverse=True)
+    def addAlias(self, name, part):
+        key = normalize(name)
+        if self._index.get(key, part) is not part:
+            raise ValueError("Name {!r} is already taken by {!r}".format(name, self._index[key]))
+        if key in self._index:
+            return
+        self._index[key] = part
+        self._fuzzy.cache_clear()
 
-    (weight1, best1) = weighted[0]
-    (weight2, best2) = weighted[1]
+    def find(self, name):
+        try:
+            return self._index[normalize(name)]
+        except KeyError:
+            pass
+        return self._fuzzy(name.lower())
 
-    if ((weight1 < 0.5) or(weight2 * 1.5 > weight1)) and \
-        ((not best1.name.lower().startswith(name.lower())) or (name.lower() in best2.name.lower())) \
-    :
-        raise Exception("Unable to map name {!r} to the object. Best guess: {!r} (ratio {}), second best guess: {!r} (ratio {})".format(
-            name, best1.name, weight1, best2.name, weight2,
-        ))
+    def _fuzzyFind(self, key):
+        """Two best `difflib' matches (cheap upper bounds of the ratio skip hopeless candidates)."""
+        for part in self.parts[len(self._matchers):]:
+            matcher = difflib.SequenceMatcher()
+            matcher.set_seq2(part.name.lower())
+            self._matchers.append(matcher)
+        best = [(-1.0, None), (-1.0, None)]
+        for (part, matcher) in zip(self.parts, self._matchers):
+            matcher.set_seq1(key)
+            floor = best[1][0]
+            if matcher.real_quick_ratio() <= floor or matcher.quick_ratio() <= floor:
+                continue
+            ratio = matcher.ratio()
+            if ratio > best[0][0]:
+                best = [(ratio, part), best[0]]
+            elif ratio > floor:
+                best[1] = (ratio, part)
+
+        ((weight1, best1), (weight2, best2)) = best
+        if ((weight1 < 0.5) or(weight2 * 1.5 > weight1)) and \
+            ((not best1.name.lower().startswith(key)) or (key in best2.name.lower())) \
+        :
+            raise Exception("Unable to map name {!r} to the object. Best guess: {!r} (ratio {}), second best guess: {!r} (ratio {})".format(
+                key, best1.name, weight1, best2.name, weight2,
+            ))
+
+        return best1
+
+CATALOG = Catalog(ALL)
+
+def findByName(name):
+    return CATALOG.find(name)
 
-    return best1
+def register(part, aliases=()):
+    """Add a part class to the catalog `findByName' uses."""
+    ALL.append(part)
+    CATALOG.add(part, aliases)
@@ -10,6 +10,7 @@ class PodMk1(Weight):
 class Mk16Parachute(Weight):
 
     name = "Mk16 Parachute"
+    aliases = ("ParachuteMk16", )
     mass = 0.1 * 1000
 
 class Tr18A(Weight):
@@ -0,0 +1,201 @@
+"""Opt-in instrumentation of the simulation hot paths.
+
+    profiler = Profiler()
+    with profiler:
+        for msg in rocket.fly(dt=0.01):
+            ...
+    print(profiler.summary())
+    profiler.writeCollapsed("fly.folded") # flamegraph.pl / speedscope input
+
+While enabled, the phases listed in `PHASES' are wrapped (class attributes are replaced,
+so nothing is paid while the profiler is disabled) and every call records its count and
+time under the stack of the phases it was called from. Generators (the flight engines)
+are timed per resumption.
+
+Counters of the summary are the call counts of the phases (see `COUNTERS'):
+    ticks - flight log messages created, separations - stage separation messages,
+    tank walks - `Stage._consume' calls (object engine), tracker steps, reports - telemetry reports.
+"""
+
+import time
+import functools
+
+# (module, class, attribute, phase name, kind) kind: "call", "generator" or "property"
+PHASES = (
+    ("KspCalc.flight.rocket", "Rocket", "_fly", "Rocket.fly", "generator"),
+    ("KspCalc.flight.rocket", "Rocket", "separateStage", "staging.separate", "generator"),
+    ("KspCalc.flight.rocket", "Rocket", "_igniteNextStage", "staging.ignite", "call"),
+    ("KspCalc.flight.rocket", "Stage", "empty", "staging.emptyCheck", "property"),
+    ("KspCalc.flight.rocket", "Stage", "step", "Stage.step", "call"),
+    ("KspCalc.flight.rocket", "Stage", "_consume", "fuel.tankWalk", "call"),
+    ("KspCalc.flight.compiled", "CompiledRocket", "_fly", "CompiledRocket.fly", "generator"),
+    ("KspCalc.flight.compiled", "CompiledRocket", "staging", "staging", "generator"),
+    ("KspCalc.flight.compiled", "CompiledRocket", "drainPlan", "fuel.drainPlan", "call"),
+    ("KspCalc.flight.integrators", "EventFlight", "fly", "EventFlight.fly", "generator"),
+    ("KspCalc.flight.control", "Controller", "throttles", "control", "call"),
+    ("KspCalc.flight.coast", "Coast", "fly", "Coast.fly", "generator"),
+    ("KspCalc.flight.ascent", "Ascent", "_fly", "Ascent.fly", "generator"),
+    ("KspCalc.flight.fitting", "DragFit", "samples", "DragFit.samples", "call"),
+    ("KspCalc.flight.messages", "FlightLog", "__init__", "message.FlightLog", "call"),
+    ("KspCalc.flight.messages", "StageSeparation", "__init__", "message.StageSeparation", "call"),
+    ("KspCalc.tracking.rocketTracker", "RocketTracker", "step", "RocketTracker.step", "call"),
+    ("KspCalc.tracking.telemetry.base", "TelemetryCollector", "accumulate", "telemetry.accumulate", "call"),
+    ("KspCalc.tracking.telemetry.base", "TelemetryCollector", "getData", "telemetry.getData", "call"),
+)
+
+COUNTERS = (
+    ("ticks", "message.FlightLog"),
+    ("separations", "message.StageSeparation"),
+    ("tank walks", "fuel.tankWalk"),
+    ("tracker steps", "RocketTracker.step"),
+    ("reports", "telemetry.getData"),
+)
+
+class Profiler(object):
+    """Per-phase call counts and time, keyed by the stack of phases."""
+
+    clock = staticmethod(time.perf_counter)
+    enabled = False
+
+    def __init__(self):
+        super(Profiler, self).__init__()
+        self._stack = []
+        self.calls = {} # stack tuple: calls
+        self.total = {} # stack tuple: seconds (children included)
+        self._saved = []
+
+    # Switching
+
+    def enable(self):
+        import importlib
+        assert not self.enabled, "Already enabled"
+        for (module, clsName, attr, phase, kind) in PHASES:
+            cls = getattr(importlib.import_module(module), clsName)
+            original = cls.__dict__[attr]
+            self._saved.append((cls, attr, original))
+            setattr(cls, attr, self._wrap(original, phase, kind))
+        self.enabled = True
+
+    def disable(self):
+        for (cls, attr, original) in reversed(self._saved):
+            setattr(cls, attr, original)
+        self._saved = []
+        self.enabled = False
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *excInfo):
+        self.disable()
+
+    def _wrap(self, original, phase, kind):
+        if kind == "property":
+            return property(self._wrapCall(original.fget, phase), original.fset, original.fdel, original.__doc__)
+        if kind == "generator":
+            return self._wrapGenerator(original, phase)
+        return self._wrapCall(original, phase)
+
+    def _enter(self, phase):
+        self._stack.append(phase)
+        return self.clock()
+
+    def _leave(self, started):
+        took = self.clock() - started
+        key = tuple(self._stack)
+        self._stack.pop()
+        self.total[key] = self.total.get(key, 0.0) + took
+
+    def _count(self, phase):
+        key = tuple(self._stack) + (phase, )
+        self.calls[key] = self.calls.get(key, 0) + 1
+
+    def _wrapCall(self, func, phase):
+        @functools.wraps(func)
+        def _wrapper(*args, **kwargs):
+            self._count(phase)
+            started = self._enter(phase)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._leave(started)
+        return _wrapper
+
+    def _wrapGenerator(self, func, phase):
+        """Generator timed while it runs (values sent, exceptions thrown in and `close' reach it)."""
+        @functools.wraps(func)
+        def _wrapper(*args, **kwargs):
+            self._count(phase)
+            gen = func(*args, **kwargs)
+            (resume, value) = (gen.send, None)
+            while True:
+                started = self._enter(phase)
+                try:
+                    msg = resume(value)
+                except StopIteration as err:
+                    return err.value
+                finally:
+                    self._leave(started)
+                try:
+                    value = yield msg
+                    resume = gen.send
+                except GeneratorExit:
+                    started = self._enter(phase)
+                    try:
+                        gen.close()
+                    finally:
+                        self._leave(started)
+                    raise
+                except BaseException as err:
+                    (resume, value) = (gen.throw, err)
+        return _wrapper
+
+    # Reports
+
+    def selfTime(self):
+        """{stack: seconds spent in the phase itself (children excluded)}."""
+        rv = dict(self.total)
+        for (key, took) in self.total.items():
+            if len(key) > 1 and key[:-1] in rv:
+                rv[key[:-1]] -= took
+        return rv
+
+    def phases(self):
+        """{phase: (calls, total seconds, self seconds)} summed over the stacks (recursion counted once)."""
+        rv = {}
+        selfTime = self.selfTime()
+        for key in set(self.calls) | set(self.total):
+            phase = key[-1]
+            (calls, total, own) = rv.get(phase, (0, 0.0, 0.0))
+            outer = phase in key[:-1] # time already counted by the outer call
+            rv[phase] = (
+                calls + self.calls.get(key, 0),
+                total + (0.0 if outer else self.total.get(key, 0.0)),
+                own + selfTime.get(key, 0.0),
+            )
+        return rv
+
+    def counters(self):
+        phases = self.phases()
+        rv = [(name, phases.get(phase, (0, ))[0]) for (name, phase) in COUNTERS]
+        rv.append(("messages", rv[0][1] + rv[1][1]))
+        return rv
+
+    def summary(self):
+        lines = ["{:<28} {:>10} {:>10} {:>10} {:>9}".format("phase", "calls", "total, s", "self, s", "us/call")]
+        for (phase, (calls, total, own)) in sorted(self.phases().items(), key=lambda el: -el[1][2]):
+            lines.append("{:<28} {:>10} {:>10.4f} {:>10.4f} {:>9.2f}".format(
+                phase, calls, total, own, 1e6 * own / calls if calls else 0.0))
+        lines.append(", ".join("{}: {}".format(name, count) for (name, count) in self.counters()))
+        return "\n".join(lines)
+
+    def collapsed(self):
+        """Collapsed stacks ("outer;inner <self microseconds>" lines) of the flamegraph tools."""
+        return "\n".join(
+            "{} {}".format(";".join(key), int(round(1e6 * own)))
+            for (key, own) in sorted(self.selfTime().items()) if own > 0
+        )
+
+    def writeCollapsed(self, path):
+        with open(path, "w") as fobj:
+            fobj.write(self.collapsed() + "\n")
@@ -1,6 +1,9 @@
 import math
 
 from KspCalc import consts
+from .tables import AltitudeTable
+
+PRESSURE_CUTOFF = 1e-8 # atm, top of the atmosphere for the lookup tables
 
 def memorised(func):
     """Caching property."""
@@ -24,6 +27,7 @@ class Celestial(object):
     _onOrbit = None
     _childrenOrbits = None
     hasAtmosphere = property(lambda s: False)
+    knowDensity = property(lambda s: False)
 
     def __init__(self, name, radius, mass):
         self.name = name
@@ -41,6 +45,35 @@ class Celestial(object):
     def g(self, distance):
         return consts.G * self.mass / (distance**2)
 
+    _tables = ()
+    tableSettings = () # ((name, step, order, end), ...) of the tables in use
+
+    def buildTables(self, step=10.0, order=1, top=None):
+        """Replace altitude models with precomputed `tables.AltitudeTable'-s.
+
+        `top' is the height above the ground the gravity table reaches (the planet radius by default).
+        Returns dict of the tables built.
+        """
+        self.dropTables()
+        if top is None:
+            top = self.radius
+        return self._setTables({
+            "g": AltitudeTable(self.g, self.radius, self.radius + top, step, order),
+        })
+
+    def dropTables(self):
+        """Return to the analytic altitude models."""
+        for name in self._tables:
+            delattr(self, name)
+        self._tables = self.tableSettings = ()
+
+    def _setTables(self, tables):
+        for (name, table) in tables.items():
+            setattr(self, name, table.lookup)
+        self._tables = tuple(tables.keys())
+        self.tableSettings = tuple(sorted((name, table.step, table.order, table.end) for (name, table) in tables.items()))
+        return tables
+
     def findOne(self, name):
         rv = tuple(self.find(name))
         
@@ -119,6 +152,32 @@ class CelestialWithAtmosphere(Celestial):
     def densityAt(self, altitude):
         return self.densityAboveGround(altitude - self.radius)
 
+    def atmosphereHeight(self, cutoff=PRESSURE_CUTOFF):
+        """Height above the ground where pressure drops below `cutoff'."""
+        (lo, hi) = (0.0, 1000.0)
+        while self.pressureAboveGround(hi) >= cutoff:
+            (lo, hi) = (hi, hi * 2)
+        while hi - lo > 1.0:
+            mid = (lo + hi) / 2
+            if self.pressureAboveGround(mid) >= cutoff:
+                lo = mid
+            else:
+                hi = mid
+        return hi
+
+    def buildTables(self, step=10.0, order=1, top=None):
+        """Tabulate gravity, pressure and (if known) density.
+
+        Pressure and density tables end at `atmosphereHeight'.
+        """
+        tables = super(CelestialWithAtmosphere, self).buildTables(step=step, order=order, top=top)
+        self.dropTables()
+        end = self.radius + self.atmosphereHeight()
+        tables["pressureAt"] = AltitudeTable(self.pressureAt, self.radius, end, step, order)
+        if self.knowDensity:
+            tables["densityAt"] = AltitudeTable(self.densityAt, self.radius, end, step, order)
+        return self._setTables(tables)
+
 class Orbit(object):
 
     ap = pe = None # metres
@@ -0,0 +1,122 @@
+"""Precomputed altitude tables.
+
+Replace the analytic altitude models of celestials (gravity, pressure, density) with
+tables sampled at a fixed altitude step and interpolated:
+
+    order 1 - linear: relative error <= step^2 * max|f''| / (8 * |f|),
+              e.g. ~5e-7 for Kerbin's pressure (scale height 5000 m) at the default 10 m step.
+    order 3 - cubic (Catmull-Rom): error ~ step^3 * max|f'''|, ~1e-9 for the same table.
+
+The actual maximal relative error is measured when the table is built (`maxError').
+Altitudes outside of the table fall back to the analytic model.
+
+A lookup costs a few arithmetic operations and a list index regardless of the model, so
+tables pay off for expensive models (piecewise curves, sums of exponents, real data) only.
+The stock Kerbin models are cheaper than that, measured with `KspCalc.bench.atmosphere'
+(speed of the table relative to the model, order 1 / order 3):
+
+    g             0.70x / 0.52x (one division)
+    pressureAt    0.84x / 0.78x (one exponent)
+    densityAt     1.26x / 1.14x (pressure, then density of it)
+    all three     0.63x - 0.91x
+    whole flight  0.87x - 0.99x (the compiled engine, threeStageRocket)
+
+so they are off unless `buildTables' is called.
+"""
+
+import math
+
+ORDERS = (1, 3)
+
+class AltitudeTable(object):
+    """Function of the altitude (measured to the centre of a celestial) sampled to a table.
+
+    Callable with a number or with a NumPy array of altitudes. Arrays are passed to the
+    function itself: a vectorized model is cheaper than any table lookup NumPy can do
+    (0.08x - 0.73x of the model's speed, depending on the model, the order and the size).
+    """
+
+    def __init__(self, func, start, end, step, order=1):
+        super(AltitudeTable, self).__init__()
+        if order not in ORDERS:
+            raise ValueError("Unsupported interpolation order {!r}. Supported orders are: {}".format(order, ORDERS))
+        self.func = func
+        self.start = float(start)
+        self.step = float(step)
+        self.invStep = 1.0 / self.step
+        self.order = order
+        size = int(math.ceil((end - start) / self.step)) + 1
+        self.end = self.start + (size - 1) * self.step
+        self.xs = [self.start + idx * self.step for idx in range(size)]
+        self.ys = [func(x) for x in self.xs]
+        # Interpolation is only valid where all the needed nodes exist
+        self._first = 0 if order == 1 else 1
+        self._last = size - 1 if order == 1 else size - 2
+        self.coefs = self._coefs()
+        self.lookup = self._compile()
+        self.maxError = self.measureError()
+
+    def __call__(self, altitude):
+        return self.lookup(altitude)
+
+    def _coefs(self):
+        """Per-interval polynomial coefficients in the fraction of the step."""
+        ys = self.ys
+        rv = [None] * self._last
+        for idx in range(self._first, self._last):
+            if self.order == 1:
+                rv[idx] = (ys[idx], ys[idx + 1] - ys[idx])
+            else:
+                (ym, y0, y1, y2) = ys[idx - 1:idx + 3]
+                rv[idx] = (
+                    y0,
+                    0.5 * (y1 - ym),
+                    0.5 * (2.0 * ym - 5.0 * y0 + 4.0 * y1 - y2),
+                    0.5 * (3.0 * (y0 - y1) + y2 - ym),
+                )
+        return rv
+
+    def _compile(self):
+        """Scalar lookup as a closure over local variables.
+
+        This is what replaces the analytic method of a celestial, so it is kept as cheap as possible.
+        """
+        (func, coefs) = (self.func, self.coefs)
+        (start, invStep, first, last) = (self.start, self.invStep, float(self._first), float(self._last))
+        if self.order == 1:
+            def lookup(altitude):
+                if altitude.__class__ is not float and altitude.__class__ is not int:
+                    return func(altitude)
+                pos = (altitude - start) * invStep
+                if first <= pos < last:
+                    idx = pos.__trunc__() # int(pos) without the builtin lookup and call
+                    (c0, c1) = coefs[idx]
+                    return c0 + c1 * (pos - idx)
+                return func(altitude)
+        else:
+            def lookup(altitude):
+                if altitude.__class__ is not float and altitude.__class__ is not int:
+                    return func(altitude)
+                pos = (altitude - start) * invStep
+                if first <= pos < last:
+                    idx = pos.__trunc__() # int(pos) without the builtin lookup and call
+                    frac = pos - idx
+                    (c0, c1, c2, c3) = coefs[idx]
+                    return c0 + frac * (c1 + frac * (c2 + frac * c3))
+                return func(altitude)
+        return lookup
+
+    def measureError(self, samples=4):
+        """Maximal relative error of the interpolation between the nodes."""
+        rv = 0.0
+        for idx in range(self._first, self._last):
+            for sub in range(1, samples):
+                x = self.xs[idx] + self.step * sub / float(samples)
+                exact = self.func(x)
+                if exact:
+                    rv = max(rv, abs(self.lookup(x) - exact) / abs(exact))
+        return rv
+
+    def __repr__(self):
+        return "<{} [{}, {}] step={} order={} maxError={:.3g}>".format(
+            self.__class__.__name__, self.start, self.end, self.step, self.order, self.maxError)
@@ -1 +1,5 @@
-from .rocketTracker import RocketTracker as Tracker
\ No newline at end of file
+from .rocketTracker import RocketTracker as Tracker
+from .recorder import TrajectoryRecorder
+from .trajectoryFile import (TrajectoryWriter, TrajectoryFile)
+from .cache import (ResultCache, trackCached)
+from . import sweep
\ No newline at end of file
@@ -0,0 +1,240 @@
+"""Content addressed cache of simulation results.
+
+Runs are keyed by a SHA-1 of their canonical description: the design as the part
+catalog resolved it (part names and constants, stage order, stage names, ignition and fuel
+feed lists, drag), the flight state (clock, speed, fuel levels, throttles), the start position, the altitude
+tables of the planet, the simulation settings and the version of this package's code
+(a digest of its sources, so any code change invalidates the cache).
+
+Values are kept in two tiers:
+    * in memory - the `memoryItems' most recently used values;
+    * on disk (optional) - one file per value in `path', least recently used files are
+      removed once the directory grows over `diskBytes'.
+
+    cache = ResultCache("~/.kspcalc-cache")
+    reports = trackCached(cache, rocket, dt=0.01, reportFreq=10)
+"""
+
+import os
+import json
+import pickle
+import hashlib
+import collections
+
+from KspCalc.parts.base import AtmDependantCls
+from .rocketTracker import RocketTracker
+
+SUFFIX = ".result"
+
+_codeVersion = None
+
+def codeVersion():
+    """Digest of the package sources."""
+    global _codeVersion
+    if _codeVersion is None:
+        digest = hashlib.sha1()
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for (dirpath, dirnames, filenames) in os.walk(root):
+            dirnames.sort()
+            for fname in sorted(filenames):
+                if fname.endswith(".py"):
+                    path = os.path.join(dirpath, fname)
+                    digest.update(os.path.relpath(path, root).encode("utf-8"))
+                    with open(path, "rb") as fobj:
+                        digest.update(fobj.read())
+        _codeVersion = digest.hexdigest()
+    return _codeVersion
+
+def canonicalPart(part):
+    """Constants of a part type ({name: value} of its `specFields'), edits of a catalog change them."""
+    cls = type(part)
+    rv = {}
+    for name in cls.specFields:
+        value = cls.initial[name] if name in cls.initial else getattr(cls, name)
+        if isinstance(value, AtmDependantCls):
+            value = [value.atm, value.vac]
+        rv[name] = value
+    return rv
+
+def canonicalRocket(rocket):
+    """Plain data describing `rocket' and its flight state (the part names are the resolved ones)."""
+    stages = []
+    for stage in rocket.stages:
+        data = stage.toDict()
+        stages.append({
+            "name": data["name"],
+            "parts": data["parts"],
+            "constants": [canonicalPart(part) for part in stage.parts],
+            "ignites": list(data["ignites"] or ()),
+            "takesFuel": list(data["takesFuel"] or ()),
+            "ignited": stage.ignited,
+            "throttle": stage.throttle,
+            "fuelL": [part.fuelL for part in stage.parts if part.isFuelTank],
+        })
+    return {
+        "stages": stages,
+        "drag": rocket.drag,
+        "absTime": rocket.absTime,
+        "speed": rocket.speed,
+    }
+
+def canonicalPosition(point):
+    planet = point.planet
+    return {
+        "planet": planet.name,
+        "altitude": point.altitude,
+        "tables": [list(el) for el in planet.tableSettings],
+    }
+
+def canonicalController(controller):
+    """Plain data describing a throttle controller: its class and its settings (instance attributes)."""
+    if controller is None:
+        return None
+    cls = controller.__class__
+    return {
+        "class": "{}.{}".format(cls.__module__, cls.__qualname__),
+        "period": controller.period,
+        "settings": sorted(vars(controller).items()),
+    }
+
+def makeKey(**parts):
+    """Cache key of the run described by `parts' (plain data, see `canonicalRocket')."""
+    parts["code"] = codeVersion()
+    text = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=repr)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def rocketKey(rocket, kind, **settings):
+    """Cache key of flying `rocket' from its current position, `kind' tells result types apart."""
+    return makeKey(kind=kind, rocket=canonicalRocket(rocket), position=canonicalPosition(rocket.position), settings=settings)
+
+class ResultCache(object):
+    """Two tier (memory, disk) LRU cache of picklable results."""
+
+    hits = misses = 0
+
+    def __init__(self, path=None, memoryItems=256, diskBytes=256 * 2**20):
+        super(ResultCache, self).__init__()
+        self.path = os.path.expanduser(path) if path else None
+        self.memoryItems = memoryItems
+        self.diskBytes = diskBytes
+        self._memory = collections.OrderedDict() # key: pickled value
+        self._diskUsed = None # bytes, counted on the first write
+        if self.path and not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    def get(self, key, default=None):
+        try:
+            data = self._memory.pop(key)
+        except KeyError:
+            data = self._readDisk(key)
+        if data is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._remember(key, data)
+        return pickle.loads(data)
+
+    def put(self, key, value):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        self._memory.pop(key, None)
+        self._remember(key, data)
+        if self.path:
+            self._writeDisk(key, data)
+
+    def __contains__(self, key):
+        return key in self._memory or (self.path is not None and os.path.exists(self._file(key)))
+
+    def clear(self):
+        self._memory.clear()
+        if self.path:
+            for (fname, _, _) in self._diskFiles():
+                os.remove(fname)
+            self._diskUsed = 0
+
+    def _remember(self, key, data):
+        self._memory[key] = data
+        while len(self._memory) > self.memoryItems:
+            self._memory.popitem(last=False)
+
+    # Disk tier
+
+    def _file(self, key):
+        return os.path.join(self.path, key + SUFFIX)
+
+    def _readDisk(self, key):
+        if not self.path:
+            return None
+        fname = self._file(key)
+        try:
+            with open(fname, "rb") as fobj:
+                data = fobj.read()
+            os.utime(fname, None) # mark as recently used
+        except (IOError, OSError):
+            return None
+        return data
+
+    def _writeDisk(self, key, data):
+        fname = self._file(key)
+        tmp = "{}.{}.tmp".format(fname, os.getpid())
+        try:
+            existed = os.path.getsize(fname)
+        except OSError:
+            existed = 0
+        with open(tmp, "wb") as fobj:
+            fobj.write(data)
+        os.replace(tmp, fname)
+        if self._diskUsed is None:
+            self._diskUsed = sum(size for (_, size, _) in self._diskFiles())
+        else:
+            self._diskUsed += len(data) - existed
+        if self._diskUsed > self.diskBytes:
+            self._evict()
+
+    def _diskFiles(self):
+        """(path, size, last use) of the cached files."""
+        rv = []
+        for fname in os.listdir(self.path):
+            if fname.endswith(SUFFIX):
+                path = os.path.join(self.path, fname)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue # removed by another process
+                rv.append((path, stat.st_size, stat.st_mtime))
+        return rv
+
+    def _evict(self):
+        """Remove least recently used files till the disk tier is 3/4 full."""
+        files = sorted(self._diskFiles(), key=lambda el: el[2])
+        used = sum(size for (_, size, _) in files)
+        for (fname, size, _) in files:
+            if used <= self.diskBytes * 0.75:
+                break
+            try:
+                os.remove(fname)
+            except OSError:
+                pass
+            used -= size
+        self._diskUsed = used
+
+    def __repr__(self):
+        return "<{} {!r} memory={} hits={} misses={}>".format(
+            self.__class__.__name__, self.path, len(self._memory), self.hits, self.misses)
+
+def trackCached(cache, rocket, dt=0.01, reportFreq=1, reportWindows=None, compiled=False, integrator=None, coast=None, controller=None):
+    """Reports of `RocketTracker' for `rocket', taken from `cache' when the same run was tracked before.
+
+    Returns a list of the reports. Only complete flights are cached.
+    """
+    key = rocketKey(rocket, "track", dt=dt, reportFreq=reportFreq,
+        reportWindows=reportWindows and [list(el) for el in reportWindows],
+        compiled=compiled, integrator=integrator, coast=coast,
+        controller=canonicalController(controller))
+    rv = cache.get(key)
+    if rv is None:
+        tracker = RocketTracker(rocket, dt=dt, reportFreq=reportFreq, reportWindows=reportWindows,
+            compiled=compiled, integrator=integrator, coast=coast, controller=controller)
+        tracker.launch()
+        rv = list(tracker.track())
+        cache.put(key, rv)
+    return rv
@@ -0,0 +1,126 @@
+"""Full resolution trajectory recorder.
+
+Every flight step is appended to typed columns (`array.array'). Columns are preallocated
+and grow by doubling; `arrays' exposes them as NumPy arrays that share memory
+with the recorder (no copy is made).
+"""
+
+from array import array
+
+# (name, array typecode)
+COLUMNS = (
+    ("time", "d"), # end of the step, s
+    ("altitude", "d"), # above the ground, m
+    ("speed", "d"), # m/s
+    ("mass", "d"), # kg
+    ("thrust", "d"), # N
+    ("pressure", "d"), # atm
+    ("dragForce", "d"), # N
+    ("stage", "i"), # design index of the bottom stage still attached
+)
+
+EVENT_COLUMNS = (
+    ("time", "d"),
+    ("stage", "i"), # design index of the separated stage
+)
+
+class _Table(object):
+    """Fixed set of growable typed columns."""
+
+    def __init__(self, columns, capacity):
+        super(_Table, self).__init__()
+        self.names = tuple(name for (name, _) in columns)
+        self.typecodes = dict(columns)
+        self.size = 0
+        self.capacity = 0
+        self.columns = dict((name, array(code)) for (name, code) in columns)
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        # Always copy to a fresh array: NumPy views handed out earlier keep
+        # pointing to the old (still valid) buffers.
+        for name in self.names:
+            old = self.columns[name]
+            new = array(old.typecode, bytes(old.itemsize * capacity))
+            new[:self.size] = old[:self.size]
+            self.columns[name] = new
+        self.capacity = capacity
+
+    def append(self, values):
+        idx = self.size
+        if idx == self.capacity:
+            self._grow(max(self.capacity * 2, 16))
+        columns = self.columns
+        for (name, value) in zip(self.names, values):
+            columns[name][idx] = value
+        self.size = idx + 1
+
+    def column(self, name):
+        """Memoryview of the recorded part of the column."""
+        return memoryview(self.columns[name])[:self.size]
+
+    def array(self, name):
+        import numpy as np
+        col = self.columns[name]
+        return np.frombuffer(col, dtype=col.typecode, count=self.size)
+
+    def __len__(self):
+        return self.size
+
+class TrajectoryRecorder(object):
+    """Records every `FlightLog' and `StageSeparation' message of a flight.
+
+    Pass it to `RocketTracker(recorder=...)' (or feed messages to `record' directly).
+    """
+
+    columns = tuple(name for (name, _) in COLUMNS)
+    eventColumns = tuple(name for (name, _) in EVENT_COLUMNS)
+
+    def __init__(self, rocket, capacity=4096):
+        super(TrajectoryRecorder, self).__init__()
+        self.rocket = rocket
+        self.stageNames = tuple(stage.name for stage in rocket.stages)
+        self._stageIdx = dict((id(stage), idx) for (idx, stage) in enumerate(rocket.stages))
+        self.ticks = _Table(COLUMNS, capacity)
+        self.events = _Table(EVENT_COLUMNS, 16)
+
+    def record(self, msg):
+        if msg.msgType == "FlightLog":
+            self.ticks.append((
+                msg.absTime + msg.dt,
+                msg.surfaceAltitude,
+                msg.endSpeed,
+                msg.endMass,
+                msg.thrust,
+                msg.pressure,
+                msg.dragForce,
+                len(self.rocket.stages) - 1,
+            ))
+        elif msg.msgType == "StageSeparation":
+            self.events.append((msg.absTime, self._stageIdx[id(msg.stage)]))
+
+    def column(self, name):
+        """Recorded tick column `name' as a memoryview (no NumPy needed)."""
+        return self.ticks.column(name)
+
+    def arrays(self):
+        """Tick columns as NumPy arrays sharing memory with the recorder.
+
+        Arrays are not resized by later records, call `arrays' again to see them.
+        """
+        return dict((name, self.ticks.array(name)) for name in self.columns)
+
+    def eventArrays(self):
+        """Stage separation table: {"time": ..., "stage": ...} NumPy arrays."""
+        return dict((name, self.events.array(name)) for name in self.eventColumns)
+
+    def stageEvents(self):
+        """Stage separations as ((time, stageIdx, stageName), ...)."""
+        (times, stages) = (self.events.column("time"), self.events.column("stage"))
+        return tuple((times[idx], stages[idx], self.stageNames[stages[idx]]) for idx in range(len(self.events)))
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def __repr__(self):
+        return "<{} ticks={} events={}>".format(self.__class__.__name__, len(self.ticks), len(self.events))
@@ -1,44 +1,83 @@
+from KspCalc.flight import messages
 from . import telemetry
 
 class RocketTracker(object):
-    """An object that launches and tracks a rocket."""
+    """An object that launches and tracks a rocket.
+
+    With `reportWindows' the report periods that cannot produce a report inside a window
+    are fast forwarded (see `messages.FastForward': no flight messages, no telemetry)
+    and tracking stops once the last window is over.
+    """
 
     launched = property(lambda s: s.rocket.ignited)
-    _flyIter = _dataCollector = None
+    _flyIter = _dataCollector = _reportWindows = _lastEnd = None
+    _fastForward = _request = _until = None
+    _checkQuiet = True # decide whether to fast forward the current report period
+
+    def __init__(self, rocket, dt=0.01, reportFreq=1, reportWindows=None, compiled=False, integrator=None, recorder=None, coast=None, controller=None):
+        """`recorder' (e.g. `recorder.TrajectoryRecorder') gets every flight message, whatever the report frequency.
 
-    def __init__(self, rocket, dt=0.01, reportFreq=1, reportWindows=None):
+        With `coast' ("apogee" or "impact") the flight goes on after the burnout, see `flight.Coast'.
+        A `controller' (`flight.control.Controller') sets the throttle of the stages.
+        """
         self.rocket = rocket
+        self.recorder = recorder
         self.dt = dt
+        self.compiled = compiled
+        self.integrator = integrator
+        self.coast = coast
+        self.controller = controller
         self.reportFreq = reportFreq
         self._nextReportAt = reportFreq
         self._dataCollector = telemetry.Flight(self.rocket)
         if reportWindows:
             self._reportWindows = tuple(reportWindows)
+            self._lastEnd = max(end for (_, end) in self._reportWindows)
 
     def launch(self):
-        self._flyIter = self.rocket.fly(dt=self.dt)
+        self._flyIter = self.rocket.fly(dt=self.dt, compiled=self.compiled, integrator=self.integrator, coast=self.coast, controller=self.controller)
 
-    def track(self):
+    def track(self, until=None):
+        """Yield reports, stop early once the flight clock reaches `until' (if given)."""
         assert self._flyIter
+        self._until = until
         msg = self.step()
         while msg is not None:
             doYield = False
             if msg is not True:
                 if self._reportWindows:
                     time = msg["time"]
-                    doYield = any(start <= time <= end for (start, end) in self._reportWindows)
+                    doYield = time is not None and any(start <= time <= end for (start, end) in self._reportWindows)
                 else:
                     doYield = True
 
             if doYield:
                 yield msg
+            if until is not None and self.rocket.absTime >= until:
+                return
+            if self._lastEnd is not None and self.rocket.absTime > self._lastEnd:
+                return # nothing to report any more
             msg = self.step()
 
+    def _canSkip(self, time, reportAt):
+        """No report of the period running from `time' to `reportAt' can fall into a report window.
+
+        The period ends on the first tick starting at `reportAt' or later, a tick per stage is
+        allowed for the ones that burn nothing (stage switching).
+        """
+        if time > self._lastEnd or (self._until is not None and time >= self._until):
+            return False # let `track' stop
+        horizon = reportAt + (len(self.rocket.stages) + 1) * self.dt
+        return not any(start <= horizon and time <= end for (start, end) in self._reportWindows)
+
     def step(self):
         msg = self._step()
 
         if msg is None:
-            if self._dataCollector:
+            if self._fastForward is not None and self._fastForward.skipped:
+                # The flight ended in a fast forwarded period, nothing to report
+                self._dataCollector = None
+            if self._dataCollector and not self._dataCollector.empty:
                 rv = self._dataCollector.getData()
                 self._dataCollector = None
             else:
@@ -47,27 +86,74 @@ class RocketTracker(object):
 
         assert msg is not None
 
+        if self.recorder is not None:
+            self.recorder.record(msg)
+
         if msg.msgType == "StageSeparation":
             tmp = telemetry.StageSeparation(self.rocket)
             tmp.accumulate(msg)
             rv = tmp.getData()
         else:
             assert msg.msgType == "FlightLog"
+            if self._fastForward is not None:
+                # Fast forward is over (or was not supported by the engine)
+                if self._fastForward.skipped:
+                    self._nextReportAt = self._fastForward.reportAt
+                    self._dataCollector.reset()
+                self._fastForward = None
             self._dataCollector.accumulate(msg)
             if self._nextReportAt <= msg.absTime:
                 rv = self._dataCollector.getData()
-                self._dataCollector = telemetry.Flight(self.rocket)
+                self._dataCollector.reset()
                 self._nextReportAt = msg.absTime + self.reportFreq
+                self._checkQuiet = True
             else:
                 rv = True
+            if self._checkQuiet and self._reportWindows and self.recorder is None:
+                self._checkQuiet = False
+                if self._canSkip(msg.absTime, self._nextReportAt):
+                    self._fastForward = self._request = messages.FastForward(
+                        self._nextReportAt, self.reportFreq, self._canSkip)
         return rv
 
 
     def _step(self):
         if not self._flyIter:
             return None
+        (request, self._request) = (self._request, None)
         try:
-            return self._flyIter.send(None)
+            return self._flyIter.send(request)
         except StopIteration:
             self._flyIter = None
-            return None
\ No newline at end of file
+            return None
+
+    def checkpoint(self):
+        """Snapshot of the tracked flight, see `TrackerCheckpoint'."""
+        return TrackerCheckpoint(self)
+
+class TrackerCheckpoint(object):
+    """Tracked flight snapshot: rocket `flight.Checkpoint' plus the telemetry collected so far."""
+
+    def __init__(self, tracker):
+        super(TrackerCheckpoint, self).__init__()
+        self.rocket = tracker.rocket.checkpoint()
+        self.settings = dict(
+            dt=tracker.dt,
+            reportFreq=tracker.reportFreq,
+            reportWindows=tracker._reportWindows,
+            compiled=tracker.compiled,
+            integrator=tracker.integrator,
+            coast=tracker.coast,
+            controller=tracker.controller,
+        )
+        self.nextReportAt = tracker._nextReportAt
+        self.collector = tracker._dataCollector.copy() if tracker._dataCollector else None
+
+    def fork(self, **rocketOverrides):
+        """Launched tracker continuing from the checkpoint (`rocketOverrides' go to `Checkpoint.fork')."""
+        rocket = self.rocket.fork(**rocketOverrides)
+        tracker = RocketTracker(rocket, **self.settings)
+        tracker._nextReportAt = self.nextReportAt
+        tracker._dataCollector = self.collector.copy(rocket) if self.collector else None
+        tracker.launch()
+        return tracker
\ No newline at end of file
@@ -0,0 +1,186 @@
+"""Design sweeps on a process pool.
+
+Every job flies one design from one start position with one drag coefficient.
+Workers keep the part catalog, the celestial system and the parsed designs warm,
+results stream back in completion order:
+
+    jobs = grid({"simple": design}, [("Kerbin", 68.41)], drags=[0, 1, 2])
+    for result in sweep(jobs, workers=4):
+        print(result["id"], result["maxAlt"])
+
+With a `cache.ResultCache' jobs that were flown before are answered from the cache
+(their results have "cached" set) and only the rest go to the pool.
+"""
+
+import time
+import json
+import itertools
+import multiprocessing
+from concurrent import futures
+
+from KspCalc import (stars, flight, parts)
+from . import cache as resultCache
+
+class Job(object):
+    """Single sweep run. Plain data, so it pickles cheaply."""
+
+    def __init__(self, id, designKey, design, planet, altitude, drag=None, dt=0.01, integrator=None, coast=None, controller=None):
+        super(Job, self).__init__()
+        self.id = id
+        self.designKey = designKey # designs with the same key are parsed once per worker
+        self.design = design # `Rocket.toDict' style dict
+        self.planet = planet
+        self.altitude = altitude # above the ground, m
+        self.drag = drag # None - one from the design
+        self.dt = dt
+        self.integrator = integrator
+        self.coast = coast # None - stop at the burnout, else see `flight.Coast'
+        self.controller = controller # None - full throttle, else a `flight.control.Controller'
+
+    def __repr__(self):
+        return "<{} {} {!r} {}:{} drag={}>".format(
+            self.__class__.__name__, self.id, self.designKey, self.planet, self.altitude, self.drag)
+
+def grid(designs, starts, drags=(None, ), dt=0.01, integrator=None, coast=None, controller=None):
+    """Jobs for every combination of `designs' ({key: dict}), `starts' ((planet, alt), ...) and `drags'."""
+    rv = []
+    combinations = itertools.product(sorted(designs.items()), starts, drags)
+    for (idx, ((key, design), (planet, altitude), drag)) in enumerate(combinations):
+        rv.append(Job(idx, key, design, planet, altitude, drag=drag, dt=dt, integrator=integrator, coast=coast,
+            controller=controller))
+    return rv
+
+# Per-process state of the workers
+_designs = {}
+_warm = False
+
+def _warmUp(catalogs=()):
+    """Load everything that is shared by the jobs (once per worker process).
+
+    `catalogs' are the extra part `.cfg' files (see `parts.catalog') the designs may use.
+    """
+    global _warm
+    if not _warm:
+        for path in catalogs:
+            if path not in parts.catalog.LOADED: # forked workers have them already
+                parts.catalog.loadInto(path)
+        parts.findByName("LV-T30")
+        stars.Kerbol.findOne("Kerbin")
+        _warm = True
+
+def _design(job):
+    try:
+        return _designs[job.designKey]
+    except KeyError:
+        rv = _designs[job.designKey] = flight.Rocket.fromDict(job.design)
+        return rv
+
+def _rocket(job):
+    planet = stars.Kerbol.findOne(job.planet)
+    rocket = _design(job).copy()
+    if job.drag is not None:
+        rocket.drag = job.drag
+    rocket.setPos(flight.Point(planet, planet.radius + job.altitude))
+    return rocket
+
+def jobKey(job):
+    """`cache.ResultCache' key of the job."""
+    return resultCache.rocketKey(_rocket(job), "sweep", dt=job.dt, integrator=job.integrator, coast=job.coast,
+        controller=resultCache.canonicalController(job.controller))
+
+def runJob(job):
+    """Fly the job, returns its compact result dict (errors are reported in the "error" field).
+
+    Coasting jobs also report the "apogee" (time, altitude above the ground) and the "impact" (time, speed).
+    """
+    _warmUp()
+    started = time.time()
+    rv = {"id": job.id, "design": job.designKey, "planet": job.planet, "altitude": job.altitude, "drag": job.drag}
+    try:
+        rocket = _rocket(job)
+        (maxAlt, last, separations) = (job.altitude, None, [])
+        msgs = rocket.fly(dt=job.dt, compiled=True, integrator=job.integrator, controller=job.controller)
+        if job.coast:
+            coast = flight.Coast(rocket, until=job.coast, dt=job.dt)
+            msgs = coast.follow(msgs)
+        for msg in msgs:
+            if msg.msgType == "FlightLog":
+                if msg.thrust:
+                    last = msg # powered flight only
+                maxAlt = max(maxAlt, msg.surfaceAltitude)
+            else:
+                separations.append((msg.absTime, msg.stage.name))
+        rv.update({
+            "maxAlt": maxAlt,
+            "burnoutTime": last and (last.absTime + last.dt),
+            "speed": last and last.endSpeed,
+            "mass": last and last.endMass,
+            "separations": separations,
+        })
+        if job.coast:
+            surface = rocket.position.planet.radius
+            rv["apogee"] = coast.apogee and (coast.apogee[0], coast.apogee[1] - surface)
+            rv["impact"] = coast.impact
+    except Exception as err:
+        rv["error"] = "{}: {}".format(err.__class__.__name__, err)
+    rv["elapsed"] = time.time() - started
+    return rv
+
+# Fields of a result that depend on the job only (the rest is what the cache stores)
+_JOB_FIELDS = ("id", "design", "planet", "altitude", "drag")
+
+def sweep(jobs, workers=None, cache=None, catalogs=None):
+    """Run `jobs' on `workers' processes (all cores by default), yield results as they finish.
+
+    `workers=0' runs the jobs in this process (handy for debugging).
+    Worker processes load the part `catalogs' (paths of `.cfg' files, by default the ones
+    this process has loaded, `parts.catalog.LOADED') as they may be spawned rather than forked.
+    Results found in `cache' (`cache.ResultCache') are yielded first, new ones are stored to it.
+    """
+    keys = {}
+    if cache is not None:
+        todo = []
+        for job in jobs:
+            try:
+                key = keys[job.id] = jobKey(job)
+            except Exception:
+                todo.append(job) # let `runJob' report the error
+                continue
+            found = cache.get(key)
+            if found is None:
+                todo.append(job)
+            else:
+                rv = {"id": job.id, "design": job.designKey, "planet": job.planet, "altitude": job.altitude, "drag": job.drag}
+                rv.update(found, elapsed=0.0, cached=True)
+                yield rv
+        jobs = todo
+    if catalogs is None:
+        catalogs = parts.catalog.LOADED
+    for result in _run(jobs, workers, catalogs):
+        key = keys.get(result["id"])
+        if key is not None and "error" not in result:
+            cache.put(key, dict((name, value) for (name, value) in result.items() if name not in _JOB_FIELDS))
+        yield result
+
+def _run(jobs, workers, catalogs):
+    if workers == 0:
+        for job in jobs:
+            yield runJob(job)
+        return
+    if not jobs:
+        return
+    pool = futures.ProcessPoolExecutor(max_workers=workers or multiprocessing.cpu_count(),
+        initializer=_warmUp, initargs=(tuple(catalogs), ))
+    with pool:
+        pending = [pool.submit(runJob, job) for job in jobs]
+        for future in futures.as_completed(pending):
+            yield future.result()
+
+def writeResults(results, stream):
+    """Stream results as JSON lines, returns the number of results written."""
+    count = 0
+    for result in results:
+        stream.write(json.dumps(result) + "\n")
+        stream.flush()
+        count += 1
+    return count
@@ -1,5 +1,9 @@
 class Telemetry(object):
-    """Abstract telemetry field."""
+    """Abstract telemetry field.
+
+    The update is either a function `(old, msg) -> new' or an `expr'ession of `old' and `msg'.
+    Expressions are inlined into the fused update of the collector (see `TelemetryCollector').
+    """
 
     rv = None
     _func = None
@@ -7,6 +11,7 @@ class Telemetry(object):
     fields = {
         "init": 0,
         "rv": None,
+        "expr": None,
     }
 
     def __init__(self, *args, **kwargs):
@@ -30,6 +35,8 @@ class Telemetry(object):
             if name not in self.fields:
                 raise Exception("Unknown field {!r}. Known fields are: {}".format(name, tuple(self.fields.keys())))
             self.fields[name] = value
+        if self.fields["expr"] and not self._func:
+            self._func = eval("lambda old, msg: ({})".format(self.fields["expr"]))
 
     def collect(self, data):
         assert self._func
@@ -51,34 +58,96 @@ class Telemetry(object):
             init = init()
         self.rv = init
 
-    def copy(self):
+    def copy(self, keepState=False):
         cls = type(self)
-        return cls(self._func, **self.fields)
+        rv = cls(self._func, **self.fields)
+        if keepState:
+            rv.rv = self.rv
+            rv._activated = self._activated
+        return rv
+
+class _Fused(object):
+    """Telemetry fields of a collector class compiled into one update function.
+
+    `update(state, msg)' advances every field of `state' (a list, one item per field).
+    """
+
+    def __init__(self, fields):
+        super(_Fused, self).__init__()
+        self.names = tuple(name for (name, _) in fields)
+        self.inits = tuple(fld.fields["init"] for (_, fld) in fields)
+        self.rvFns = tuple(fld.fields["rv"] for (_, fld) in fields)
+        self.update = self._compile(tuple(fld for (_, fld) in fields))
+
+    @staticmethod
+    def _compile(fields):
+        env = {}
+        lines = ["def update(state, msg):"]
+        for (idx, fld) in enumerate(fields):
+            expr = fld.fields["expr"]
+            if not expr:
+                env["f{}".format(idx)] = fld._func
+                expr = "f{}(old, msg)".format(idx)
+            lines.append("    old = state[{}]".format(idx))
+            lines.append("    state[{}] = {}".format(idx, expr))
+        if not fields:
+            lines.append("    pass")
+        exec("\n".join(lines), env)
+        return env["update"]
+
+    def initial(self):
+        return [init() if callable(init) else init for init in self.inits]
 
 class TelemetryCollector(object):
-    """An object that collects telemetry of a rocket."""
+    """An object that collects telemetry of a rocket.
+
+    The `Telemetry' fields of the class are compiled once (per class) into a fused update
+    (`_Fused'), a collector only keeps the list of the current values, so `reset' reuses it.
+    """
 
-    _fields = _fieldDict = None
     name = "UNNAMED TELEMETRY"
+    _state = None # None till the first message
+    empty = property(lambda s: s._state is None)
 
     def __init__(self, rocket):
         super(TelemetryCollector, self).__init__()
         self.rocket = rocket
-        _fields = {}
-        for name, value in self.__class__.__dict__.items():
-            if isinstance(value, Telemetry):
-                # Copy telemetry object to prevent taining it with current data
-                _fields[name] = value.copy()
+        self._fused = self._compiled()
 
+    @classmethod
+    def _compiled(cls):
+        rv = cls.__dict__.get("_fusedCls")
+        if rv is None:
+            fields = tuple((name, value) for (name, value) in cls.__dict__.items() if isinstance(value, Telemetry))
+            for (_, fld) in fields:
+                assert fld._func, "Telemetry without an update"
+            rv = _Fused(fields)
+            cls._fusedCls = rv
+        return rv
+
+    def copy(self, rocket=None):
+        """Copy of the collector with the data accumulated so far."""
+        rv = type(self)(self.rocket if rocket is None else rocket)
+        if self._state is not None:
+            rv._state = list(self._state)
+        return rv
 
-        self._fields = tuple(_fields.values())
-        self._fieldPairs = tuple(_fields.items())
+    def reset(self):
+        """Forget the data accumulated so far."""
+        self._state = None
 
     def accumulate(self, data):
-        for field in self._fields:
-            field.collect(data)
+        state = self._state
+        if state is None:
+            state = self._state = self._fused.initial()
+        self._fused.update(state, data)
 
     def getData(self):
-        rv = dict((name, fld.getValue()) for (name, fld) in self._fieldPairs)
+        fused = self._fused
+        values = self._state or (None, ) * len(fused.names)
+        rv = dict(
+            (name, rvFn(value) if callable(rvFn) else value)
+            for (name, value, rvFn) in zip(fused.names, values, fused.rvFns)
+        )
         rv["telemetryType"] = self.name
         return rv
\ No newline at end of file
@@ -5,24 +5,16 @@ class Flight(TelemetryCollector):
 
     name = "FlightTelemetry"
 
-    massDelta = Telemetry(lambda old, msg: old + msg.consumedKg)
+    massDelta = Telemetry(expr="old + msg.consumedKg")
 
-    startTime = Telemetry(lambda old, msg: msg.absTime if old is None else old, init=None)
-    time = Telemetry(lambda old, msg: max(old, msg.absTime))
-    maxAlt = Telemetry(lambda old, msg: max(old, msg.rocket.position.surfaceAltitude))
-
-    @Telemetry(init=None)
-    def minTw(old, msg):
-        new = msg.thrustToWeightRatio
-        if old is None:
-            rv = new
-        else:
-            rv = min(old, new)
-        return rv
+    startTime = Telemetry(expr="msg.absTime if old is None else old", init=None)
+    time = Telemetry(expr="max(old, msg.absTime)")
+    maxAlt = Telemetry(expr="max(old, msg.surfaceAltitude)")
+    minTw = Telemetry(expr="msg.thrustToWeightRatio if old is None else min(old, msg.thrustToWeightRatio)", init=None)
 
 class StageSeparation(TelemetryCollector):
     
     name = "StageSeparation"
 
-    time = Telemetry(lambda old, msg: msg.absTime)
-    stageName = Telemetry(lambda old, msg: msg.stage.name)
\ No newline at end of file
+    time = Telemetry(expr="msg.absTime")
+    stageName = Telemetry(expr="msg.stage.name")
\ No newline at end of file
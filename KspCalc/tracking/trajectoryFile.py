@@ -0,0 +1,200 @@
+"""Binary trajectory file.
+
+Layout (little endian):
+
+    magic            8 bytes  b"KSPTRJ\\x00\\x01"
+    header size      uint32
+    header           JSON: {"rocket": `Rocket.toDict()', "stages": [names], "columns": [[name, typecode], ...], ...}
+                     padded with spaces to 8 bytes
+    tick records     fixed width records of `recorder.COLUMNS', written in chunks as the flight goes
+    events           (time double, stage int32) per stage separation
+    trailer          uint64 record count, uint64 events offset, uint64 event count, b"KSPTRJE\\x00"
+
+A file without the trailer (the writer was never closed) is still readable:
+the record count is derived from the file size and the event index is empty.
+"""
+
+import io
+import mmap
+import json
+import struct
+
+from .recorder import (COLUMNS, EVENT_COLUMNS)
+
+MAGIC = b"KSPTRJ\x00\x01"
+END_MAGIC = b"KSPTRJE\x00"
+HEAD = struct.Struct("<8sI")
+TRAILER = struct.Struct("<QQQ8s")
+
+def _struct(columns):
+    return struct.Struct("<" + "".join(code for (_, code) in columns))
+
+RECORD = _struct(COLUMNS)
+EVENT = _struct(EVENT_COLUMNS)
+
+class TrajectoryWriter(object):
+    """Streams flight messages into a trajectory file.
+
+    Has the `recorder.TrajectoryRecorder' interface, so it can be passed as `RocketTracker(recorder=...)'.
+    Call `close' (or use as a context manager) once the flight is over.
+    """
+
+    def __init__(self, rocket, path, chunkRecords=4096):
+        super(TrajectoryWriter, self).__init__()
+        self.rocket = rocket
+        self.path = path
+        self.chunkRecords = chunkRecords
+        self._stageIdx = dict((id(stage), idx) for (idx, stage) in enumerate(rocket.stages))
+        self._chunk = bytearray(RECORD.size * chunkRecords)
+        self._inChunk = 0
+        self._events = []
+        self.records = 0
+        self._file = io.open(path, "wb")
+        header = json.dumps({
+            "rocket": rocket.toDict(),
+            "stages": [stage.name for stage in rocket.stages],
+            "columns": COLUMNS,
+            "eventColumns": EVENT_COLUMNS,
+            "chunkRecords": chunkRecords,
+        }).encode("utf-8")
+        header += b" " * (-(HEAD.size + len(header)) % 8)
+        self._file.write(HEAD.pack(MAGIC, len(header)))
+        self._file.write(header)
+
+    def record(self, msg):
+        if msg.msgType == "FlightLog":
+            RECORD.pack_into(self._chunk, self._inChunk * RECORD.size,
+                msg.absTime + msg.dt,
+                msg.surfaceAltitude,
+                msg.endSpeed,
+                msg.endMass,
+                msg.thrust,
+                msg.pressure,
+                msg.dragForce,
+                len(self.rocket.stages) - 1,
+            )
+            self._inChunk += 1
+            self.records += 1
+            if self._inChunk == self.chunkRecords:
+                self.flush()
+        elif msg.msgType == "StageSeparation":
+            self._events.append((msg.absTime, self._stageIdx[id(msg.stage)]))
+
+    def flush(self):
+        """Write buffered records."""
+        if self._inChunk:
+            self._file.write(memoryview(self._chunk)[:self._inChunk * RECORD.size])
+            self._inChunk = 0
+        self._file.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        offset = self._file.tell()
+        for event in self._events:
+            self._file.write(EVENT.pack(*event))
+        self._file.write(TRAILER.pack(self.records, offset, len(self._events), END_MAGIC))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        self.close()
+
+class TrajectoryFile(object):
+    """Memory mapped reader of a trajectory file.
+
+    Only the pages that are actually looked at get loaded.
+    """
+
+    def __init__(self, path):
+        super(TrajectoryFile, self).__init__()
+        self.path = path
+        self._file = io.open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, headerSize) = HEAD.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError("{!r} is not a trajectory file.".format(path))
+        self.header = json.loads(self._map[HEAD.size:HEAD.size + headerSize].decode("utf-8"))
+        if [list(el) for el in COLUMNS] != self.header["columns"]:
+            raise ValueError("Unsupported trajectory columns {!r}".format(self.header["columns"]))
+        self.dataOffset = HEAD.size + headerSize
+        size = len(self._map)
+        trailer = TRAILER.unpack_from(self._map, size - TRAILER.size) if size >= self.dataOffset + TRAILER.size else None
+        if trailer and trailer[3] == END_MAGIC:
+            (self.size, self._eventsOffset, self._eventCount, _) = trailer
+        else:
+            # Writer did not finish (crashed or still running)
+            self.size = (size - self.dataOffset) // RECORD.size
+            (self._eventsOffset, self._eventCount) = (None, 0)
+
+    rocket = property(lambda s: s.header["rocket"])
+    stageNames = property(lambda s: s.header["stages"])
+    columns = tuple(name for (name, _) in COLUMNS)
+
+    def record(self, idx):
+        """Tick record `idx' as a tuple."""
+        if not (0 <= idx < self.size):
+            raise IndexError(idx)
+        return RECORD.unpack_from(self._map, self.dataOffset + idx * RECORD.size)
+
+    def time(self, idx):
+        return struct.unpack_from("<d", self._map, self.dataOffset + idx * RECORD.size)[0]
+
+    def find(self, time):
+        """Index of the first record at or after `time' (binary search, reads log2(N) records)."""
+        (lo, hi) = (0, self.size)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.time(mid) < time:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def span(self, start=None, end=None):
+        """Record index range [first, last) of the records within [start, end] seconds."""
+        first = 0 if start is None else self.find(start)
+        last = self.size if end is None else self.find(end)
+        while last < self.size and self.time(last) == end:
+            last += 1
+        return (first, last)
+
+    def records(self, start=None, end=None):
+        """Records within [start, end] seconds as tuples."""
+        (first, last) = self.span(start, end)
+        view = memoryview(self._map)[self.dataOffset + first * RECORD.size:self.dataOffset + last * RECORD.size]
+        return RECORD.iter_unpack(view)
+
+    def array(self, start=None, end=None):
+        """Records within [start, end] seconds as a NumPy structured array mapped onto the file."""
+        import numpy as np
+        dtype = np.dtype([(name, "<" + code) for (name, code) in COLUMNS])
+        (first, last) = self.span(start, end)
+        return np.frombuffer(self._map, dtype=dtype, count=last - first, offset=self.dataOffset + first * RECORD.size)
+
+    def events(self):
+        """Stage separations as ((time, stageIdx, stageName), ...)."""
+        rv = []
+        for idx in range(self._eventCount):
+            (time, stage) = EVENT.unpack_from(self._map, self._eventsOffset + idx * EVENT.size)
+            rv.append((time, stage, self.stageNames[stage]))
+        return tuple(rv)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __len__(self):
+        return self.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        self.close()
+
+    def __repr__(self):
+        return "<{} {!r} records={} events={}>".format(self.__class__.__name__, self.path, self.size, self._eventCount)
@@ -0,0 +1,39 @@
+"""Orbit figures of the ascent reports."""
+
+import unittest
+
+import numpy as np
+
+from KspCalc import consts, stars
+from KspCalc.flight.ascent import apsides
+from KspCalc.flight.batch import _apsides
+
+class ApsidesTest(unittest.TestCase):
+
+    def setUp(self):
+        planet = stars.Kerbol.findOne("Kerbin")
+        self.mu = consts.G * planet.mass
+        self.radius = planet.radius + 20000.0
+
+    def testRadialOrbitIsBound(self):
+        """Straight up below the escape speed: the apoapsis is where the climb stops."""
+        speed = 1300.0
+        top = 1.0 / (1.0 / self.radius - speed ** 2 / (2.0 * self.mu))
+        (pe, ap) = apsides(self.mu, self.radius, speed, 0.0)
+        self.assertEqual(pe, 0.0)
+        self.assertAlmostEqual(ap / top, 1.0, places=12)
+        (pe, ap) = _apsides(self.mu, np.array([self.radius]), np.array([speed]), np.array([0.0]))
+        self.assertAlmostEqual(ap[0] / top, 1.0, places=12)
+
+    def testEscape(self):
+        speed = 1.01 * (2.0 * self.mu / self.radius) ** 0.5
+        self.assertEqual(apsides(self.mu, self.radius, speed, 0.0)[1], float("inf"))
+        self.assertEqual(apsides(self.mu, self.radius, 0.0, speed)[1], float("inf"))
+        (pe, ap) = _apsides(self.mu, np.array([self.radius] * 2), np.array([speed, 0.0]), np.array([0.0, speed]))
+        self.assertTrue(np.isinf(ap).all())
+
+    def testCircularOrbit(self):
+        speed = (self.mu / self.radius) ** 0.5
+        (pe, ap) = apsides(self.mu, self.radius, 0.0, speed)
+        self.assertAlmostEqual(pe / self.radius, 1.0, places=6)
+        self.assertAlmostEqual(ap / self.radius, 1.0, places=6)
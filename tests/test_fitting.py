@@ -0,0 +1,54 @@
+"""Drag fitting against observations of known flights."""
+
+import os
+import unittest
+
+import yaml
+
+from KspCalc import (flight, stars)
+from KspCalc.flight.fitting import DragFit
+
+DESIGNS_DIR = os.path.join(os.path.dirname(__file__), "..", "samples", "designs")
+
+def rocket(fname, drag=0):
+    with open(os.path.join(DESIGNS_DIR, fname)) as fobj:
+        rv = flight.Rocket.fromDict(yaml.safe_load(fobj))
+    planet = stars.Kerbol.findOne("Kerbin")
+    rv.drag = drag
+    rv.setPos(flight.Point(planet, planet.radius + 68.41))
+    return rv
+
+class DragFitTest(unittest.TestCase):
+
+    def testObservationAfterBurnout(self):
+        """Terminal state of a drag 2 flight (burnt out at 31.25 s) observed at 31.5 s."""
+        fitted = DragFit(rocket("simple.yml"), [(31.5, 12291.12)]).fit()
+        self.assertAlmostEqual(fitted, 2.0, delta=0.005)
+
+    def testObservationInFlight(self):
+        """State at the end of a tick is the one the observation at that time is compared with."""
+        known = rocket("threeStageRocket.yml", drag=2)
+        for msg in known.fly(dt=0.01, compiled=True):
+            if msg.msgType == "FlightLog" and msg.absTime + msg.dt >= 60.0:
+                break
+        observation = (known.absTime, known.position.surfaceAltitude, known.speed)
+        fitted = DragFit(rocket("threeStageRocket.yml"), [observation]).fit()
+        self.assertAlmostEqual(fitted, 2.0, delta=0.005)
+
+    def testSamplesDoNotDependOnTheBatch(self):
+        fit = DragFit(rocket("simple.yml"), [(10.005, 0.0), (31.5, 0.0)])
+        alone = fit.samples([1.9, 2.0])
+        together = fit.samples([0.0, 1.9, 2.0])[1:]
+        scalar = [fit._scalarSamples(drag) for drag in (1.9, 2.0)]
+        for (expected, got) in ((alone, together), (alone, scalar)):
+            for (rowA, rowB) in zip(expected, got):
+                for ((altA, speedA), (altB, speedB)) in zip(rowA, rowB):
+                    self.assertAlmostEqual(altA, altB, delta=1e-6)
+                    self.assertAlmostEqual(speedA, speedB, delta=1e-6)
+
+    def testUnmatchedObservation(self):
+        with self.assertRaises(ValueError):
+            DragFit(rocket("simple.yml"), [(20.0, 1.0)]).fit()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,20 @@
+"""Part name resolution."""
+
+import unittest
+
+from KspCalc.parts import (search, lfe)
+
+class FindByNameTest(unittest.TestCase):
+
+    def testExactName(self):
+        self.assertIs(search.findByName("LV-T30 Liquid Fuel Engine"), lfe.LvT30)
+        self.assertIs(search.findByName("lv-t30  liquid fuel ENGINE"), lfe.LvT30)
+
+    def testFuzzyName(self):
+        self.assertIs(search.findByName("LV-T30 Liquid Fuel Engin"), lfe.LvT30)
+
+    def testAmbiguousPrefix(self):
+        """Prefixes of a single name are still rejected when they are close to several names."""
+        for name in ("Mk1", "A", "C", "LV-T4"):
+            with self.assertRaises(Exception):
+                search.findByName(name)